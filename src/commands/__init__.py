@@ -1,27 +1,46 @@
-"""__init__ importing all commands"""
+"""Registry of all commands
 
-from . import (
-    auxorigin,
-    bom,
-    clean,
-    dnp,
-    gerbers,
-    get_ignore,
-    globlib,
-    impedance_map,
-    init_project,
-    kibuzzard_to_graphic,
-    loclib,
-    logos,
-    netlist,
-    pcb_filter,
-    pnp,
-    prettify,
-    rename,
-    sch,
-    set_drc,
-    stackup_export,
-    step,
-    version,
-    wireframe,
-)
+Command modules are not imported here. Each entry maps subcommand name to the module implementing it
+and the help string displayed in `kmake --help`, the module is imported only when its subcommand is dispatched.
+Command modules take their `NAME` and `HELP` from the registry, so help strings are defined only once."""
+
+from typing import Dict, NamedTuple
+
+
+class Command(NamedTuple):
+    module: str
+    help: str
+
+
+COMMANDS: Dict[str, Command] = {
+    "aux-origin": Command("auxorigin", "Set drill origin to bounding box corner or given x,y coordinate."),
+    "bom": Command("bom", "Generate Bill-of-Materials (BOM)"),
+    "clean": Command("clean", "Clean redundant project files from project's directory."),
+    "dnp": Command(
+        "dnp",
+        "Fix discrepancies between DNP, `exclude-from-bom` and"
+        " `exclude-from-board` atributes in schematic symbols and footprints.",
+    ),
+    "gerber": Command("gerbers", "Generate production files of PCB layers and drills in Gerber format."),
+    "get-ignore": Command("get_ignore", "Copy .gitignore file from template."),
+    "globlib": Command("globlib", "Link symbols and footprints to global libraries."),
+    "impedance": Command("impedance_map", "Generate impedance maps in Gerber format."),
+    "init-project": Command("init_project", "Initialize KiCad project."),
+    "kibuzzard-to-graphic": Command("kibuzzard_to_graphic", "Convert Kibuzzard footprints to graphical polygons"),
+    "loclib": Command("loclib", "Create local project library and link symbols/footprint/3D models to this library."),
+    "logos": Command("logos", "Adds selected logo to the schematic."),
+    "netlist": Command("netlist", "Create KiCad netlist file."),
+    "pcb-filter": Command("pcb_filter", "Create *.kicad_pcb "),
+    "pnp": Command("pnp", "Create footprint position files."),
+    "prettify": Command("prettify", "Pretify files to conform with KiCad formatter"),
+    "rename": Command("rename", "Rename project files."),
+    "run": Command("pipeline", "Run several subcommands in a single kmake process."),
+    "sch": Command("sch", "Generate schematics in PDF format."),
+    "set-drc": Command("set_drc", "Sets `DRC` and `custom DRC` rules from provided template."),
+    "stackup-export": Command("stackup_export", "Export stackup information to file."),
+    "step": Command("step", "Export 3D models of PCB in STEP format."),
+    "version": Command("version", "Print kmake, kiutils & kicad version"),
+    "wireframe": Command(
+        "wireframe", "Split outline layer to top/bottom and optionally export it as .svg and .gbr files."
+    ),
+}
@@ -6,16 +6,17 @@ from kiutils.board import Board
 from kiutils.schematic import Position
 from kiutils.items.gritems import GrCircle, GrArc, GrPoly
 
-from .prettify import run as prettify
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 
 log = logging.getLogger(__name__)
 
+NAME = "aux-origin"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    aux_origin_parser = subparsers.add_parser(
-        "aux-origin", help="Set drill origin to bounding box corner or given x,y coordinate."
-    )
+    aux_origin_parser = subparsers.add_parser(NAME, help=HELP)
     exclusive_group = aux_origin_parser.add_mutually_exclusive_group(required=True)
     exclusive_group.add_argument(
         "-r",
@@ -41,15 +42,9 @@ def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     aux_origin_parser.set_defaults(func=set_aux_origin)
 
 
-def save_board(board: Board) -> None:
-    log.info("Saving PCB")
-    board.to_file()
-
-
 def set_aux_axis_origin(board: Board, x: float, y: float) -> None:
     log.info("Setting auxilary axis origin to (%.3f,%.3f)", x, y)
     board.setup.auxAxisOrigin = Position(x, y)
-    save_board(board)
 
 
 def angle(x: float, y: float, ref_x: float, ref_y: float) -> float:
@@ -182,7 +177,7 @@ def set_aux_origin(ki_pro: KicadProject, args: argparse.Namespace) -> None:
         sys.exit(1)
 
     log.info("Loading PCB")
-    board = Board.from_file(ki_pro.pcb_file)
+    board = ki_pro.session.board(ki_pro.pcb_file)
     if args.reset:
         set_aux_axis_origin(board, 0, 0)
     elif args.position:
@@ -190,4 +185,6 @@ def set_aux_origin(ki_pro: KicadProject, args: argparse.Namespace) -> None:
         set_aux_axis_origin(board, x, y)
     else:
         set_aux_origin_on_size(board, args.side)
-    prettify(ki_pro, argparse.Namespace())
+    ki_pro.session.mark_dirty(board)
+    log.info("Saving PCB")
+    ki_pro.session.flush()
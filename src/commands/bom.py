@@ -4,16 +4,100 @@ import logging
 import os
 import sys
 import dataclasses
+from concurrent.futures import ThreadPoolExecutor
 from typing_extensions import Self
-from typing import TextIO, Dict, List, Tuple
+from typing import Any, Callable, Iterator, Optional, Set, TextIO, Dict, List, Tuple, Union
 
-import kicad_netlist_reader
+import natsort
+from kiutils.items.schitems import SchematicSymbol
+from kiutils.schematic import Schematic
+from kiutils.symbol import Symbol
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
-from common.kmake_helper import run_kicad_cli
+from common.kmake_helper import default_jobs, run_kicad_cli
+from common.netlist_reader import Netlist, NetlistComponent, read_netlist
+from common.sexpr_reader import SexprReader
 
 log = logging.getLogger(__name__)
 
+NAME = "bom"
+HELP = COMMANDS[NAME].help
+
+
+@dataclasses.dataclass
+class Component:
+    """
+    Data class for storing single component (all units of a symbol with the same reference)
+
+    Attributes:
+        ref: reference designator
+        value: content of the `value` field
+        footprint: footprint assigned to component (with library nickname)
+        mpn: content of `mpn` field (manufacturer part number)
+        manufacturer: content of `manufacturer` field
+        description: description of the library symbol
+        legacy_dnp: component has `DNP` field set to `DNP`
+        dnp: component is marked as dnp (do not populate)
+    """
+
+    ref: str
+    value: str
+    footprint: str
+    mpn: str
+    manufacturer: str
+    description: str
+    legacy_dnp: bool
+    dnp: bool
+
+    @classmethod
+    def from_netlist(cls, c: NetlistComponent) -> Self:
+        """
+        Generate Component from netlist component
+        """
+        return cls(
+            ref=c.ref,
+            value=c.value,
+            footprint=c.get_footprint(),
+            mpn=c.get_field("MPN"),
+            manufacturer=c.get_field("Manufacturer"),
+            description=c.description,
+            legacy_dnp=c.get_field("DNP") == "DNP",
+            dnp=c.has_property("dnp"),
+        )
+
+    @classmethod
+    def from_symbol(cls, ref: str, units: List[SchematicSymbol], lib_symbol: Optional[Symbol]) -> Self:
+        """
+        Generate Component from units of schematic symbol, fields are read the same way as in netlist
+
+        Empty fields of the first unit are taken from other units and then from the library symbol.
+        """
+
+        def field(name: str) -> str:
+            for unit in units:
+                value = get_field(unit, name)
+                if value:
+                    return value
+            return get_field(lib_symbol, name) if lib_symbol is not None else ""
+
+        return cls(
+            ref=ref,
+            value=field("Value"),
+            footprint=field("Footprint"),
+            mpn=field("MPN"),
+            manufacturer=field("Manufacturer"),
+            description=get_field(lib_symbol, "Description") if lib_symbol is not None else "",
+            legacy_dnp=field("DNP") == "DNP",
+            dnp=any(unit.dnp for unit in units),
+        )
+
+    def group_key(self) -> Tuple[str, str, str, bool]:
+        """
+        Components are grouped by value, footprint, reference prefix and DNP
+        """
+        return (self.value, self.footprint, self.ref.rstrip("0123456789"), self.dnp)
+
 
 @dataclasses.dataclass
 class ComponentGroup:
@@ -44,22 +128,21 @@ class ComponentGroup:
         return len(self.refs)
 
     @classmethod
-    def from_component(cls, c: kicad_netlist_reader.comp) -> Self:
+    def from_component(cls, c: Component) -> Self:
         """
         Generate ComponentGroup from component
         """
-        footprint = c.getFootprint()
+        footprint = c.footprint
         if ":" in footprint:
-            footprint = c.getFootprint().split(":")[1]
-        dnp = c.getField("DNP") == "DNP"
+            footprint = c.footprint.split(":")[1]
         return cls(
-            refs=[c.getRef()],
-            value=c.getValue(),
-            mpn=c.getField("MPN"),
-            manufacturer=c.getField("Manufacturer"),
-            description=c.getDescription(),
+            refs=[c.ref],
+            value=c.value,
+            mpn=c.mpn,
+            manufacturer=c.manufacturer,
+            description=c.description,
             footprint=footprint,
-            dnp=dnp,
+            dnp=c.legacy_dnp,
         )
 
     def has_same_fields(self, other: Self) -> bool:
@@ -94,6 +177,18 @@ class ComponentGroup:
             return False
         return True
 
+    def sort_key(self) -> Tuple[Any, ...]:
+        """
+        Key ordering groups by designator class (e.g. `C`, `R`, `U`), value and first reference
+        """
+        first_ref = self.refs[0]
+        return (
+            natural_sort_key(first_ref.rstrip("0123456789")),
+            natural_sort_key(self.value),
+            natural_sort_key(first_ref),
+            self.dnp,
+        )
+
     def is_blacklisted(self) -> bool:
         """
         Check if component is blacklisted
@@ -155,12 +250,84 @@ class ValidHeaders:
         )
 
 
+@dataclasses.dataclass
+class BomVariant:
+    """
+    Single BoM output
+
+    Attributes:
+        kind: included components: `populated`, `DNP` or `ALL`
+        group_references: write group of components in single line
+        fields: BoM fields, `None` for fields selected with `--fields`
+    """
+
+    kind: str
+    group_references: bool = True
+    fields: Optional[List[str]] = None
+
+    kinds = ["populated", "DNP", "ALL"]
+    not_grouped_suffix = "-ReferenceNotGrouped"
+
+    @classmethod
+    def parse(cls, spec: str) -> Self:
+        """
+        Parse variant from `KIND[-ReferenceNotGrouped][:FIELD,...]`
+        """
+        name, _, fields = spec.partition(":")
+        group_references = not name.endswith(cls.not_grouped_suffix)
+        kind = name if group_references else name[: -len(cls.not_grouped_suffix)]
+        if kind not in cls.kinds:
+            raise argparse.ArgumentTypeError(f"invalid BoM kind {kind!r}, choose from: {', '.join(cls.kinds)}")
+        return cls(kind, group_references, fields.split(",") if fields else None)
+
+    def file_name(self, kicad_project: KicadProject) -> str:
+        suffix = "" if self.group_references else self.not_grouped_suffix
+        return f"{kicad_project.doc_dir}/{kicad_project.name}-BOM-{self.kind}{suffix}.csv"
+
+    def select(self, groups: List[ComponentGroup]) -> List[ComponentGroup]:
+        """
+        Return groups of components included in this variant
+        """
+        if self.kind == "populated":
+            return [group for group in groups if not group.dnp]
+        if self.kind == "DNP":
+            return [group for group in groups if group.dnp]
+        return groups
+
+
+# Natural order of strings with numbers (e.g. `R2` before `R10`)
+natural_sort_key = natsort.natsort_keygen(alg=natsort.ns.IGNORECASE)
+
+# Returns content of a cell for (components, references, quantity)
+ColumnExtractor = Callable[[ComponentGroup, str, int], str]
+
+
+def get_column_extractors() -> Dict[str, ColumnExtractor]:
+    """Return functions generating cells by every valid header"""
+
+    valid_headers = ValidHeaders()
+    columns: List[Tuple[List[str], ColumnExtractor]] = [
+        (valid_headers.reference, lambda components, references, quantity: references),
+        (valid_headers.quantity, lambda components, references, quantity: str(quantity)),
+        (valid_headers.value, lambda components, references, quantity: components.value),
+        (valid_headers.footprint, lambda components, references, quantity: components.footprint),
+        (valid_headers.manufacturer, lambda components, references, quantity: components.manufacturer),
+        (valid_headers.mpn, lambda components, references, quantity: components.mpn),
+        (valid_headers.dnp, lambda components, references, quantity: "DNP" if components.dnp else ""),
+        (valid_headers.description, lambda components, references, quantity: components.description),
+    ]
+    return {header: extractor for headers, extractor in columns for header in headers}
+
+
+COLUMN_EXTRACTORS = get_column_extractors()
+
+
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     """Create kmake bom subparser"""
 
     parser = subparsers.add_parser(
-        "bom",
-        help="Generate Bill-of-Materials (BOM)",
+        NAME,
+        help=HELP,
         description="Generate Bill-of-Materials (BOM). Include ONLY populated components by default."
         "Default format is `default` ."
         "None of the options include blacklisted components unless `--no-ignore` flag is passed.",
@@ -185,127 +352,164 @@ def add_subparser(subparsers: argparse._SubParsersAction) -> None:
         help="Group references of components into single line",
     )
     parser.add_argument("-o", "--output", help="Output file name")
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        type=BomVariant.parse,
+        metavar="KIND[-ReferenceNotGrouped][:FIELD,...]",
+        help="Write several BoM files from a single read of components. "
+        "KIND is one of: populated, DNP, ALL. Fields default to --fields. "
+        "Files are named {project}-BOM-{KIND}[-ReferenceNotGrouped].csv, "
+        "e.g. `--variants populated DNP ALL:Reference,Quantity,Value,DNP ALL-ReferenceNotGrouped`.",
+    )
+    parser.add_argument(
+        "--kicad-cli",
+        action="store_true",
+        help="Read components from netlist exported by kicad-cli instead of schematic files (slower).",
+    )
     parser.set_defaults(func=run)
 
 
 def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     """Main kamke bom method"""
 
-    log.info("Exporting netlist from project")
-    net = create_netlist(kicad_project, "kicadxml", args.debug)
+    if args.fields is None:
+        log.info("Using default BoM preset")
+        headers = ValidHeaders().default_fields
+    else:
+        headers = args.fields
+
+    # Fail before reading components
+    try:
+        for fields in [headers] + [variant.fields for variant in args.variants or [] if variant.fields]:
+            compile_columns(fields)
+    except ValueError as e:
+        log.error(e)
+        sys.exit(-1)
+    if args.variants and args.output:
+        log.error("--output can't be used with --variants")
+        sys.exit(1)
+
+    if args.kicad_cli:
+        log.info("Exporting netlist from project")
+        net = create_netlist(kicad_project, "kicadxml", args.debug)
 
-    log.info("Parsing netlist")
-    groups, ok = parse_netlist(net)
+        log.info("Parsing netlist")
+        groups, ok = parse_netlist(net)
+    else:
+        log.info("Reading components from schematic")
+        groups, ok = group_components(read_components(kicad_project))
 
     if not args.no_ignore:
         groups = [group for group in groups if not group.is_blacklisted()]
-    kind = "ALL"
-    if not args.all:
-        if not args.dnp:
-            groups = [group for group in groups if not group.dnp]
-            kind = "populated"
-        else:
-            groups = [group for group in groups if group.dnp]
-            kind = "DNP"
 
-    if args.output:
-        filename = f"{kicad_project.dir}/{args.output}"
+    if args.variants:
+        kicad_project.create_doc_dir()
+        write_variants(kicad_project, groups, args.variants, headers)
     else:
-        if args.group_references:
-            filename = f"{kicad_project.doc_dir}/{kicad_project.name}-BOM-{kind}.csv"
+        kind = "ALL" if args.all else "DNP" if args.dnp else "populated"
+        variant = BomVariant(kind, args.group_references, headers)
+        if args.output:
+            filename = f"{kicad_project.dir}/{args.output}"
         else:
-            log.info("Using grouped references")
-            filename = f"{kicad_project.doc_dir}/{kicad_project.name}-BOM-{kind}-ReferenceNotGrouped.csv"
+            if not args.group_references:
+                log.info("Using grouped references")
+            kicad_project.create_doc_dir()
+            filename = variant.file_name(kicad_project)
+        write_bom(filename, variant, groups, headers)
 
-    log.info(f"BoM file {filename}")
+    if not ok:
+        sys.exit(1)
 
-    if args.fields is None:
-        log.info("Using default BoM preset")
-        headers = ValidHeaders().default_fields
-    else:
-        headers = args.fields
 
-    log.info("Saving BoM to file")
+def write_bom(filename: str, variant: BomVariant, groups: List[ComponentGroup], headers: List[str]) -> None:
+    """Save BoM variant to file"""
 
+    log.info(f"BoM file {filename}")
     with open(filename, "w", encoding="utf-8") as f:
-        save_csv(f, groups, headers, args.group_references)
-
+        save_csv(f, variant.select(groups), variant.fields or headers, variant.group_references)
     log.info("Saved BOM to file")
 
-    if not ok:
+
+def write_variants(
+    kicad_project: KicadProject, groups: List[ComponentGroup], variants: List[BomVariant], headers: List[str]
+) -> None:
+    """Save BoM variants to files concurrently"""
+
+    files = [variant.file_name(kicad_project) for variant in variants]
+    if len(set(files)) != len(files):
+        log.error("BoM variants have to write different files: %s", " ".join(files))
         sys.exit(1)
+    with ThreadPoolExecutor(max_workers=min(default_jobs(), len(variants))) as executor:
+        futures = [
+            executor.submit(write_bom, filename, variant, groups, headers) for filename, variant in zip(files, variants)
+        ]
+        for future in futures:
+            future.result()
 
 
 def save_csv(output_file: TextIO, groups: list[ComponentGroup], headers: list[str], group_references: bool) -> None:
     """Save header and components to BoM file"""
 
+    columns = compile_columns(headers)
     writer = csv.writer(output_file, lineterminator="\n", delimiter=",", quotechar='"', quoting=csv.QUOTE_ALL)
 
     writer.writerow(headers)
 
-    for group in groups:
-        if group_references:
-            writer.writerow(prepare_csv_row(group, headers, " ".join(group.refs), group.quantity()))
-        else:
-            for ref in group.refs:
-                writer.writerow(prepare_csv_row(group, headers, ref))
-
+    if group_references:
+        writer.writerows(
+            [column(group, " ".join(group.refs), group.quantity()) for column in columns] for group in groups
+        )
+    else:
+        writer.writerows([column(group, ref, 1) for column in columns] for group in groups for ref in group.refs)
 
-def prepare_csv_row(components: ComponentGroup, headers: list[str], references: str = "", quantity: int = 1) -> list:
-    """Generate single row for csv file"""
 
-    line = []
+def compile_columns(headers: List[str]) -> Tuple[ColumnExtractor, ...]:
+    """Return functions generating cells of columns with given headers
 
-    valid_headers = ValidHeaders()
+    Raises ValueError for invalid headers."""
 
     for header in headers:
-        if header in valid_headers.reference:
-            line.append(references)
-        elif header in valid_headers.quantity:
-            line.append(str(quantity))
-        elif header in valid_headers.value:
-            line.append(components.value)
-        elif header in valid_headers.footprint:
-            line.append(components.footprint)
-        elif header in valid_headers.manufacturer:
-            line.append(components.manufacturer)
-        elif header in valid_headers.mpn:
-            line.append(components.mpn)
-        elif header in valid_headers.dnp:
-            if components.dnp:
-                line.append("DNP")
-            else:
-                line.append("")
-        elif header in valid_headers.description:
-            line.append(components.description)
-        else:
-            log.error(f"Invalid header {header}")
-            exit(-1)
-    return line
+        if header not in COLUMN_EXTRACTORS:
+            raise ValueError(f"Invalid header {header}")
+    return tuple(COLUMN_EXTRACTORS[header] for header in headers)
 
 
-def parse_netlist(net: kicad_netlist_reader.netlist) -> Tuple[List[ComponentGroup], bool]:
+def parse_netlist(net: Netlist) -> Tuple[List[ComponentGroup], bool]:
     """Generate component groups from netlist"""
 
+    return group_components([Component.from_netlist(c) for c in net.components])
+
+
+def group_components(components: List[Component]) -> Tuple[List[ComponentGroup], bool]:
+    """Generate component groups from components
+
+    References in groups are sorted in natural order, groups are sorted with `ComponentGroup.sort_key`."""
+
+    by_key: Dict[Tuple[str, str, str, bool], List[Component]] = {}
+    for component in components:
+        by_key.setdefault(component.group_key(), []).append(component)
+    sorted_groups = [sorted(group, key=lambda c: natural_sort_key(c.ref)) for group in by_key.values()]
+
     groups: list[ComponentGroup] = []
 
     mismatched: Dict[str, List[str]] = {}
 
     legacy_dnp = []
-    for group in net.groupComponents():
+    for group in sorted_groups:
         dnp_refs: list[str] = []
         populate_refs: list[str] = []
 
         example_component = ComponentGroup.from_component(group[0])
 
         for component in group:
-            if component.getField("DNP") == "DNP":
-                dnp_refs.append(component.getRef())
-                legacy_dnp.append(component.getRef())
-            elif component.getDNP():
-                dnp_refs.append(component.getRef())
+            if component.legacy_dnp:
+                dnp_refs.append(component.ref)
+                legacy_dnp.append(component.ref)
+            elif component.dnp:
+                dnp_refs.append(component.ref)
             else:
-                populate_refs.append(component.getRef())
+                populate_refs.append(component.ref)
             converted_component = ComponentGroup.from_component(component)
             if not converted_component.has_same_fields(example_component):
                 mismatched[example_component.refs[0]] = mismatched.get(example_component.refs[0], []) + [
@@ -315,6 +519,8 @@ def parse_netlist(net: kicad_netlist_reader.netlist) -> Tuple[List[ComponentGrou
             groups.append(dataclasses.replace(example_component, refs=populate_refs, dnp=False))
         if dnp_refs:
             groups.append(dataclasses.replace(example_component, refs=dnp_refs, dnp=True))
+    # Keys are computed once per group
+    groups.sort(key=ComponentGroup.sort_key)
     if legacy_dnp:
         log.warning(str(len(legacy_dnp)) + " components use legacy DNP property:")
         log.warning(str(legacy_dnp))
@@ -337,12 +543,10 @@ def print_mismatched(mismatched: Dict[str, List[str]]) -> None:
     logging.error("In total there were %i mismatched components", count)
 
 
-def create_netlist(
-    kicad_project: KicadProject, output_format: str = "kicadsexpr", debug: bool = False
-) -> kicad_netlist_reader.netlist:
-    """Create netlist from KiCad project"""
+def create_netlist(kicad_project: KicadProject, output_format: str = "kicadxml", debug: bool = False) -> Netlist:
+    """Create netlist from KiCad project, nets are not read"""
 
-    assert output_format in ["kicadsexpr", "kicadxml", "cadstar", "cadstar", "orcadpcb2", "spice", "spicemodel"]
+    assert output_format == "kicadxml", "only XML netlists can be read"
 
     kicad_project.create_doc_dir()
     filename = f"{kicad_project.doc_dir}/netlist"
@@ -360,9 +564,112 @@ def create_netlist(
     log.info("Generating netlist file: %s", filename)
     run_kicad_cli(command, debug)
 
-    net = kicad_netlist_reader.netlist(filename)
+    net = read_netlist(filename)
 
     if not debug:
         os.remove(filename)
 
     return net
+
+
+def get_field(symbol: Union[SchematicSymbol, Symbol], name: str) -> str:
+    """Value of field with exactly matching name, empty if the field does not exist"""
+    for prop in symbol.properties:
+        if prop.key == name:
+            return prop.value
+    return ""
+
+
+def dnp_sheets(path: str) -> Set[str]:
+    """UUIDs of sheets marked as DNP in schematic file
+
+    Sheet attributes are read directly from the file, as they are not available in parsed `HierarchicalSheet`."""
+
+    uuids = set()
+    with SexprReader(path) as reader:
+        for node in reader.find("sheet"):
+            attributes = {
+                item[0]: item[1] for item in reader.parse(node)[1:] if isinstance(item, list) and len(item) == 2
+            }
+            if attributes.get("dnp") == "yes":
+                uuids.add(str(attributes.get("uuid")).strip('"'))
+    return uuids
+
+
+def walk_hierarchy(
+    kicad_project: KicadProject, path: str, sheet_path: str = "", dnp: bool = False, parents: Tuple[str, ...] = ()
+) -> Iterator[Tuple[Schematic, str, bool]]:
+    """Yield every sheet instance of the hierarchy as (schematic, sheet instance path, DNP)
+
+    Sheets used multiple times are yielded once per instance, DNP of a sheet applies to all its subsheets."""
+
+    schematic = kicad_project.session.schematic(path)
+    sheet_path = sheet_path or f"/{schematic.uuid}"
+    yield schematic, sheet_path, dnp
+    if not schematic.sheets:
+        return
+    dnp_uuids = dnp_sheets(path)
+    for sheet in schematic.sheets:
+        sheet_file = os.path.join(os.path.dirname(path), sheet.fileName.value)
+        if os.path.realpath(sheet_file) in parents:
+            log.error("Recursive sheet %s in %s", sheet.fileName.value, path)
+            continue
+        yield from walk_hierarchy(
+            kicad_project,
+            sheet_file,
+            f"{sheet_path}/{sheet.uuid}",
+            dnp or sheet.uuid in dnp_uuids,
+            parents + (os.path.realpath(path),),
+        )
+
+
+def symbol_instance(
+    symbol: SchematicSymbol, sheet_path: str, root: Schematic, project_name: str
+) -> Optional[Tuple[str, int]]:
+    """Reference & unit of the symbol in given sheet instance"""
+
+    matching = [
+        (instance.name, path)
+        for instance in symbol.instances
+        for path in instance.paths
+        if path.sheetInstancePath == sheet_path
+    ]
+    if matching:
+        # Prefer instance data of this project, symbols copied from other projects keep their instances
+        _, path = next((item for item in matching if item[0] == project_name), matching[0])
+        return path.reference, path.unit
+    # Instances of schematics saved by KiCad 6 are stored in the root schematic
+    for root_instance in root.symbolInstances:
+        if root_instance.path == f"{sheet_path}/{symbol.uuid}":
+            return root_instance.reference, root_instance.unit
+    return None
+
+
+def read_components(kicad_project: KicadProject) -> List[Component]:
+    """Read components of the whole hierarchy from schematic files, the same ones as in netlist
+
+    Power symbols (references starting with `#`) are skipped, units with the same reference form one component."""
+
+    units: Dict[str, List[Tuple[int, SchematicSymbol, Schematic, bool]]] = {}
+    root = kicad_project.session.schematic(kicad_project.sch_root)
+    for schematic, sheet_path, dnp in walk_hierarchy(kicad_project, kicad_project.sch_root):
+        for symbol in schematic.schematicSymbols:
+            instance = symbol_instance(symbol, sheet_path, root, kicad_project.name)
+            if instance is None:
+                log.warning("Symbol %s has no instance in sheet %s", symbol.libId, sheet_path)
+                continue
+            ref, unit = instance
+            if ref.startswith("#"):
+                continue
+            units.setdefault(ref, []).append((unit, symbol, schematic, dnp))
+
+    components = []
+    for ref, symbol_units in units.items():
+        symbol_units.sort(key=lambda item: item[0])
+        _, symbol, schematic, dnp = symbol_units[0]
+        lib_id = symbol.libName or symbol.libId
+        lib_symbol = next((lib_symbol for lib_symbol in schematic.libSymbols if lib_symbol.libId == lib_id), None)
+        component = Component.from_symbol(ref, [item[1] for item in symbol_units], lib_symbol)
+        component.dnp = component.dnp or dnp
+        components.append(component)
+    return components
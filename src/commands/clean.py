@@ -2,10 +2,14 @@ import argparse
 import logging
 
 from pathlib import Path
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 
 log = logging.getLogger(__name__)
 
+NAME = "clean"
+HELP = COMMANDS[NAME].help
+
 folders_to_skip = [
     "assets",
     "doc",
@@ -42,7 +46,7 @@ endswith_to_remove = [
 
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    parser = subparsers.add_parser("clean", help="Clean redundant project files from project's directory.")
+    parser = subparsers.add_parser(NAME, help=HELP)
     parser.set_defaults(func=run)
 
 
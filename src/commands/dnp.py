@@ -2,26 +2,23 @@ import argparse
 import logging
 from typing import List
 
-import kiutils.items
-import kiutils.schematic
 from kiutils.board import Board
 from kiutils.footprint import Footprint
 from kiutils.items.schitems import SchematicSymbol
 from kiutils.schematic import Schematic
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 from common.kmake_helper import get_property, remove_property
-from .prettify import run as prettify
 
 log = logging.getLogger(__name__)
 
+NAME = "dnp"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    parser = subparsers.add_parser(
-        "dnp",
-        help="Fix discrepancies between DNP, `exclude-from-bom` and"
-        " `exclude-from-board` atributes in schematic symbols and footprints.",
-    )
+    parser = subparsers.add_parser(NAME, help=HELP)
     parser.add_argument(
         "-l",
         "--list-broken",
@@ -68,7 +65,7 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
 
     schematics = []
     for sch_file in kicad_project.all_sch_files:
-        schematics.append(kiutils.schematic.Schematic.from_file(sch_file))
+        schematics.append(kicad_project.session.schematic(sch_file))
 
     # Get all components that are marked DNP
     dnp_components = get_dnp_components(schematics)
@@ -94,7 +91,7 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
         # Save all changes to schematic files
         log.debug("Saving all schematic changes to file")
         for schematic in schematics:
-            schematic.to_file()
+            kicad_project.session.mark_dirty(schematic)
 
     # Get references
     log.debug("Searching for components on PCB")
@@ -110,11 +107,11 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     # Update PCB footprints
     log.debug("Updating PCB")
 
-    pcb = Board().from_file(kicad_project.pcb_file)
+    pcb = kicad_project.session.board(kicad_project.pcb_file)
     update_pcb(references, pcb, args.no_paste, args.set_paste, args.set_tht_paste, args.reset_tht_paste)
-    pcb.to_file()
+    kicad_project.session.mark_dirty(pcb)
 
-    prettify(kicad_project, argparse.Namespace())
+    kicad_project.session.flush()
 
 
 def get_dnp_components(schematics: list[Schematic]) -> List[SchematicSymbol]:
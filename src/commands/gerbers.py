@@ -1,20 +1,26 @@
 import argparse
 import logging
-from typing import List, Optional
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 from git import Repo
 from git.exc import InvalidGitRepositoryError
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
-from common.kmake_helper import run_kicad_cli, tag_gerbers
+from common.kmake_helper import KicadCliJobs, run_kicad_cli, tag_gerbers
 
 log = logging.getLogger(__name__)
 
+NAME = "gerber"
+HELP = COMMANDS[NAME].help
+
+# Files written to fab/ by gerber & drill export
+GENERATED_FILES_PATTERNS = ["*.gbr", "*.gbrjob", "*.drl"]
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    gerber_parser = subparsers.add_parser(
-        "gerber", help="Generate production files of PCB layers and drills in Gerber format."
-    )
+    gerber_parser = subparsers.add_parser(NAME, help=HELP)
     gerber_parser.add_argument(
         "-e",
         "--noedge",
@@ -46,20 +52,6 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     if not args.noedge:
         common_layers.append("Edge.Cuts")
 
-    export_gerbers(
-        kicad_project,
-        output_folder=f"{kicad_project.dir}/fab/",
-        common_layers=common_layers,
-        verbose=args.debug,
-    )
-
-    export_drill(
-        kicad_project.pcb_file,
-        f"{kicad_project.dir}/fab/",
-        excellon=args.excellon,
-        origin=args.drill_origin,
-    )
-
     try:
         kicad_project_repo = Repo(f"{kicad_project.dir}")
         modified_files = kicad_project_repo.index.diff(None)
@@ -68,11 +60,53 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
                 log.warning("%s changed since last commit", file_path.a_path)
 
         sha = kicad_project_repo.head.commit.hexsha
-        short_sha = kicad_project_repo.git.rev_parse(sha, short=7)
-        tag_gerbers(f"{kicad_project.dir}/fab", short_sha)
+        short_sha: Optional[str] = kicad_project_repo.git.rev_parse(sha, short=7)
     except InvalidGitRepositoryError:
         log.warning("Project is not in repository. Githash not added.")
+        short_sha = None
+
+    # Githash is embedded in gerbers, so they are rebuilt after each commit
+    target = kicad_project.build_cache.target(
+        "gerber", args, [kicad_project.pcb_file], extra={"git revision": str(short_sha)}
+    )
+    if target.up_to_date():
         return
+    previous_files = get_generated_files(kicad_project.fab_dir)
+
+    # Gerbers & drill files are exported concurrently
+    with KicadCliJobs() as jobs:
+        export_gerbers(
+            kicad_project,
+            output_folder=f"{kicad_project.dir}/fab/",
+            common_layers=common_layers,
+            verbose=args.debug,
+            jobs=jobs,
+        )
+
+        export_drill(
+            kicad_project.pcb_file,
+            f"{kicad_project.dir}/fab/",
+            excellon=args.excellon,
+            origin=args.drill_origin,
+            jobs=jobs,
+        )
+    log.info("Exported gerbers & drill files to : %s", f"{kicad_project.dir}/fab/")
+
+    if short_sha is not None:
+        tag_gerbers(f"{kicad_project.dir}/fab", short_sha)
+
+    generated_files = get_generated_files(kicad_project.fab_dir)
+    target.record([path for path, stamp in generated_files.items() if previous_files.get(path) != stamp])
+
+
+def get_generated_files(output_folder: str) -> Dict[str, Tuple[int, int]]:
+    """Returns (mtime, size) of gerber & drill files in `output_folder`"""
+    files = {}
+    for pattern in GENERATED_FILES_PATTERNS:
+        for path in Path(output_folder).glob(pattern):
+            stat = path.stat()
+            files[str(path)] = (stat.st_mtime_ns, stat.st_size)
+    return files
 
 
 def export_gerbers(
@@ -91,10 +125,12 @@ def export_gerbers(
     board_plot_params: bool = False,
     protel_names: bool = False,
     verbose: bool = False,
+    jobs: Optional[KicadCliJobs] = None,
 ) -> None:
     """Generate set of gerber files for PCB fabrication (excl. drill files).
 
-    Extended with \"board-plot-params\" and \"common-layers\" options."""
+    Extended with \"board-plot-params\" and \"common-layers\" options.
+    If `jobs` is set, export is only submitted to the job runner."""
 
     gerbers_export_cli_command = [
         "pcb",
@@ -132,12 +168,17 @@ def export_gerbers(
     if not protel_names:
         gerbers_export_cli_command.extend(["--no-protel-ext"])
 
-    run_kicad_cli(gerbers_export_cli_command, verbose)
-    log.info("Exported gerbers to : %s", output_folder)
+    run_kicad_cli(gerbers_export_cli_command, verbose, jobs)
+    if jobs is None:
+        log.info("Exported gerbers to : %s", output_folder)
 
 
 def export_drill(
-    input_pcb_file: str, output_folder: str = '""', excellon: bool = False, origin: str = "absolute"
+    input_pcb_file: str,
+    output_folder: str = '""',
+    excellon: bool = False,
+    origin: str = "absolute",
+    jobs: Optional[KicadCliJobs] = None,
 ) -> None:
 
     drill_export_cli_command = [
@@ -160,5 +201,6 @@ def export_drill(
     else:
         drill_export_cli_command.extend(["--format", "gerber"])
 
-    run_kicad_cli(drill_export_cli_command, False)
-    log.info("Exported drill files to : %s", output_folder)
+    run_kicad_cli(drill_export_cli_command, False, jobs)
+    if jobs is None:
+        log.info("Exported drill files to : %s", output_folder)
@@ -2,10 +2,14 @@ import argparse
 import logging
 from pathlib import Path
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 
 log = logging.getLogger(__name__)
 
+NAME = "get-ignore"
+HELP = COMMANDS[NAME].help
+
 # based on: https://raw.githubusercontent.com/github/gitignore/master/KiCad.gitignore
 GITIGNORE = """
 # For PCBs designed using KiCad: https://www.kicad.org/
@@ -69,7 +73,7 @@ venv/
 
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    parser = subparsers.add_parser("get-ignore", help="Copy .gitignore file from template.")
+    parser = subparsers.add_parser(NAME, help=HELP)
     parser.set_defaults(func=run)
 
 
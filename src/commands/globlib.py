@@ -4,20 +4,24 @@ import argparse
 import logging
 import os
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
 
-from kiutils.board import Board
 from kiutils.footprint import Footprint
 from kiutils.items.schitems import SchematicSymbol
 from kiutils.schematic import Schematic
-from kiutils.symbol import Symbol, SymbolLib
+from kiutils.symbol import Symbol
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 from common.kmake_helper import get_property, set_property
-from .prettify import run as prettify
+from common.lib_tables import LibraryHandle
+from common.library_index import FootprintLibraryIndex, IndexedFootprint, IndexedSymbol, SymbolLibraryIndex
 
 log = logging.getLogger(__name__)
 
+NAME = "globlib"
+HELP = COMMANDS[NAME].help
+
 UniSymbol = Union[SchematicSymbol, Symbol]
 
 
@@ -28,7 +32,7 @@ class SymbolEntry:
 
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    globlib_parser = subparsers.add_parser("globlib", help="Link symbols and footprints to global libraries.")
+    globlib_parser = subparsers.add_parser(NAME, help=HELP)
     globlib_parser.add_argument(
         "--include-kicad-lib",
         action="store_true",
@@ -66,20 +70,14 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     globlib_project(kicad_project, args)
 
 
-def get_lib_mapping(
-    ki_pro: KicadProject, include_kicad_lib: bool, lib_table_file: str, system_table_file: str, lib_dir: str
-) -> Dict[str, str]:
-    """Returns dict mapping symbol library names to paths based on user's kicad config."""
-    libtable = ki_pro.read_lib_table_file(lib_table_file, system_table_file)
-
+def get_lib_mapping(libraries: Dict[str, LibraryHandle], include_kicad_lib: bool, lib_dir: str) -> Dict[str, str]:
+    """Returns dict mapping library names of user's global lib table to paths."""
     if not include_kicad_lib:  # if not using original KiCad libraries, remove them from list
-        libtable.libs = [lib for lib in libtable.libs if lib_dir not in lib.uri]
+        libraries = {name: lib for name, lib in libraries.items() if lib_dir not in lib.uri}
 
     # Sort so that kicad libaries are last
-    libtable.libs = sorted(libtable.libs, key=lambda x: lib_dir not in x.uri, reverse=True)
-
-    ki_pro.load_kicad_environ_vars()
-    return {lib.name: os.path.expandvars(lib.uri) for lib in libtable.libs}
+    handles = sorted(libraries.values(), key=lambda x: lib_dir not in x.uri, reverse=True)
+    return {lib.nickname: lib.path for lib in handles}
 
 
 def get_symbol_name(symbol: UniSymbol) -> str:
@@ -89,41 +87,59 @@ def get_symbol_name(symbol: UniSymbol) -> str:
     return symbol_name[1]
 
 
-def get_global_symbol_list(lib_mapping: Dict[str, str]) -> Dict[str, Tuple[str, UniSymbol]]:
-    sym_list: dict[str, Tuple[str, UniSymbol]] = {}
+def get_global_symbol_list(lib_mapping: Dict[str, str], index: SymbolLibraryIndex) -> Dict[str, IndexedSymbol]:
+    """Returns dict mapping symbol names to indexed symbols of global libraries, symbols are not parsed"""
+    sym_list: dict[str, IndexedSymbol] = {}
     for lib_name, path in lib_mapping.items():
         if not os.path.exists(path):
             log.warning(f"Library {lib_name} points to file that does not exist. Library will be omitted.")
             continue
-        sym_library = SymbolLib.from_file(path)
-        log.debug(f"Parsing global library: {lib_name}")
-        for symbol in sym_library.symbols:
-            sym_name = get_symbol_name(symbol)
-            sym_list[sym_name] = (lib_name, symbol)
+        log.debug(f"Reading global library index: {lib_name}")
+        for entry in index.library(lib_name, path):
+            sym_list[entry.name] = entry
+    index.save()
     return sym_list
 
 
-def get_global_footprint_list(lib_mapping: Dict[str, str]) -> Dict[str, Tuple[str, Footprint]]:
-    fp_list: dict[str, Tuple[str, Footprint]] = {}
+def get_global_footprint_list(lib_mapping: Dict[str, str], index: FootprintLibraryIndex) -> Dict[str, IndexedFootprint]:
+    """Returns dict mapping footprint names to indexed footprints of global libraries, footprints are not parsed"""
+    fp_list: dict[str, IndexedFootprint] = {}
     for lib_name, path in lib_mapping.items():
         if not os.path.exists(path):
             log.warning(f"Library {lib_name} points to file that does not exist. Library will be omitted.")
             continue
-        log.debug(f"Parsing global library: {lib_name}")
-        for file in os.scandir(path):
-            if not file.is_file():
-                continue
-            if not file.name.endswith(".kicad_mod"):
-                continue
-            name = file.name.removesuffix(".kicad_mod")
-            fp_list[name] = (lib_name, Footprint.from_file(file.path))
+        log.debug(f"Reading global library index: {lib_name}")
+        for entry in index.library(lib_name, path):
+            fp_list[entry.name] = entry
+    index.save()
     return fp_list
 
 
+def get_mpn_index(
+    global_symbols: Dict[str, IndexedSymbol], mpns: Optional[Set[str]] = None
+) -> Dict[str, List[IndexedSymbol]]:
+    """Returns dict mapping MPNs to global symbols with that MPN, built once per run from library index
+
+    If `mpns` is given, only symbols with these MPNs are indexed."""
+    mpn_index: Dict[str, List[IndexedSymbol]] = {}
+    for global_symbol in global_symbols.values():
+        if global_symbol.mpn is not None and (mpns is None or global_symbol.mpn in mpns):
+            mpn_index.setdefault(global_symbol.mpn, []).append(global_symbol)
+
+    for mpn, matching_symbols in sorted(mpn_index.items()):
+        if len(matching_symbols) >= 2:
+            log.warning(
+                "MPN: %s is shared by multiple global symbols: %s",
+                mpn,
+                ", ".join(f"{symbol.library}:{symbol.name}" for symbol in matching_symbols),
+            )
+    return mpn_index
+
+
 def search_by_mpn(
     local_symbol: UniSymbol,
-    global_symbols: Dict[str, Tuple[str, UniSymbol]],
-) -> Optional[Tuple[str, UniSymbol]]:
+    mpn_index: Dict[str, List[IndexedSymbol]],
+) -> Optional[IndexedSymbol]:
     local_mpn = get_property(local_symbol, "MPN")
     local_name = get_symbol_name(local_symbol)
 
@@ -131,12 +147,7 @@ def search_by_mpn(
         log.warning("Symbol: %s has no mpn to match.", local_name)
         return None
 
-    matching_symbols: List[Tuple[str, UniSymbol]] = []
-
-    for _, (global_lib_name, global_symbol) in global_symbols.items():
-        global_mpn = get_property(global_symbol, "MPN")
-        if global_mpn is not None and global_mpn == local_mpn:
-            matching_symbols.append((global_lib_name, global_symbol))
+    matching_symbols = mpn_index.get(local_mpn, [])
 
     if not matching_symbols:
         log.warning("Symbol: %s not found in global libraries.", local_name)
@@ -179,26 +190,66 @@ def get_sch_paths_based_on_args(args: argparse.Namespace, ki_pro: KicadProject)
 
 
 def find_global_symbol(
-    local_symbol: UniSymbol, global_symbols: dict[str, Tuple[str, UniSymbol]]
-) -> Optional[Tuple[str, UniSymbol]]:
+    local_symbol: UniSymbol, global_symbols: dict[str, IndexedSymbol], mpn_index: Dict[str, List[IndexedSymbol]]
+) -> Optional[IndexedSymbol]:
     local_symbol_name = get_symbol_name(local_symbol)
     log.debug("Processing symbol: %s", local_symbol_name)
 
     if local_symbol_name in global_symbols:
-        global_symbol_name = local_symbol_name
-        global_symbol_lib = global_symbols[global_symbol_name][0]
-        global_symbol = global_symbols[global_symbol_name][1]
-        log.debug("Symbol with name: %s found in global library: %s", global_symbol_name, global_symbol_lib)
+        global_symbol = global_symbols[local_symbol_name]
+        log.debug("Symbol with name: %s found in global library: %s", local_symbol_name, global_symbol.library)
     else:
-        result = search_by_mpn(local_symbol, global_symbols)
+        result = search_by_mpn(local_symbol, mpn_index)
         if result is not None:
-            global_symbol_lib, global_symbol = result
+            global_symbol = result
             log.debug("Symbol with libId: %s found in global library by MPN", local_symbol.libId)
         else:
             log.warning("Symbol with libId: %s wasn't found in global library", local_symbol.libId)
             return None
 
-    return global_symbol_lib, global_symbol
+    return global_symbol
+
+
+class GlobalSymbols:
+    """Lookup of global symbols for the given set of local symbols
+
+    Symbols linked to a global library (see `--update-all`) are looked up in that library first.
+    Index of all global libraries is read only for symbols which are not found this way,
+    MPN fallback uses only index entries with MPNs of the local symbols.
+    Global symbols are never parsed here, see `SymbolLibraryIndex.symbol`."""
+
+    def __init__(self, lib_mapping: Dict[str, str], index: SymbolLibraryIndex, local_symbols: List[UniSymbol]) -> None:
+        self.lib_mapping = lib_mapping
+        self.index = index
+        self.mpns = {get_property(symbol, "MPN") for symbol in local_symbols} - {None, ""}
+        self._all: Optional[Dict[str, IndexedSymbol]] = None
+        self._mpn_index: Optional[Dict[str, List[IndexedSymbol]]] = None
+
+    @property
+    def all(self) -> Dict[str, IndexedSymbol]:
+        if self._all is None:
+            log.info("Generating global symbol list.")
+            self._all = get_global_symbol_list(self.lib_mapping, self.index)
+        return self._all
+
+    @property
+    def mpn_index(self) -> Dict[str, List[IndexedSymbol]]:
+        if self._mpn_index is None:
+            self._mpn_index = get_mpn_index(self.all, self.mpns)
+        return self._mpn_index
+
+    def in_library(self, nickname: str, name: str) -> Optional[IndexedSymbol]:
+        path = self.lib_mapping.get(nickname)
+        if path is None or not os.path.exists(path):
+            return None
+        return self.index.by_name(nickname, path).get(name)
+
+    def find(self, local_symbol: UniSymbol) -> Optional[IndexedSymbol]:
+        result = self.in_library(local_symbol.libraryNickname or "", get_symbol_name(local_symbol))
+        if result is not None:
+            log.debug("Symbol %s found in its global library", local_symbol.libId)
+            return result
+        return find_global_symbol(local_symbol, self.all, self.mpn_index)
 
 
 def should_symbol_be_globlibed(symbol: UniSymbol, global_libraries: Iterable[str], update_all: bool) -> bool:
@@ -212,42 +263,43 @@ def should_symbol_be_globlibed(symbol: UniSymbol, global_libraries: Iterable[str
 
 def globlib_project_symbols(ki_pro: KicadProject, args: argparse.Namespace) -> list[UniSymbol]:
     library_mapping = get_lib_mapping(
-        ki_pro,
+        ki_pro.lib_tables.symbol_libraries(include_project=False),
         args.include_kicad_lib,
-        ki_pro.glob_sym_lib_table_path,
-        ki_pro.system_sym_lib_table,
         ki_pro.env_var_name_sym_lib,
     )
     log.debug("Libary name to path mapping: %s", library_mapping)
 
-    log.info("Generating global symbol list.")
-    global_symbols = get_global_symbol_list(library_mapping)
+    # Collect symbols first, so that only libraries which can contain them are read
+    schematic_symbols: List[Tuple[Schematic, List[UniSymbol]]] = []
+    for schematic_path in get_sch_paths_based_on_args(args, ki_pro):
+        schematic = ki_pro.session.schematic(str(schematic_path))
+        local_symbols = [
+            symbol
+            for symbol in schematic.schematicSymbols + schematic.libSymbols
+            if should_symbol_be_globlibed(symbol, library_mapping.keys(), args.update_all)
+        ]
+        schematic_symbols.append((schematic, local_symbols))
+
+    index = SymbolLibraryIndex()
+    global_symbols = GlobalSymbols(
+        library_mapping, index, [symbol for _, local_symbols in schematic_symbols for symbol in local_symbols]
+    )
 
     failures: list[UniSymbol] = []
 
-    for schematic_path in get_sch_paths_based_on_args(args, ki_pro):
-        log.info("Processing schematic: %s", schematic_path)
-        schematic = Schematic().from_file(str(schematic_path))
-
-        for local_symbol in schematic.schematicSymbols:
-            if not should_symbol_be_globlibed(local_symbol, library_mapping.keys(), args.update_all):
-                continue
-            result = find_global_symbol(local_symbol, global_symbols)
+    for schematic, local_symbols in schematic_symbols:
+        log.info("Processing schematic: %s", schematic.filePath)
+        for local_symbol in local_symbols:
+            result = global_symbols.find(local_symbol)
             if result is None:
                 failures.append(local_symbol)
                 continue
-            update_props(local_symbol, result[1], result[0], args.update_properties)
+            # Only symbols selected as replacements are parsed
+            update_props(local_symbol, index.symbol(result), result.library, args.update_properties)
 
-        for local_symbol in schematic.libSymbols:
-            if not should_symbol_be_globlibed(local_symbol, library_mapping.keys(), args.update_all):
-                continue
-            result = find_global_symbol(local_symbol, global_symbols)
-            if result is None:
-                failures.append(local_symbol)
-                continue
-            update_props(local_symbol, result[1], result[0], args.update_properties)
-
-        schematic.to_file()
+        if local_symbols:
+            ki_pro.session.mark_dirty(schematic)
+    index.save()
     return failures
 
 
@@ -272,43 +324,53 @@ def globlib_footprints(ki_pro: KicadProject, args: argparse.Namespace) -> None:
     changes = 0
     log.info("Loading Footprints ...")
     lib_mapping = get_lib_mapping(
-        ki_pro,
+        ki_pro.lib_tables.footprint_libraries(include_project=False),
         args.include_kicad_lib,
-        ki_pro.glob_fp_lib_table_path,
-        ki_pro.system_fp_lib_table,
         ki_pro.env_var_name_fp_lib,
     )
-    fp_list = get_global_footprint_list(lib_mapping)
+    index = FootprintLibraryIndex()
+    fp_list = get_global_footprint_list(lib_mapping, index)
     log.info("Loading PCB ...")
-    pcb = Board().from_file(ki_pro.pcb_file)
+    pcb = ki_pro.session.board(ki_pro.pcb_file)
     log.info("Updating footprint links")
 
+    # First footprint with given reference is updated
+    footprints_by_ref: Dict[str, Footprint] = {}
+    for fp in pcb.footprints:
+        footprints_by_ref.setdefault(get_property(fp, "Reference") or "", fp)
+
+    processed_refs: Set[str] = set()
     for schematic_path in ki_pro.all_sch_files:
         if args.sch is not None:
             schematic_name = schematic_path.replace(ki_pro.dir + "/", "")
             if schematic_name not in args.sch:
                 continue
         log.info("Processing schematic: %s", schematic_path)
-        schematic = Schematic().from_file(schematic_path)
+        schematic = ki_pro.session.schematic(schematic_path)
         for schematic_symbol in schematic.schematicSymbols:
             ref = get_property(schematic_symbol, "Reference")
+            # Units of multi-unit symbols share the reference (and the footprint), first unit is used
+            if ref in processed_refs:
+                continue
+            processed_refs.add(ref)
             log.debug("Processing:  %s", ref)
-            for fp in pcb.footprints:
-                (found, changed) = update_fp_props(schematic_symbol, ref, fp, args.update_properties)
-                if changed:
-                    changes += 1
-                if found:
-                    break
-    # bellow iteration has 2 purposes: 1. to globlib footprints that are not in schematic; 2. to update 3D model links
-    for fp in pcb.footprints:
-        for globname, (globlib, globfp) in fp_list.items():
-            if globname != fp.entryName:
+            fp = footprints_by_ref.get(ref)
+            if fp is None:
                 continue
-            if fp.libraryNickname not in lib_mapping:
+            _, changed = update_fp_props(schematic_symbol, ref, fp, args.update_properties)
+            if changed:
                 changes += 1
-                fp.libId = globlib + ":" + globname
-            fp.models = globfp.models
-    pcb.to_file()
+    # bellow iteration has 2 purposes: 1. to globlib footprints that are not in schematic; 2. to update 3D model links
+    for fp in pcb.footprints:
+        globfp = fp_list.get(fp.entryName)
+        if globfp is None:
+            continue
+        if fp.libraryNickname not in lib_mapping:
+            changes += 1
+            fp.libId = globfp.library + ":" + globfp.name
+        # Only footprints referenced by the board are parsed, and only if they have 3D models
+        fp.models = index.footprint(globfp).models if globfp.models else []
+    ki_pro.session.mark_dirty(pcb)
     log.info("Footprint links updated: %d", changes)
 
 
@@ -317,7 +379,7 @@ def globlib_project(kicad_project: KicadProject, args: argparse.Namespace) -> No
     failures = globlib_project_symbols(kicad_project, args)
     if not args.exclude_pcb:
         globlib_footprints(kicad_project, args)
-    prettify(kicad_project, argparse.Namespace())
+    kicad_project.session.flush()
 
     if not failures:
         log.info("All links in symbols were updated successfully.")
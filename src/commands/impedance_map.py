@@ -7,17 +7,21 @@ import re
 from typing import Dict, List
 from pathlib import Path
 
-from kiutils.board import Board
 from kiutils.items.brditems import LayerToken, Via
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 from common.kmake_helper import run_kicad_cli
+from common.sexpr_reader import load_board
 
 log = logging.getLogger(__name__)
 
+NAME = "impedance"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    impedance_parser = subparsers.add_parser("impedance", help="Generate impedance maps in Gerber format.")
+    impedance_parser = subparsers.add_parser(NAME, help=HELP)
     impedance_parser.set_defaults(func=run)
 
 
@@ -33,7 +37,8 @@ def run(kicad_project: KicadProject, args: argparse._SubParsersAction) -> None:
         return
 
     log.info("Loading PCB")
-    board = Board.from_file(kicad_project.pcb_file)
+    # Footprints & zones (with their fills) are removed from impedance map, so they are not even parsed
+    board = load_board(kicad_project.pcb_file, exclude=["footprint", "zone"])
 
     # Count number of copper layers
     copper_lcount = 0
@@ -79,8 +84,6 @@ def run(kicad_project: KicadProject, args: argparse._SubParsersAction) -> None:
             item.dirty = False
 
     board.traceItems = [i for i in board.traceItems if not i.dirty]
-    board.footprints = []
-    board.zones = []
 
     log.info("Saving the generated impedance map")
     kicad_project.create_fab_dir()
@@ -8,6 +8,7 @@ from kiutils.items.common import TitleBlock
 from kiutils.board import Board
 from kiutils.schematic import Schematic
 from kiutils.items.common import PageSettings
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 from .prettify import run as prettify
 from typing import Union
@@ -15,10 +16,13 @@ from typing import Union
 
 log = logging.getLogger(__name__)
 
+NAME = "init-project"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     """Register parser and its arguments as subparser."""
-    init_project_parser = subparsers.add_parser("init-project", help="Initialize KiCad project.")
+    init_project_parser = subparsers.add_parser(NAME, help=HELP)
     init_project_parser.add_argument("-c", "--company", dest="company", help="Company name.")
     init_project_parser.add_argument("-t", "--title", nargs="*", dest="title", help="Project title.", required=True)
     init_project_parser.add_argument(
@@ -389,7 +393,7 @@ def main(project: KicadProject, args: argparse.Namespace) -> None:
         force_title=args.force_title,
         paper_size=args.size,
     )
-    prettify(project, argparse.Namespace())
+    prettify(project, argparse.Namespace(files=[]))
 
 
 def run(project: KicadProject, args: argparse.Namespace) -> None:
@@ -2,28 +2,29 @@
 
 import logging
 import argparse
-from kiutils.board import Board
 from kiutils.items.gritems import GrPoly
 from kiutils.items.fpitems import FpPoly
 from math import sin, cos, radians
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
-from .prettify import run as prettify
 
 log = logging.getLogger(__name__)
 
+NAME = "kibuzzard-to-graphic"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     """Register parser and its arguments as subparser"""
-    parser = subparsers.add_parser("kibuzzard-to-graphic", help="Convert Kibuzzard footprints to graphical polygons")
+    parser = subparsers.add_parser(NAME, help=HELP)
     parser.set_defaults(func=run)
 
 
 def main(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     """Main module function"""
 
-    pcb_path = kicad_project.pcb_file
-    board = Board().from_file(pcb_path)
+    board = kicad_project.session.board(kicad_project.pcb_file)
 
     footprints_to_remove = []
 
@@ -65,8 +66,8 @@ def main(kicad_project: KicadProject, args: argparse.Namespace) -> None:
         board.footprints.remove(footprint)
         log.debug(f"Deleted KiBuzzard footprint ({footprint.entryName})")
 
-    board.to_file(pcb_path)
-    prettify(kicad_project, argparse.Namespace())
+    kicad_project.session.mark_dirty(board)
+    kicad_project.session.flush()
 
 
 def run(project: KicadProject, args: argparse.Namespace) -> None:
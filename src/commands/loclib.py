@@ -2,25 +2,29 @@
 .kicad_mod, .kicad_sym, .kicad_lib files"""
 
 import argparse
+import copy
+import hashlib
 import logging
 import os
-import shutil
 import typing
+from concurrent.futures import Executor, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import List
+from typing import Dict, List, Optional
 
-from kiutils.board import Board
 from kiutils.footprint import Footprint
 from kiutils.libraries import Library, LibTable
-from kiutils.schematic import Schematic
 from kiutils.symbol import Symbol, SymbolLib
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
-from common.kmake_helper import get_property, set_property
-from .prettify import run as prettify
+from common.kmake_helper import default_jobs, file_sha256, get_property, link_or_copy, set_property
+from common.library_index import SymbolLibraryIndex
 
 log = logging.getLogger(__name__)
 
+NAME = "loclib"
+HELP = COMMANDS[NAME].help
+
 
 @dataclass(order=True)
 class LocalSymbol:
@@ -41,9 +45,7 @@ class SymbolsLibs:
 
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    loclib_parser = subparsers.add_parser(
-        "loclib", help="Create local project library and link symbols/footprint/3D models to this library."
-    )
+    loclib_parser = subparsers.add_parser(NAME, help=HELP)
     loclib_parser.add_argument(
         "-f",
         "--force",
@@ -71,38 +73,6 @@ def dump_sheet_symbols_to_lib(ki_pro: KicadProject, args: argparse.Namespace) ->
     pass
 
 
-def get_sym_lib_mapping(ki_pro: KicadProject) -> typing.Dict[str, str]:
-    libtable = ki_pro.read_sym_lib_table_file(ki_pro.glob_sym_lib_table_path)
-
-    if os.path.isfile("sym-lib-table"):
-        local_libtable = LibTable.from_file("sym-lib-table")
-        for lib_entry in local_libtable.libs:
-            libtable.libs.append(lib_entry)
-
-    # Filter non existing libs
-    existing_libs = []
-    for lib in libtable.libs:
-        libpath = os.path.expandvars(lib.uri)
-        if not os.path.isfile(libpath):
-            log.warning(f"Lib {libpath} in lib table but not in file system, skipping")
-            continue
-        existing_libs.append(lib)
-    libtable.libs = existing_libs
-
-    return {lib.name: os.path.expandvars(lib.uri) for lib in libtable.libs}
-
-
-def get_fp_lib_mapping(ki_pro: KicadProject) -> typing.Dict[str, str]:
-    libtable = ki_pro.read_fp_lib_table_file(ki_pro.glob_fp_lib_table_path)
-
-    if os.path.isfile("fp-lib-table"):
-        local_libtable = LibTable.from_file("fp-lib-table")
-        for lib_entry in local_libtable.libs:
-            libtable.libs.append(lib_entry)
-
-    return {lib.name: os.path.expandvars(lib.uri) for lib in libtable.libs}
-
-
 def get_symbol_name(__symbol: Symbol) -> str:
     """Returns Symbol name"""
     if ":" not in __symbol.libId:
@@ -121,31 +91,62 @@ def get_assigned_footprint(__symbol: Symbol) -> str:
     return footprint_id
 
 
-def get_symbol_from_library(__symbol_name: str, __library_path: str) -> Symbol:
-    """Get symbol from library if exists"""
-    remote_lib = SymbolLib.from_file(
-        __library_path
-    )  # this calls for optimization - multiple loads of same library may occur
-    return next(
-        (symbol for symbol in remote_lib.symbols if symbol.entryName == __symbol_name),
-        None,
-    )
+def get_symbol_from_library(
+    __symbol_name: str, __library_path: str, index: Optional[SymbolLibraryIndex] = None
+) -> Optional[Symbol]:
+    """Get symbol from library if exists
 
+    Library is looked up in the index (reuse `index` for multiple lookups), only the returned symbol is parsed."""
+    index = index or SymbolLibraryIndex()
+    entry = index.by_name(os.path.basename(__library_path), __library_path).get(__symbol_name)
+    return None if entry is None else index.symbol(entry)
 
-def append_symbol_to_library(symbol: Symbol, library: SymbolLib) -> None:
-    """Add symbol to the library"""
-    if symbol not in library.symbols:
-        library.symbols.append(symbol)
-    else:
-        log.debug("Skipping %s, already in lib: %s", symbol.entryName, library.filePath)
 
+def symbol_hash(symbol: Symbol) -> str:
+    """Structural hash of the symbol, equal for symbols that would be saved the same way"""
+    return hashlib.sha256(symbol.to_sexpr().encode("utf-8")).hexdigest()
 
-def append_template_symbol_to_library(symbol: Symbol, library: SymbolLib) -> None:
-    """Add template symbol to the top of the library"""
-    if symbol not in library.symbols:
-        library.symbols.insert(0, symbol)
-    else:
-        log.debug("Skipping %s, already in lib: %s", symbol.entryName, library.filePath)
+
+class LocalSymbolLib:
+    """Symbols of the local library by name, for appending symbols without duplicates
+
+    Duplicates are detected by structural hash, computed only for symbols with the same name."""
+
+    def __init__(self, library: SymbolLib) -> None:
+        self.library = library
+        self.by_name: Dict[str, List[Symbol]] = {}
+        self.hashes: Dict[int, str] = {}
+        for symbol in library.symbols:
+            self.by_name.setdefault(symbol.entryName, []).append(symbol)
+
+    def hash(self, symbol: Symbol) -> str:
+        """Hash of symbol of the library, computed once"""
+        if id(symbol) not in self.hashes:
+            self.hashes[id(symbol)] = symbol_hash(symbol)
+        return self.hashes[id(symbol)]
+
+    def contains(self, symbol: Symbol) -> bool:
+        same_name = self.by_name.get(symbol.entryName, [])
+        if not same_name:
+            return False
+        digest = symbol_hash(symbol)
+        return any(self.hash(other) == digest for other in same_name)
+
+    def append(self, symbol: Symbol) -> None:
+        """Add symbol to the library"""
+        if self.contains(symbol):
+            log.debug("Skipping %s, already in lib: %s", symbol.entryName, self.library.filePath)
+            return
+        self.library.symbols.append(symbol)
+        self.by_name.setdefault(symbol.entryName, []).append(symbol)
+
+    def append_template(self, symbol: Symbol) -> None:
+        """Add template symbol to the top of the library"""
+        if self.contains(symbol):
+            log.debug("Skipping %s, already in lib: %s", symbol.entryName, self.library.filePath)
+            return
+        self.library.symbols.insert(0, symbol)
+        self.by_name.setdefault(symbol.entryName, []).append(symbol)
 
 
 def cleanup_schematic_lib_symbols(ki_pro: KicadProject) -> None:
@@ -153,7 +154,7 @@ def cleanup_schematic_lib_symbols(ki_pro: KicadProject) -> None:
     log.info("Removing unrefferenced schematic symbols")
     for schematic_path in ki_pro.all_sch_files:
         log.info("Processing: %s", os.path.basename(schematic_path))
-        schematic = Schematic().from_file(schematic_path)
+        schematic = ki_pro.session.schematic(schematic_path)
         log.debug("Schematic %s", schematic.filePath)
         sch_symbol_instances = []
         for sch_symbol in schematic.schematicSymbols:
@@ -172,10 +173,10 @@ def cleanup_schematic_lib_symbols(ki_pro: KicadProject) -> None:
                 continue
             sch_symbol_instances.append(symbol_name)
 
-        schematic.libSymbols = (
+        schematic.libSymbols = [
             symbol for symbol in schematic.libSymbols if get_symbol_name(symbol) in sch_symbol_instances
-        )
-        schematic.to_file()
+        ]
+        ki_pro.session.mark_dirty(schematic)
 
 
 def generate_lib_symbol_list() -> None:
@@ -184,14 +185,12 @@ def generate_lib_symbol_list() -> None:
 
 def group_symbols_by_library_name(ki_pro: KicadProject) -> SymbolsLibs:
     schematic_cache_lib = "__schematic"
-    library_mapping = get_sym_lib_mapping(ki_pro)
-    log.debug("Mapping: %s", library_mapping)
     # Add library for symbols without lib/lib not exists
     lib_list = SymbolsLibs([UsedLib(schematic_cache_lib, "", [])])
 
     # get list of all used libraries and symbols
     for schematic_path in ki_pro.all_sch_files:
-        schematic = Schematic().from_file(schematic_path)
+        schematic = ki_pro.session.schematic(schematic_path)
         log.info("Loading symbols from %s", os.path.basename(schematic.filePath))
         for schematic_symbol in schematic.libSymbols:
             library = schematic_symbol.libraryNickname
@@ -202,11 +201,16 @@ def group_symbols_by_library_name(ki_pro: KicadProject) -> SymbolsLibs:
             symbol_name = get_symbol_name(schematic_symbol)
             log.debug("Processing  %s. LibID: %s", symbol_name, schematic_symbol.libId)
             lib_entry = next((item for item in lib_list.libs if item.name == library), None)
+            # Schematic is shared within session and saved later, don't let local library alias its symbols
+            schematic_symbol = copy.deepcopy(schematic_symbol)
 
             if not lib_entry:
-                symbol_library_path = library_mapping.get(library, schematic_cache_lib)
+                symbol_library = ki_pro.lib_tables.symbol_library(library)
+                if symbol_library is not None and not symbol_library.exists:
+                    log.warning(f"Lib {symbol_library.path} in lib table but not in file system, skipping")
+                    symbol_library = None
                 # Library does not exists, add symbol from cache to cache_lib
-                if symbol_library_path == schematic_cache_lib:
+                if symbol_library is None:
                     # Use library for cached symbols
                     log.warning("LibID: %s not found. Using %s from cache", schematic_symbol.libId, symbol_name)
                     cache_lib = next((item for item in lib_list.libs if item.name == schematic_cache_lib))
@@ -214,14 +218,15 @@ def group_symbols_by_library_name(ki_pro: KicadProject) -> SymbolsLibs:
                     # Copy properties from one of the symbols used in schematic
                     for used_symbol in schematic.schematicSymbols:
                         if used_symbol.entryName == schematic_symbol.entryName:
-                            schematic_symbol.properties = used_symbol.properties
+                            # Properties are patched in local library later, don't share them with the schematic
+                            schematic_symbol.properties = copy.deepcopy(used_symbol.properties)
                             break
                     cache_lib.symbol_list.append(LocalSymbol(symbol_name, schematic_symbol))
                     continue
                 lib_list.libs.append(
                     UsedLib(
                         library,
-                        symbol_library_path,
+                        symbol_library.path,
                         [LocalSymbol(symbol_name, schematic_symbol)],
                     )
                 )
@@ -240,20 +245,22 @@ def loclib_symbols(ki_pro: KicadProject, args: argparse.Namespace) -> SymbolLib:
     if args.force:
         log.info("Localize symbols in force mode")
         local_lib = SymbolLib(version="20231120", generator="kmake_loclib")
-        local_lib.filePath = local_lib_path
+        ki_pro.session.add(local_lib, local_lib_path)
     else:
         log.info("Localize symbols in append mode")
         try:
             log.debug("Importing: %s", local_lib_path)
-            local_lib = SymbolLib.from_file(local_lib_path)
+            local_lib = ki_pro.session.symbol_lib(local_lib_path)
         except Exception:
             log.warning("Local library not found")
             local_lib = SymbolLib(version="20231120", generator="kmake_loclib")
-            local_lib.filePath = local_lib_path
-            local_lib.to_file()
+            ki_pro.session.add(local_lib, local_lib_path)
             log.info("Created empty local library")
 
     lib_list = group_symbols_by_library_name(ki_pro)
+    local_symbols = LocalSymbolLib(local_lib)
+    # Remote libraries are looked up by name in the index, only copied symbols are parsed
+    index = SymbolLibraryIndex()
 
     for used_lib in lib_list.libs:
         # Special case for symbols that were changed on schematic
@@ -261,54 +268,55 @@ def loclib_symbols(ki_pro: KicadProject, args: argparse.Namespace) -> SymbolLib:
         if used_lib.name == "__schematic":
             log.info("Processing altered schematic symbols / symbols with missing lib")
             for local_symbol in used_lib.symbol_list:
-                append_symbol_to_library(local_symbol.symbol, local_lib)
+                local_symbols.append(local_symbol.symbol)
             continue
 
         log.info("Processing symbols from %s", os.path.basename(used_lib.path))
-        remote_lib = SymbolLib.from_file(used_lib.path)
+        remote_symbols = index.by_name(used_lib.name, used_lib.path)
         log.debug("Processing: %s", used_lib.path)
-        for symbol_name in [s.name for s in used_lib.symbol_list]:
+        for local_symbol in used_lib.symbol_list:
+            symbol_name = local_symbol.name
             # Get symbol from remote lib
-            symbol = next(
-                (symbol for symbol in remote_lib.symbols if symbol.entryName == symbol_name),
-                None,
-            )
-            if symbol is None:
+            entry = remote_symbols.get(symbol_name)
+            if entry is None:
                 # Get symbol from local lib
                 log.warning(
                     "Entry %s not found in %s. Copying from schematic",
                     symbol_name,
                     os.path.basename(used_lib.path),
                 )
-                symbol = next(s.symbol for s in used_lib.symbol_list if s.name == symbol_name)
+                symbol = local_symbol.symbol
+            else:
+                symbol = index.symbol(entry)
 
             log.debug("Copied %s from %s", symbol_name, used_lib.path)
 
             template_symbol = symbol.extends
             if template_symbol is not None:
                 log.debug("Extends: %s", template_symbol)
-                template = next(symbol for symbol in remote_lib.symbols if symbol.entryName == template_symbol)
-                append_template_symbol_to_library(template, local_lib)
+                local_symbols.append_template(index.symbol(remote_symbols[template_symbol]))
 
-            append_symbol_to_library(symbol, local_lib)
+            local_symbols.append(symbol)
+    index.save()
 
     ki_pro.local_sym_lib = local_lib
-    local_lib.to_file(local_lib_path)
-    log.debug("Saved to: %s", local_lib_path)
+    ki_pro.session.mark_dirty(local_lib)
     return local_lib
 
 
-def loclib_footprints(ki_pro: KicadProject, args: argparse.Namespace) -> None:
-    ki_pro.create_fp_lib_dir()
+def loclib_footprints(ki_pro: KicadProject, args: argparse.Namespace) -> Dict[str, Footprint]:
+    """Add footprints used on the PCB to local library
 
-    library_mapping = get_fp_lib_mapping(ki_pro)
+    Footprints are only loaded in the session, they are written with the rest of documents.
+    Returns all footprints of local library by entry name."""
+    ki_pro.create_fp_lib_dir()
 
     if args.force:
         log.info("Localize footprints in force mode")
     else:
         log.info("Localize footprints in append mode")
     log.info("Processing : %s", os.path.basename(ki_pro.pcb_file))
-    board = Board.from_file(ki_pro.pcb_file)
+    board = ki_pro.session.board(ki_pro.pcb_file)
     footprints_list: List[Footprint] = []
     for footprint in board.footprints:
         if any(fp.entryName == footprint.entryName for fp in footprints_list):
@@ -321,157 +329,201 @@ def loclib_footprints(ki_pro: KicadProject, args: argparse.Namespace) -> None:
             continue
         footprints_list.append(footprint)
 
+    local_footprints: Dict[str, Footprint] = {}
     for footprint in footprints_list:
-        remote_lib_path = library_mapping.get(footprint.libraryNickname)
+        remote_lib = ki_pro.lib_tables.footprint_library(footprint.libraryNickname)
+        if remote_lib is None:
+            log.error(
+                "Library %s of %s not found in lib tables. Skipping", footprint.libraryNickname, footprint.entryName
+            )
+            continue
 
-        lib_fp_path = f"{remote_lib_path}/{footprint.entryName}.{ki_pro.fp_lib_ext}"
+        lib_fp_path = remote_lib.footprint_path(footprint.entryName)
         local_fp_path = f"{ki_pro.fp_lib_dir}/{footprint.entryName}.{ki_pro.fp_lib_ext}"
         log.debug("Processing: %s from %s", footprint.entryName, footprint.libraryNickname)
         if not os.path.exists(lib_fp_path):
             log.error("%s does not exists. Skipping", lib_fp_path)
             continue
-        if args.force:
-            if os.path.exists(local_fp_path):
-                # in case of the src and dst are the same file
-                if os.path.samefile(lib_fp_path, local_fp_path):
-                    log.debug("%s is local footprint. Skipping", footprint.entryName)
-                    continue
-                os.remove(local_fp_path)
-        else:
-            if os.path.exists(local_fp_path):
+        if os.path.exists(local_fp_path):
+            # in case of the src and dst are the same file
+            if os.path.samefile(lib_fp_path, local_fp_path):
+                log.debug("%s is local footprint. Skipping", footprint.entryName)
+                continue
+            if not args.force:
                 log.debug("Skipping  : %s already in local lib", footprint.entryName)
                 continue
-        shutil.copy(lib_fp_path, local_fp_path, follow_symlinks=True)
+        local_footprint = Footprint.from_file(lib_fp_path)
+        ki_pro.session.add(local_footprint, local_fp_path)
+        local_footprints[footprint.entryName] = local_footprint
         log.debug("Copied  : %s to %s", footprint.entryName, local_fp_path)
+    log.info("Localized %d footprints", len(local_footprints))
 
-    # process only symbols from local library
+    # Footprints already in local library
+    for fp_name in os.listdir(ki_pro.fp_lib_dir):
+        entry_name, ext = os.path.splitext(fp_name)
+        if ext == f".{ki_pro.fp_lib_ext}" and entry_name not in local_footprints:
+            local_footprints[entry_name] = ki_pro.session.footprint(f"{ki_pro.fp_lib_dir}/{fp_name}")
+    return local_footprints
 
 
-def loclib_3d_models(ki_pro: KicadProject, args: argparse.Namespace) -> None:
+def loclib_3d_models(ki_pro: KicadProject, args: argparse.Namespace, local_footprints: Dict[str, Footprint]) -> None:
     ki_pro.create_3d_model_lib_dir()
 
-    local_footprints = os.listdir(ki_pro.fp_lib_dir)
-
-    model_paths = []
-
-    for fp_name in local_footprints:
-        fp_path = f"{ki_pro.fp_lib_dir}/{fp_name}"
-        # print(fp_name)
-        footprint = Footprint.from_file(fp_path)
+    # Models are stored by file name, first footprint referencing the name wins
+    model_paths: Dict[str, str] = {}
+    for footprint in local_footprints.values():
         for model in footprint.models:
-            model_paths.append(os.path.expandvars(model.path))
+            model_path = os.path.expandvars(model.path)
+            model_paths.setdefault(os.path.basename(model_path), model_path)
 
-    for model_path in model_paths:
-        model_name = os.path.basename(model_path)
+    to_copy: Dict[str, str] = {}
+    for model_name, model_path in model_paths.items():
         local_model_path = f"{ki_pro.model_3d_lib_dir}/{model_name}"
         if not os.path.exists(model_path):
             log.error("Skipping  :  %s does not exists", model_path)
             continue
-        if args.force:
-            if os.path.exists(model_path):
-                # in case of the src and dst are the same file
-                if os.path.samefile(model_path, local_model_path):
-                    log.debug("Skipping  :  %s is local 3D model", model_name)
-                    continue
-                os.remove(local_model_path)
-        else:
-            if os.path.exists(local_model_path):
+        if os.path.exists(local_model_path):
+            # in case of the src and dst are the same file
+            if os.path.samefile(model_path, local_model_path):
+                log.debug("Skipping  :  %s is local 3D model", model_name)
+                continue
+            if not args.force:
                 log.debug("Skipping  : %s already in local lib", model_name)
                 continue
-        shutil.copy(model_path, local_model_path, follow_symlinks=True)
-        log.debug("Copied    : %s to %s", model_name, local_model_path)
-
+            os.remove(local_model_path)
+        to_copy[local_model_path] = model_path
+
+    with ThreadPoolExecutor(max_workers=default_jobs(), thread_name_prefix="loclib") as executor:
+        # Models with the same content are copied once, other local files are linked to the local copy.
+        # Library sources are never hardlinked, editing local model would change the library.
+        duplicates = find_duplicate_files(to_copy, executor)
+        copies = {
+            local_model_path: executor.submit(link_or_copy, model_path, local_model_path)
+            for local_model_path, model_path in to_copy.items()
+            if local_model_path not in duplicates
+        }
+        for local_model_path, future in copies.items():
+            log.debug("Copied    : %s to %s (%s)", to_copy[local_model_path], local_model_path, future.result())
+        for local_model_path, original in duplicates.items():
+            method = link_or_copy(original, local_model_path, hardlink=True)
+            log.debug("Copied    : %s to %s (same content, %s)", original, local_model_path, method)
+    log.info("Localized %d 3D models (%d duplicates)", len(to_copy), len(duplicates))
+
+
+def find_duplicate_files(files: Dict[str, str], executor: Executor) -> Dict[str, str]:
+    """Find sources with the same content
+
+    Parameters:
+        files: source paths by destination path
+    Returns: destination paths mapped to destination path of the first source with the same content.
+    Only files of equal size are hashed."""
+    by_size: Dict[int, List[str]] = {}
+    for destination, source in files.items():
+        by_size.setdefault(os.path.getsize(source), []).append(destination)
+    candidates = [
+        destination for destinations in by_size.values() if len(destinations) > 1 for destination in destinations
+    ]
+
+    duplicates: Dict[str, str] = {}
+    originals: Dict[str, str] = {}
+    digests = executor.map(file_sha256, [files[destination] for destination in candidates])
+    for destination, digest in zip(candidates, digests):
+        if digest in originals:
+            duplicates[destination] = originals[digest]
+        else:
+            originals[digest] = destination
+    return duplicates
 
-def update_links(ki_pro: KicadProject, local_lib: SymbolLib, args: argparse.Namespace) -> None:
-    local_symbols = []
 
-    for symbol in local_lib.symbols:
-        local_symbols.append(symbol.entryName)
+def update_links(
+    ki_pro: KicadProject, local_lib: SymbolLib, local_footprints: Dict[str, Footprint], args: argparse.Namespace
+) -> None:
+    local_symbols = {symbol.entryName for symbol in local_lib.symbols}
+    local_3d_models = set(os.listdir(ki_pro.model_3d_lib_dir))
+    fp_library_nickname = f"{ki_pro.name}-{ki_pro.relative_fp_lib_path}"
+    model_dir = f"${{KIPRJMOD}}/{ki_pro.relative_lib_path}/{ki_pro.relative_3d_model_path}"
 
-    local_footprints = os.listdir(ki_pro.fp_lib_dir)
-    local_3d_models = os.listdir(ki_pro.model_3d_lib_dir)
+    def link_footprint(symbol: Symbol) -> bool:
+        """Point Footprint property of the symbol to local library, returns True if it was changed"""
+        footprint_id = get_property(symbol, "Footprint")
+        if footprint_id is None or footprint_id == "":
+            log.warning(
+                "%s has no footprint assigned",
+                symbol.entryName,
+            )
+            return False
+        fp_entry_name = footprint_id.split(":", 1)[-1]
+        local_footprint_id = f"{fp_library_nickname}:{fp_entry_name}"
+        if footprint_id == local_footprint_id or fp_entry_name not in local_footprints:
+            return False
+        set_property(symbol, "Footprint", local_footprint_id)
+        return True
+
+    def link_models(footprint: Footprint) -> bool:
+        """Point 3D models of the footprint to local library, returns True if any path was changed"""
+        changed = False
+        for model in footprint.models:
+            model_name = os.path.basename(model.path)
+            local_model_path = f"{model_dir}/{model_name}"
+            if model.path != local_model_path and model_name in local_3d_models:
+                model.path = local_model_path
+                changed = True
+        return changed
 
     # Patch paths in schematic symbols
     for schematic_path in ki_pro.all_sch_files:
         log.info("Patching paths in: %s", os.path.basename(schematic_path))
-        schematic = Schematic().from_file(schematic_path)
+        schematic = ki_pro.session.schematic(schematic_path)
         log.debug("Schematic %s", schematic.filePath)
+        changed = False
         for symbol in schematic.libSymbols + schematic.schematicSymbols:
+            # skip symbols linked to local libraries by previous runs
+            if symbol.libraryNickname == ki_pro.name and (get_property(symbol, "Footprint") or "").startswith(
+                f"{fp_library_nickname}:"
+            ):
+                continue
             if symbol.entryName in local_symbols:
                 if not symbol.libraryNickname:
                     continue
-                symbol.libraryNickname = ki_pro.name
+                if symbol.libraryNickname != ki_pro.name:
+                    symbol.libraryNickname = ki_pro.name
+                    changed = True
             # skip power symbols footprint check
             # TODO replace with if symbol.isPower once it's documented
             if "#PWR" in get_property(symbol, "Reference"):
                 continue
-            footprint_id = get_property(symbol, "Footprint")
-            if footprint_id is None or footprint_id == "":
-                log.warning(
-                    "%s has no footprint assigned",
-                    symbol.entryName,
-                )
-                continue
-            if ":" in footprint_id:
-                fp_library_nickname, fp_entry_name = footprint_id.split(":", 1)
-            else:
-                fp_entry_name = footprint_id
-            if fp_entry_name in [os.path.splitext(fp_name)[0] for fp_name in local_footprints]:
-                fp_library_nickname = f"{ki_pro.name}-{ki_pro.relative_fp_lib_path}"
-                footprint_id = f"{fp_library_nickname}:{fp_entry_name}"
-                set_property(symbol, "Footprint", footprint_id)
-        schematic.to_file()
+            changed |= link_footprint(symbol)
+        # Schematics are written only if they were modified
+        if changed:
+            ki_pro.session.mark_dirty(schematic)
 
     # Patch paths in PCB footprints
     log.info("Patching paths in: %s", os.path.basename(ki_pro.pcb_file))
-    board = Board.from_file(ki_pro.pcb_file)
+    board = ki_pro.session.board(ki_pro.pcb_file)
+    changed = False
     for footprint in board.footprints:
-        if footprint.entryName in [os.path.splitext(fp_name)[0] for fp_name in local_footprints]:
-            footprint.libraryNickname = f"{ki_pro.name}-{ki_pro.relative_fp_lib_path}"
-
-            for idx, _ in enumerate(footprint.models):
-                model_name = os.path.basename(footprint.models[idx].path)
-                if model_name in local_3d_models:
-                    footprint.models[idx].path = (
-                        f"${{KIPRJMOD}}/{ki_pro.relative_lib_path}/{ki_pro.relative_3d_model_path}/{model_name}"
-                    )
-
-    board.to_file()
+        if footprint.entryName not in local_footprints:
+            continue
+        if footprint.libraryNickname != fp_library_nickname:
+            footprint.libraryNickname = fp_library_nickname
+            changed = True
+        changed |= link_models(footprint)
+    if changed:
+        ki_pro.session.mark_dirty(board)
 
     # Patch paths in local symbol library
     log.info("Patching paths in: %s", os.path.basename(local_lib.filePath))
     for symbol in local_lib.symbols:
-        footprint_id = get_property(symbol, "Footprint")
-        if footprint_id is None or footprint_id == "":
-            log.warning(
-                "%s has no footprint assigned",
-                symbol.entryName,
-            )
-            continue
-        if ":" in footprint_id:
-            fp_library_nickname, fp_entry_name = footprint_id.split(":", 1)
-        else:
-            fp_entry_name = footprint_id
-        if fp_entry_name in [os.path.splitext(fp_name)[0] for fp_name in local_footprints]:
-            fp_library_nickname = f"{ki_pro.name}-{ki_pro.relative_fp_lib_path}"
-            footprint_id = f"{fp_library_nickname}:{fp_entry_name}"
-            set_property(symbol, "Footprint", footprint_id)
-    local_lib.to_file()
+        link_footprint(symbol)
+    ki_pro.session.mark_dirty(local_lib)
 
     # Patch 3D model paths in local footprints library
     log.info("Patching 3d model path local footprints")
-    for fp_name in local_footprints:
+    for fp_name, footprint in local_footprints.items():
         log.debug("Patching 3d model path in: %s", fp_name)
-        fp_path = f"{ki_pro.fp_lib_dir}/{fp_name}"
-        # print(fp_name)
-        footprint = Footprint.from_file(fp_path)
-        for idx, _ in enumerate(footprint.models):
-            model_name = os.path.basename(footprint.models[idx].path)
-            if model_name in local_3d_models:
-                footprint.models[idx].path = (
-                    f"${{KIPRJMOD}}/{ki_pro.relative_lib_path}/{ki_pro.relative_3d_model_path}/{model_name}"
-                )
-        footprint.to_file(fp_path)
+        # Footprints are written only if they were added or modified
+        if link_models(footprint):
+            ki_pro.session.mark_dirty(footprint)
 
 
 def add_lib_to_sym_lib_table(lib_name: str, symb_lib_path: str, sym_lib_table_path: str = "sym-lib-table") -> None:
@@ -512,18 +564,25 @@ def loclib_project(ki_pro: KicadProject, args: argparse.Namespace) -> None:
     """Create local library from components used in schematic/pcb"""
     if args.cleanup:
         cleanup_schematic_lib_symbols(ki_pro)
+        ki_pro.session.flush()
         return
 
-    ki_pro.load_kicad_environ_vars()
+    ki_pro.lib_tables.load_environment()
+    # Every document is loaded once in the session, patched in memory and written at the end
+    log.info("[1/5] Localizing symbols")
     kiprjmod_lib = loclib_symbols(ki_pro, args)
 
     # Dump symbols and footprints to library in project folder
-    loclib_footprints(ki_pro, args)
-    loclib_3d_models(ki_pro, args)
+    log.info("[2/5] Localizing footprints")
+    local_footprints = loclib_footprints(ki_pro, args)
+    log.info("[3/5] Localizing 3D models")
+    loclib_3d_models(ki_pro, args, local_footprints)
 
     # Update symbol/footprint library links
-    update_links(ki_pro, kiprjmod_lib, args)
+    log.info("[4/5] Updating library links")
+    update_links(ki_pro, kiprjmod_lib, local_footprints, args)
 
+    log.info("[5/5] Saving project files")
     # Generate/extend sym-lib-table
     kiprjmod_sym_lib_path = f"${{KIPRJMOD}}/{ki_pro.relative_lib_path}/{ki_pro.name}.{ki_pro.sym_lib_ext}"
     add_lib_to_sym_lib_table(lib_name=ki_pro.name, symb_lib_path=kiprjmod_sym_lib_path)
@@ -531,4 +590,4 @@ def loclib_project(ki_pro: KicadProject, args: argparse.Namespace) -> None:
     # Generate/extend fp-lib-table
     kiprjmod_fp_lib_path = f"${{KIPRJMOD}}/{ki_pro.relative_lib_path}/{ki_pro.name}-footprints/"
     add_lib_to_fp_lib_table(lib_name=f"{ki_pro.name}-footprints", fp_lib_path=kiprjmod_fp_lib_path)
-    prettify(ki_pro, argparse.Namespace())
+    ki_pro.session.flush()
@@ -11,16 +11,19 @@ from kiutils.utils.sexpr import parse_sexp
 from PIL import Image as PIL_Image
 from xdg import BaseDirectory
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
-from .prettify import run as prettify
 
 log = logging.getLogger(__name__)
 
+NAME = "logos"
+HELP = COMMANDS[NAME].help
+
 BUILTIN_LOGO_PATH = Path(__file__).parent.parent / "logos"
 
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    logos_parser = subparsers.add_parser("logos", help="Adds selected logo to the schematic.")
+    logos_parser = subparsers.add_parser(NAME, help=HELP)
     logos_parser.add_argument("logo", nargs="*", metavar="<logo file>", help="Name of the logo file.")
     logos_parser.add_argument(
         "-s",
@@ -79,7 +82,7 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     # Load schematics
     schematics = []
     for path in kicad_project.all_sch_files:
-        schematics.append(Schematic.from_file(path))
+        schematics.append(kicad_project.session.schematic(path))
 
     # Check page size
     for schematic in schematics:
@@ -89,11 +92,11 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
         logos.extend(new_logos)
         position_logos(logos=logos, schematic=schematic, args=args)
         schematic.graphicalItems.extend(new_logos)
-        schematic.to_file()
-        log.info(f"Saved {schematic.filePath}")
+        kicad_project.session.mark_dirty(schematic)
         for logo in args.logo:
             log.info(f"Added {logo} to {schematic.filePath}")
-    prettify(kicad_project, argparse.Namespace())
+    for path in kicad_project.session.flush():
+        log.info(f"Saved {path}")
 
 
 # Check page size (acceptable sizes are A3/A4)
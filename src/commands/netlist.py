@@ -3,15 +3,19 @@
 import argparse
 import logging
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 from common.kmake_helper import run_kicad_cli
 
 log = logging.getLogger(__name__)
 
+NAME = "netlist"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     """Register parser and its arguments as subparser"""
-    netlist_parser = subparsers.add_parser("netlist", help="Create KiCad netlist file.")
+    netlist_parser = subparsers.add_parser(NAME, help=HELP)
     netlist_parser.set_defaults(func=run)
 
 
@@ -30,4 +34,9 @@ def generate_netlist(input_sch_file: str, output_netlist_file: str) -> None:
 
 def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     kicad_project.create_fab_dir()
-    generate_netlist(kicad_project.sch_root, f"{kicad_project.relative_fab_path}/netlist.net")
+    output_file = f"{kicad_project.fab_dir}/netlist.net"
+    target = kicad_project.build_cache.target("netlist", args, kicad_project.all_sch_files, [output_file])
+    if target.up_to_date():
+        return
+    generate_netlist(kicad_project.sch_root, output_file)
+    target.record()
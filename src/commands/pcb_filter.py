@@ -14,6 +14,7 @@ from kiutils.items.fpitems import FpText
 from kiutils.items.gritems import GrCircle, GrPoly, GrRect
 from kiutils.items.dimensions import Dimension, DimensionFormat, DimensionStyle
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 from common.kmake_helper import get_property
 from .prettify import run as prettify
@@ -24,9 +25,12 @@ from math import sin, cos, radians, inf
 
 log = logging.getLogger(__name__)
 
+NAME = "pcb-filter"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    parser = subparsers.add_parser("pcb-filter", help="Create *.kicad_pcb ")
+    parser = subparsers.add_parser(NAME, help=HELP)
     parser.add_argument(
         "-o",
         "--outfile",
@@ -291,10 +295,7 @@ def pcb_filter_run(
 
     log.info(f"Saving filtred PCB: {outfile}")
     board.to_file(outfile)
-    pcb_file_org = ki_pro.pcb_file
-    ki_pro.pcb_file = outfile
-    prettify(ki_pro, argparse.Namespace())
-    ki_pro.pcb_file = pcb_file_org
+    prettify(ki_pro, argparse.Namespace(files=[outfile]))
 
 
 def copy_edge_from_footprint(board: Board) -> None:
@@ -0,0 +1,181 @@
+"""Run several subcommands in a single kmake process"""
+
+import argparse
+import importlib
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+
+from commands import COMMANDS
+from common.kicad_project import KicadProject
+from common.kmake_helper import default_jobs, set_max_jobs
+
+log = logging.getLogger(__name__)
+
+NAME = "run"
+HELP = COMMANDS[NAME].help
+
+# Token separating subcommands on the command line
+STAGE_SEPARATOR = "+"
+
+# Options of the main parser passed to every stage
+GLOBAL_OPTIONS = ["debug", "force", "explain"]
+
+# Commands that only read project files (outputs go to fab/doc/3d-model),
+# they can run concurrently. All other commands are treated as modifying the project.
+READ_ONLY_COMMANDS = ["bom", "gerber", "impedance", "netlist", "pnp", "sch", "stackup-export", "step", "version"]
+
+
+@dataclass
+class Stage:
+    """Single subcommand of the pipeline
+
+    Attributes:
+        index: position of the stage on the command line
+        name: subcommand name
+        args: parsed subcommand arguments
+        depends_on: indices of stages that have to finish before this one starts
+    """
+
+    index: int
+    name: str
+    args: argparse.Namespace
+    depends_on: Set[int] = field(default_factory=set)
+
+    def __str__(self) -> str:
+        return f"#{self.index} {self.name}"
+
+
+def add_subparser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        NAME,
+        help=HELP,
+        description="Run several subcommands in a single kmake process, "
+        "e.g. `kmake run gerber + pnp + bom --all + sch`. "
+        f"Stages are separated by `{STAGE_SEPARATOR}`, each stage is a subcommand followed by its arguments. "
+        "Project files are parsed once and shared between stages. "
+        "Stages that only generate outputs run concurrently, "
+        "stages modifying the project wait for all previous stages (and block following ones).",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Maximum number of stages and of kicad-cli processes running at the same time "
+        "(default: KMAKE_JOBS or number of CPUs).",
+    )
+    parser.add_argument(
+        "stages",
+        nargs=argparse.REMAINDER,
+        metavar=f"SUBCOMMAND [ARGS] [{STAGE_SEPARATOR} SUBCOMMAND [ARGS]] ...",
+        help=f"Subcommands with their arguments, separated by `{STAGE_SEPARATOR}`.",
+    )
+    parser.set_defaults(func=run)
+
+
+def split_stages(argv: List[str]) -> List[List[str]]:
+    """Split command line into subcommands with their arguments
+
+    Stages are split only on `STAGE_SEPARATOR`, so arguments named like subcommands
+    (e.g. preset or file called `step`) are passed to the stage."""
+    names = [name for name in COMMANDS if name != NAME]
+    stages: List[List[str]] = [[]]
+    for token in argv:
+        if token == STAGE_SEPARATOR:
+            stages.append([])
+        else:
+            stages[-1].append(token)
+    if stages == [[]]:
+        return []
+    for stage in stages:
+        if not stage:
+            log.error(f"Expected subcommand after `{STAGE_SEPARATOR}`")
+            exit(2)
+        if stage[0] not in names:
+            log.error(f"Expected subcommand, got `{stage[0]}`")
+            exit(2)
+    return stages
+
+
+def parse_stage(index: int, argv: List[str], global_args: argparse.Namespace) -> Stage:
+    """Parse arguments of a single stage using parser of its subcommand"""
+    parser = argparse.ArgumentParser(prog="kmake run")
+    subparsers = parser.add_subparsers(dest="subcommand", required=True)
+    importlib.import_module(f"commands.{COMMANDS[argv[0]].module}").add_subparser(subparsers)
+    args = parser.parse_args(argv)
+    for option in GLOBAL_OPTIONS:
+        setattr(args, option, getattr(global_args, option, False))
+    return Stage(index, argv[0], args)
+
+
+def build_dag(stages: List[Stage]) -> None:
+    """Set dependencies of the stages
+
+    Stage modifying the project depends on all previous stages.
+    Read-only stage depends on the last modifying stage and
+    on previous stage of the same subcommand (they share output/temporary files)."""
+    last_writer = None
+    last_by_name: Dict[str, int] = {}
+    for stage in stages:
+        if stage.name not in READ_ONLY_COMMANDS:
+            stage.depends_on = {s.index for s in stages[: stage.index]}
+            last_writer = stage.index
+        else:
+            if last_writer is not None:
+                stage.depends_on.add(last_writer)
+            if stage.name in last_by_name:
+                stage.depends_on.add(last_by_name[stage.name])
+        last_by_name[stage.name] = stage.index
+
+
+def execute(kicad_project: KicadProject, stages: List[Stage], jobs: int) -> None:
+    """Run stages respecting their dependencies, at most `jobs` at the same time
+
+    On first failure no new stages are started, running ones are awaited and the error is reraised."""
+    pending = list(stages)
+    done: Set[int] = set()
+    running: Dict[Future, Stage] = {}
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="kmake-stage") as executor:
+        while pending or running:
+            for stage in [s for s in pending if s.depends_on <= done]:
+                if len(running) >= jobs:
+                    break
+                log.info(f"Starting stage {stage}")
+                pending.remove(stage)
+                running[executor.submit(stage.args.func, kicad_project, stage.args)] = stage
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                if future.exception() is not None:
+                    log.error(f"Stage {stage} failed, waiting for running stages to finish")
+                    wait(running)
+                    future.result()
+                log.info(f"Finished stage {stage}")
+                done.add(stage.index)
+
+
+def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
+    if args.jobs < 1:
+        log.error("Number of jobs has to be positive")
+        exit(2)
+
+    stages = [parse_stage(index, argv, args) for index, argv in enumerate(split_stages(args.stages))]
+    if not stages:
+        log.error("No subcommands to run")
+        exit(2)
+
+    build_dag(stages)
+    for stage in stages:
+        log.debug(f"Stage {stage} depends on: {sorted(stage.depends_on)}")
+
+    # Stages share the limit of kicad-cli processes instead of each of them running `--jobs` processes
+    set_max_jobs(args.jobs)
+    try:
+        execute(kicad_project, stages, args.jobs)
+    finally:
+        set_max_jobs(None)
+    kicad_project.session.flush()
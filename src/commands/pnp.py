@@ -1,20 +1,30 @@
 import argparse
 import logging
 import os
-import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cmp_to_key
+from typing import List, Optional
 
 from kiutils.board import Board
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
-from common.kmake_helper import run_kicad_cli
+from common.kmake_helper import KicadCliJobs, get_property, run_kicad_cli, str_num_cmp
 
 log = logging.getLogger(__name__)
 
+NAME = "pnp"
+HELP = COMMANDS[NAME].help
+
+# KiCad internal units (nm) per mm
+IU_PER_MM = 1e6
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     """Adds pnp subparser to passed parser"""
 
-    pnp_parser = subparsers.add_parser("pnp", help="Create footprint position files.")
+    pnp_parser = subparsers.add_parser(NAME, help=HELP)
     pnp_parser.add_argument(
         "-t",
         "--tht",
@@ -42,28 +52,113 @@ def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     pnp_parser.set_defaults(func=run)
 
 
-def convert_other_to_smd(board: Board) -> Board:
-    """Converts components of type `undefined` to `smd` type"""
-    for footprint in board.footprints:
-        if footprint.attributes.type is None:
-            footprint.attributes.type = "smd"
-    return board
+@dataclass
+class Placement:
+    """Footprint entry of position file"""
 
+    reference: str
+    value: str
+    package: str
+    x: float
+    y: float
+    rotation: float
+    side: str
 
-def convert_virual_to_smd(board: Board) -> Board:
-    """Converts components of type `virtual` to `smd` type"""
-    for footprint in board.footprints:
-        if footprint.attributes.type == "virtual":
-            footprint.attributes.type = "smd"
-    return board
 
+def ki_round(value: float) -> int:
+    """Round half away from zero, as KiCad does when converting mm to internal units"""
+    return int(value - 0.5) if value < 0 else int(value + 0.5)
 
-def unset_exclude_from_position_file(board: Board) -> Board:
-    """Unsets `Exclude from position file` field on the components"""
+
+def normalize_angle(angle: float) -> float:
+    """Normalize angle to (-180, 180] range, as KiCad does for footprint orientation"""
+    while angle <= -180:
+        angle += 360
+    while angle > 180:
+        angle -= 360
+    return angle
+
+
+def get_placements(
+    board: Board,
+    side: str,
+    smd_only: bool = True,
+    include_virtual: bool = False,
+    include_other: bool = False,
+    include_excluded: bool = False,
+    drill_origin: bool = False,
+    bottom_negate_x: bool = False,
+) -> List[Placement]:
+    """Collect footprints placed on the given side ("front" or "back"), in order used by KiCad
+
+    Mirrors filters & coordinate conversion of `kicad-cli pcb export pos`. Footprints of `virtual`/undefined type
+    or excluded from position files can be included (`include_*`) without modifying the board."""
+    layer = "F.Cu" if side == "front" else "B.Cu"
+    offset_x = offset_y = 0
+    if drill_origin and board.setup.auxAxisOrigin is not None:
+        offset_x = ki_round(board.setup.auxAxisOrigin.X * IU_PER_MM)
+        offset_y = ki_round(board.setup.auxAxisOrigin.Y * IU_PER_MM)
+
+    placements = []
     for footprint in board.footprints:
-        if footprint.attributes.excludeFromPosFiles is True:
-            footprint.attributes.excludeFromPosFiles = False
-    return board
+        if footprint.layer != layer:
+            continue
+        if footprint.attributes.excludeFromPosFiles and not include_excluded:
+            continue
+        fp_type = footprint.attributes.type
+        if (include_virtual and fp_type == "virtual") or (include_other and fp_type is None):
+            fp_type = "smd"
+        if smd_only and fp_type != "smd":
+            continue
+
+        x = ki_round(footprint.position.X * IU_PER_MM) - offset_x
+        y = ki_round(footprint.position.Y * IU_PER_MM) - offset_y
+        if layer == "B.Cu" and bottom_negate_x:
+            x = -x
+        placements.append(
+            Placement(
+                reference=get_property(footprint, "Reference") or "",
+                value=get_property(footprint, "Value") or "",
+                package=footprint.entryName,
+                # Keep the coordinates in the usual Y axis direction
+                x=x * (1.0 / IU_PER_MM),
+                y=-y * (1.0 / IU_PER_MM),
+                rotation=normalize_angle(footprint.position.angle or 0.0),
+                side="top" if layer == "F.Cu" else "bottom",
+            )
+        )
+    placements.sort(key=cmp_to_key(lambda a, b: str_num_cmp(a.reference, b.reference)))
+    return placements
+
+
+def format_position_file(placements: List[Placement], side: str, output_format: str, kicad_version: str) -> str:
+    """Format position file the same way as `kicad-cli pcb export pos` (in mm)"""
+    if output_format == "csv":
+        lines = ["Ref,Val,Package,PosX,PosY,Rot,Side\n"]
+        for p in placements:
+            lines.append(f'"{p.reference}","{p.value}","{p.package}",{p.x:f},{p.y:f},{p.rotation:f},{p.side}\n')
+        return "".join(lines)
+
+    ref_len = max([8] + [len(p.reference) for p in placements])
+    val_len = max([8] + [len(p.value) for p in placements])
+    pkg_len = max([16] + [len(p.package) for p in placements])
+    created = datetime.now().astimezone().strftime("%Y-%m-%dT%H:%M:%S%z")
+    lines = [
+        f"### Footprint positions - created on {created} ###\n",
+        f"### Printed by KiCad version {kicad_version}\n",
+        "## Unit = mm, Angle = deg.\n",
+        f"## Side : {'top' if side == 'front' else 'bottom'}\n",
+        "%-*s  %-*s  %-*s  %9.9s  %9.9s  %8.8s  %s\n"
+        % (ref_len, "# Ref", val_len, "Val", pkg_len, "Package", "PosX", "PosY", "Rot", "Side"),
+    ]
+    for p in placements:
+        ref, val, pkg = (text.replace(" ", "_") for text in (p.reference, p.value, p.package))
+        lines.append(
+            "%-*s  %-*s  %-*s  %9.4f  %9.4f  %8.4f  %s\n"
+            % (ref_len, ref, val_len, val, pkg_len, pkg, p.x, p.y, p.rotation, p.side)
+        )
+    lines.append("## End\n")
+    return "".join(lines)
 
 
 def export_pnp(
@@ -78,8 +173,11 @@ def export_pnp(
     exclude_fp_th: bool = False,
     gerber_board_edge: bool = False,
     verbose: bool = False,
+    jobs: Optional[KicadCliJobs] = None,
 ) -> None:
-    """Generate pick and place position file from the given PCB file."""
+    """Generate pick and place position file from the given PCB file.
+
+    If `jobs` is set, export is only submitted to the job runner."""
 
     assert board != "", "Empty board filename"
     assert output_file_name != "", "Empty output file name"
@@ -104,35 +202,14 @@ def export_pnp(
     if gerber_board_edge:
         pnp_export_cli_command.extend(["--gerber-board-edge"])
 
-    run_kicad_cli(pnp_export_cli_command, verbose)
-    log.info("Saved to %s", output_file_name.replace(os.getcwd(), ""))
+    run_kicad_cli(pnp_export_cli_command, verbose, jobs)
+    if jobs is None:
+        log.info("Saved to %s", output_file_name.replace(os.getcwd(), ""))
 
 
 def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     """Run pnp command"""
-    board_path = kicad_project.pcb_file
     kicad_project.create_fab_dir()
-    temporary_board_file = None
-
-    if args.tht:
-        log.info("Added 'tht' flag. Through hole components treated as SMD.")
-
-    if args.virtual or args.excluded or args.other:
-        log.info("Loading PCB")
-        board = Board.from_file(kicad_project.pcb_file)
-        log.info("Creating tmp PCB for manipulation and using it for output generation")
-        temporary_board_file = tempfile.NamedTemporaryFile(suffix=".kicad_pcb")
-        board.filePath = temporary_board_file.name
-
-        if args.virtual:
-            convert_virual_to_smd(board)
-        if args.other:
-            convert_other_to_smd(board)
-        if args.excluded:
-            unset_exclude_from_position_file(board)
-
-        board.to_file(temporary_board_file.name)
-        board_path = temporary_board_file.name
 
     pnp_path_base = f"{kicad_project.fab_dir}/{kicad_project.name}"
 
@@ -142,18 +219,36 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
         ("front", "csv", "-top-pos.csv"),
         ("back", "csv", "-bottom-pos.csv"),
     ]
-    for side, output_format, suffix in combinations:
-        export_pnp(
-            board_path,
-            output_file_name=pnp_path_base + suffix,
-            side=side,
-            output_format=output_format,
-            drill_origin=True,
+    target = kicad_project.build_cache.target(
+        "pnp", args, [kicad_project.pcb_file], [pnp_path_base + suffix for _, _, suffix in combinations]
+    )
+    if target.up_to_date():
+        return
+
+    if args.tht:
+        log.info("Added 'tht' flag. Through hole components treated as SMD.")
+
+    # Position files are generated from the parsed board, instead of loading it in kicad-cli for every file
+    log.info("Loading PCB")
+    board = kicad_project.session.board(kicad_project.pcb_file)
+    placements = {
+        side: get_placements(
+            board,
+            side,
             smd_only=not args.tht,
+            include_virtual=args.virtual,
+            include_other=args.other,
+            include_excluded=args.excluded,
+            drill_origin=True,
             bottom_negate_x=True,
-            verbose=args.debug,
         )
-
-    if temporary_board_file:
-        log.info("Removing tmp PCB file")
-        temporary_board_file.close()
+        for side in ["front", "back"]
+    }
+    for side, output_format, suffix in combinations:
+        output_file_name = pnp_path_base + suffix
+        with open(output_file_name, "w", encoding="utf-8") as output_file:
+            output_file.write(
+                format_position_file(placements[side], side, output_format, kicad_project.kicad_version_full)
+            )
+        log.info("Saved to %s", output_file_name.replace(os.getcwd(), ""))
+    target.record()
@@ -3,13 +3,17 @@ import logging
 import fileinput
 
 from pathlib import Path
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 
 log = logging.getLogger(__name__)
 
+NAME = "rename"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    parser = subparsers.add_parser("rename", help="Rename project files.")
+    parser = subparsers.add_parser(NAME, help=HELP)
     parser.add_argument("new_name", action="store", type=str, metavar="<new_name>", help="New name of project.")
     parser.set_defaults(func=run)
 
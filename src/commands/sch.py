@@ -1,14 +1,18 @@
 import argparse
 import logging
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 from common.kmake_helper import run_kicad_cli
 
 log = logging.getLogger(__name__)
 
+NAME = "sch"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    sch_parser = subparsers.add_parser("sch", help="Generate schematics in PDF format.")
+    sch_parser = subparsers.add_parser(NAME, help=HELP)
     sch_parser.add_argument(
         "-t",
         "--theme",
@@ -23,8 +27,13 @@ def add_subparser(subparsers: argparse._SubParsersAction) -> None:
 
 def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     kicad_project.create_doc_dir()
+    output_file = f"{kicad_project.doc_dir}/{kicad_project.name}-schematic.pdf"
+    target = kicad_project.build_cache.target("sch", args, kicad_project.all_sch_files, [output_file])
+    if target.up_to_date():
+        return
     log.info("Generating schematic")
-    export_schematic(kicad_project.sch_root, f"{kicad_project.doc_dir}/{kicad_project.name}-schematic.pdf", args.theme)
+    export_schematic(kicad_project.sch_root, output_file, args.theme)
+    target.record()
 
 
 def export_schematic(
@@ -7,10 +7,14 @@ from json import JSONDecodeError
 
 from kiutils.dru import DesignRules
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 
 log = logging.getLogger(__name__)
 
+NAME = "set-drc"
+HELP = COMMANDS[NAME].help
+
 
 def read_json_file(file_path: str) -> dict:
     """Read project file.
@@ -465,7 +469,7 @@ def set_dru_rules(template: str, target_file: str) -> None:
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     """Register parser and its arguments as subparser."""
 
-    set_drc_parser = subparsers.add_parser("set-drc", help="Sets `DRC` and `custom DRC` rules from provided template.")
+    set_drc_parser = subparsers.add_parser(NAME, help=HELP)
     set_drc_parser.add_argument(
         "-s",
         nargs="?",
@@ -11,10 +11,15 @@ from typing import Any, Dict, List, Union
 from kiutils.board import Board
 from kiutils.items.brditems import StackupLayer, LayerToken
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
+from common.sexpr_reader import load_board
 
 log = logging.getLogger(__name__)
 
+NAME = "stackup-export"
+HELP = COMMANDS[NAME].help
+
 
 # Minor version should be with any changes to format.
 # Major only when breaking changes are implemented
@@ -25,7 +30,7 @@ FILENAME = "stackup"
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     """Adds stackup-export subparser to passed parser"""
-    stackup_export_parser = subparsers.add_parser("stackup-export", help="Export stackup information to file.")
+    stackup_export_parser = subparsers.add_parser(NAME, help=HELP)
     stackup_export_parser.add_argument("-o", dest="output_filename", help="Change export file name/location.")
     stackup_export_parser.add_argument(
         "--legacy-csv",
@@ -38,7 +43,7 @@ def add_subparser(subparsers: argparse._SubParsersAction) -> None:
 
 def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     """Run stackup-export command"""
-    board = Board().from_file(kicad_project.pcb_file)
+    board = load_board(kicad_project.pcb_file, include=["layers", "setup"])
     stackup = {"layers": export_stackup(board)}
     kicad_project.create_fab_dir()
 
@@ -2,17 +2,25 @@
 
 import argparse
 import logging
+import os
 import re
+from typing import List
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 from common.kmake_helper import run_kicad_cli
-from kiutils.board import Board
+from common.sexpr_reader import SexprReader, load_board
 
 log = logging.getLogger(__name__)
 
+NAME = "step"
+HELP = COMMANDS[NAME].help
+
+MODEL_REGEX = re.compile(rb'\(model\s+(?:"((?:[^"\\]|\\.)*)"|([^\s()]+))')
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    step_parser = subparsers.add_parser("step", help="Export 3D models of PCB in STEP format.")
+    step_parser = subparsers.add_parser(NAME, help=HELP)
     step_parser.set_defaults(func=run)
 
 
@@ -22,9 +30,16 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     step_file_name = f"{kicad_project.name}.step"
     output_file_path = f"{kicad_project.step_model3d_dir}/{step_file_name}"
 
+    target = kicad_project.build_cache.target(
+        "step", args, [kicad_project.pcb_file, *get_model_paths(kicad_project)], [output_file_path]
+    )
+    if target.up_to_date():
+        return
+
     log.info("Exporting 3D STEP as %s", output_file_path)
 
-    board = Board.from_file(kicad_project.pcb_file)
+    # Only stackup is needed to get mask color
+    board = load_board(kicad_project.pcb_file, include=["layers", "setup"])
     mask_color = [sl.color for sl in board.setup.stackup.layers if sl.name == "F.Mask"][0]
 
     preset_colors = {
@@ -62,6 +77,22 @@ def run(kicad_project: KicadProject, args: argparse.Namespace) -> None:
     step_file = re.sub(match_r, sub_color, step_file)
     with open(output_file_path, mode="w") as sfile:
         sfile.write(step_file)
+    target.record()
+
+
+def get_model_paths(kicad_project: KicadProject) -> List[str]:
+    """Returns paths of 3D models used by footprints, with KiCad path variables expanded"""
+    # Path variables may be defined in kicad_common.json
+    kicad_project.lib_tables.load_environment()
+    env = dict(os.environ, KIPRJMOD=kicad_project.dir)
+    paths = set()
+    with SexprReader(kicad_project.pcb_file) as reader:
+        for match in MODEL_REGEX.finditer(reader.data):
+            quoted, unquoted = match.groups()
+            model_path = quoted.decode().replace('\\"', '"') if quoted is not None else unquoted.decode()
+            model_path = re.sub(r"\$\{(\w+)\}", lambda m: env.get(m.group(1), m.group(0)), model_path)
+            paths.add(os.path.join(kicad_project.dir, model_path))
+    return sorted(paths)
 
 
 def export_step(
@@ -2,14 +2,18 @@ from importlib.metadata import version
 from pip._internal.operations import freeze
 import argparse
 import logging
+from commands import COMMANDS
 from common.kicad_project import KicadProject
 
 log = logging.getLogger(__name__)
 
+NAME = "version"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
     """Register parser and its arguments as subparser."""
-    init_project_parser = subparsers.add_parser("version", help="Print kmake, kiutils & kicad version")
+    init_project_parser = subparsers.add_parser(NAME, help=HELP)
     init_project_parser.set_defaults(func=run)
 
 
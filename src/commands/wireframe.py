@@ -5,11 +5,13 @@ import json
 
 from kiutils.board import Board
 
+from commands import COMMANDS
 from common.kicad_project import KicadProject
-from common.kmake_helper import run_kicad_cli
+from common.kmake_helper import KicadCliJobs
 
 from .pcb_filter import pcb_filter_run
 
+from contextlib import ExitStack
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 from typing import List, Dict, Any
 from pathlib import Path
@@ -17,11 +19,12 @@ import shutil
 
 log = logging.getLogger(__name__)
 
+NAME = "wireframe"
+HELP = COMMANDS[NAME].help
+
 
 def add_subparser(subparsers: argparse._SubParsersAction) -> None:
-    parser = subparsers.add_parser(
-        "wireframe", help="Split outline layer to top/bottom and optionally export it as .svg and .gbr files."
-    )
+    parser = subparsers.add_parser(NAME, help=HELP)
     parser.add_argument(
         "-r",
         "--reset",
@@ -228,8 +231,11 @@ def generate_wireframe(
     output_folder = os.path.join(kpro.fab_dir, "wireframe/")
     os.makedirs(output_folder, exist_ok=True)
 
-    for side in sides:
-        with NamedTemporaryFile(suffix=".kicad_pcb") as fp:
+    # Exports of a side run in the background while next side is being filtered,
+    # temporary boards & directories are removed after all exports finish (or are cancelled)
+    with ExitStack() as temp_files, KicadCliJobs() as jobs:
+        for side in sides:
+            fp = temp_files.enter_context(NamedTemporaryFile(suffix=".kicad_pcb"))
             if side != "":
                 oname_side = f"{oname}_{side}"
             else:
@@ -253,11 +259,19 @@ def generate_wireframe(
                     oname_side_l = oname_side
                 else:
                     oname_side_l = oname_side + "_" + layer.replace(".", "_")
-                do_exports(fp.name, output_folder, oname_side_l, layer, side)
+                do_exports(fp.name, output_folder, oname_side_l, layer, side, jobs, temp_files)
 
 
-def do_exports(ifile: str, output_folder: str, oname_side_l: str, layer: str, side: str) -> None:
-    """Run kicad-cli and do exports to SVG and gerber"""
+def do_exports(
+    ifile: str,
+    output_folder: str,
+    oname_side_l: str,
+    layer: str,
+    side: str,
+    jobs: KicadCliJobs,
+    temp_files: ExitStack,
+) -> None:
+    """Submit kicad-cli exports to SVG and gerber, temporary files are registered in `temp_files`"""
     # SVG
     outfile = os.path.join(output_folder, "wireframe_" + oname_side_l + ".svg")
     log.info(f"Exporting {layer} svg to {outfile}")
@@ -279,30 +293,33 @@ def do_exports(ifile: str, output_folder: str, oname_side_l: str, layer: str, si
     if side == "bottom":
         svg_export_cli_command.append("--mirror")
 
-    run_kicad_cli(svg_export_cli_command, True)
+    jobs.submit(svg_export_cli_command, True)
 
     # GERBER
-    outfile = os.path.join(output_folder, "wireframe_" + oname_side_l + ".gbr")
+    gerber_outfile = os.path.join(output_folder, "wireframe_" + oname_side_l + ".gbr")
     base_layer, _, common_layers = layer.partition(",")
-    log.info(f"Exporting {layer} gerber to {outfile}")
-    with TemporaryDirectory() as tempdir:
-        gerber_export_cli_command = [
-            "pcb",
-            "export",
-            "gerbers",
-            ifile,
-            "-o",
-            tempdir,
-            "--precision",
-            "6",
-            "--no-protel-ext",
-            "--layers",
-            base_layer,
-            "--common-layers",
-            common_layers,
-        ]
-        run_kicad_cli(gerber_export_cli_command, True)
-        shutil.move(next(Path(tempdir).glob("*.gbr")), outfile)
+    log.info(f"Exporting {layer} gerber to {gerber_outfile}")
+    tempdir = temp_files.enter_context(TemporaryDirectory())
+    gerber_export_cli_command = [
+        "pcb",
+        "export",
+        "gerbers",
+        ifile,
+        "-o",
+        tempdir,
+        "--precision",
+        "6",
+        "--no-protel-ext",
+        "--layers",
+        base_layer,
+        "--common-layers",
+        common_layers,
+    ]
+
+    def move_gerber() -> None:
+        shutil.move(next(Path(tempdir).glob("*.gbr")), gerber_outfile)
+
+    jobs.submit(gerber_export_cli_command, True, then=move_gerber)
 
 
 def reset_footprint_val_props(file: str) -> None:
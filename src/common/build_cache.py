@@ -0,0 +1,182 @@
+"""Incremental builds of generated outputs (fab/, doc/, 3d-model/)"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from xdg import BaseDirectory
+
+log = logging.getLogger(__name__)
+
+# Arguments that don't change generated outputs
+IGNORED_ARGS = ["func", "debug", "force", "explain"]
+
+
+class BuildCache:
+    """Manifest of outputs generated in the project and hashes of inputs used to generate them
+
+    Manifest is stored in `$XDG_CACHE_HOME/kmake/builds`, one file per project directory.
+    Input files are hashed by content, hashes are reused while file mtime & size don't change.
+    """
+
+    def __init__(self, project_dir: str, kicad_version: str, common_inputs: List[str]) -> None:
+        """Parameters:
+        project_dir: directory of the KiCad project
+        kicad_version: full kicad-cli version, outputs are rebuilt when it changes
+        common_inputs: files every target depends on (project file, lib tables)
+        """
+        self.project_dir = project_dir
+        self.kicad_version = kicad_version
+        self.common_inputs = common_inputs
+        project_id = hashlib.sha256(os.path.realpath(project_dir).encode()).hexdigest()[:16]
+        self.manifest_path = os.path.join(BaseDirectory.xdg_cache_home, "kmake", "builds", f"{project_id}.json")
+        self.lock = threading.Lock()
+        self._manifest: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @property
+    def manifest(self) -> Dict[str, Dict[str, Any]]:
+        if self._manifest is None:
+            self._manifest = {"targets": {}, "files": {}}
+            try:
+                with open(self.manifest_path, encoding="utf-8") as manifest_file:
+                    manifest = dict(json.load(manifest_file))
+                self._manifest["targets"] = dict(manifest["targets"])
+                self._manifest["files"] = dict(manifest["files"])
+            except (OSError, ValueError, TypeError, KeyError):
+                log.debug("Build manifest (%s) not available", self.manifest_path)
+        return self._manifest
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            # Write to temporary file & rename, so concurrent kmake runs never see partially written manifest
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=os.path.dirname(self.manifest_path), delete=False
+            ) as tmp:
+                json.dump(self.manifest, tmp)
+            os.replace(tmp.name, self.manifest_path)
+        except OSError as e:
+            log.debug("Failed to save build manifest: %s", e)
+
+    def hash_file(self, path: str) -> str:
+        """Returns sha256 of file content, reuses hash from manifest if file mtime & size didn't change"""
+        path = os.path.realpath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return "missing"
+        files = self.manifest["files"]
+        cached = files.get(path)
+        if cached is not None and cached[:2] == [stat.st_mtime_ns, stat.st_size]:
+            return str(cached[2])
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        files[path] = [stat.st_mtime_ns, stat.st_size, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def target(
+        self,
+        name: str,
+        args: argparse.Namespace,
+        inputs: Iterable[str],
+        outputs: Optional[List[str]] = None,
+        extra: Optional[Dict[str, str]] = None,
+    ) -> BuildTarget:
+        """Create build target
+
+        Parameters:
+            name: unique name of the target within the project
+            args: command arguments, they are part of the inputs
+            inputs: input files, `common_inputs` are always added
+            outputs: generated files, can be set later with `BuildTarget.record`
+            extra: other values outputs depend on (e.g. git revision)
+        """
+        return BuildTarget(self, name, args, list(inputs), outputs, extra or {})
+
+
+class BuildTarget:
+    """Outputs of a single command invocation"""
+
+    def __init__(
+        self,
+        cache: BuildCache,
+        name: str,
+        args: argparse.Namespace,
+        inputs: List[str],
+        outputs: Optional[List[str]],
+        extra: Dict[str, str],
+    ) -> None:
+        self.cache = cache
+        self.name = name
+        self.outputs = outputs
+        self.force = bool(getattr(args, "force", False))
+        self.explain = bool(getattr(args, "explain", False))
+
+        project_dir = cache.project_dir
+        inputs = inputs + cache.common_inputs
+        arguments = {key: value for key, value in vars(args).items() if key not in IGNORED_ARGS}
+        with cache.lock:
+            self.inputs = {
+                os.path.relpath(path, project_dir): cache.hash_file(path) for path in sorted(set(inputs)) if path
+            }
+        self.inputs["kicad-cli version"] = cache.kicad_version
+        self.inputs["arguments"] = json.dumps(arguments, sort_keys=True, default=str)
+        self.inputs.update(extra)
+
+    def stale_reasons(self) -> List[str]:
+        """Returns list of reasons why target has to be rebuilt, empty if target is up to date"""
+        if self.force:
+            return ["--force was used"]
+        with self.cache.lock:
+            record = self.cache.manifest["targets"].get(self.name)
+        if record is None:
+            return ["no previous build was recorded"]
+
+        reasons = []
+        recorded_inputs = record["inputs"]
+        for key in sorted(set(self.inputs) | set(recorded_inputs)):
+            if self.inputs.get(key) != recorded_inputs.get(key):
+                reasons.append(f"{key} changed")
+        for path, stamp in record["outputs"].items():
+            try:
+                stat = os.stat(os.path.join(self.cache.project_dir, path))
+            except OSError:
+                reasons.append(f"output {path} is missing")
+                continue
+            if [stat.st_mtime_ns, stat.st_size] != stamp:
+                reasons.append(f"output {path} was modified")
+        return reasons
+
+    def up_to_date(self) -> bool:
+        """Check if target can be skipped, log reasons of rebuild when `--explain` was used"""
+        reasons = self.stale_reasons()
+        if not reasons:
+            log.info("%s is up to date, skipping (use --force to rebuild)", self.name)
+            return True
+        if self.explain:
+            log.info("Rebuilding %s: %s", self.name, "; ".join(reasons))
+        return False
+
+    def record(self, outputs: Optional[List[str]] = None) -> None:
+        """Save inputs & generated outputs to the manifest after successful build"""
+        if outputs is not None:
+            self.outputs = outputs
+        assert self.outputs is not None, "Outputs of build target are not known"
+
+        stamps = {}
+        for path in self.outputs:
+            stat = os.stat(path)
+            stamps[os.path.relpath(path, self.cache.project_dir)] = [stat.st_mtime_ns, stat.st_size]
+        with self.cache.lock:
+            self.cache.manifest["targets"][self.name] = {"inputs": self.inputs, "outputs": stamps}
+            self.cache.save()
@@ -0,0 +1,130 @@
+"""Parsed KiCad documents shared within a single kmake run"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from .prettify import prettify, write_if_changed
+
+if TYPE_CHECKING:
+    from kiutils.board import Board
+    from kiutils.footprint import Footprint
+    from kiutils.schematic import Schematic
+    from kiutils.symbol import SymbolLib
+
+    Document = Union[Board, Footprint, Schematic, SymbolLib]
+
+log = logging.getLogger(__name__)
+
+
+class DocumentSession:
+    """Cache of parsed Board/Footprint/Schematic/SymbolLib objects
+
+    Documents are cached by real path, so each file is parsed at most once per kmake run.
+    Clean documents are parsed again if the file was changed on disk in the meantime.
+    Commands mark modified documents as dirty instead of saving them,
+    `flush` serializes (and prettifies) only dirty documents and writes only the changed ones.
+    """
+
+    # Documents that are formatted with KiCad formatter on flush
+    prettify_ext = (".kicad_pcb", ".kicad_sch")
+
+    def __init__(self) -> None:
+        self.documents: Dict[str, Document] = {}
+        self.dirty: Set[str] = set()
+        # (mtime, size) of files at the time they were parsed/saved
+        self.stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+        # Stages of `kmake run` may load documents from multiple threads
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def key(path: str) -> str:
+        return os.path.realpath(path)
+
+    @staticmethod
+    def stamp(key: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self, path: str, loader: Callable[[str], Any]) -> Any:
+        """Return cached document from `path`, parse it with `loader` if not loaded yet"""
+        key = self.key(path)
+        with self.lock:
+            if key in self.documents and (key in self.dirty or self.stamps.get(key) == self.stamp(key)):
+                return self.documents[key]
+            log.debug("Parsing %s", path)
+            stamp = self.stamp(key)
+            document = loader(path)
+            self.stamps[key] = stamp
+            self.documents[key] = document
+            return document
+
+    def board(self, path: str) -> Board:
+        from kiutils.board import Board
+
+        return self.load(path, Board.from_file)
+
+    def schematic(self, path: str) -> Schematic:
+        from kiutils.schematic import Schematic
+
+        return self.load(path, Schematic.from_file)
+
+    def symbol_lib(self, path: str) -> SymbolLib:
+        from kiutils.symbol import SymbolLib
+
+        return self.load(path, SymbolLib.from_file)
+
+    def footprint(self, path: str) -> Footprint:
+        from kiutils.footprint import Footprint
+
+        return self.load(path, Footprint.from_file)
+
+    def add(self, document: Document, path: str) -> None:
+        """Register document created in memory (not parsed from file) and mark it dirty"""
+        document.filePath = path
+        self.documents[self.key(path)] = document
+        self.mark_dirty(document)
+
+    def mark_dirty(self, document: Document) -> None:
+        """Schedule document to be saved on `flush`"""
+        assert document.filePath is not None, "Document without file path can't be saved"
+        key = self.key(document.filePath)
+        assert self.documents.get(key) is document, f"{document.filePath} is not loaded in session"
+        self.dirty.add(key)
+
+    def is_dirty(self, path: str) -> bool:
+        return self.key(path) in self.dirty
+
+    def discard(self, path: str) -> None:
+        """Drop cached document, e.g. when file was modified outside of the session"""
+        key = self.key(path)
+        self.documents.pop(key, None)
+        self.stamps.pop(key, None)
+        self.dirty.discard(key)
+
+    def flush(self) -> List[str]:
+        """Save all dirty documents
+
+        Files which already have the same content are not written, so their mtime is kept
+        (and outputs generated from them are not rebuilt).
+        Returns list of saved files."""
+        saved = []
+        for key in sorted(self.dirty):
+            document = self.documents[key]
+            content = document.to_sexpr()
+            if key.endswith(self.prettify_ext):
+                content = prettify(content)
+            if write_if_changed(key, content):
+                log.debug("Saved %s", document.filePath)
+                saved.append(str(document.filePath))
+            else:
+                log.debug("Skipping %s, content didn't change", document.filePath)
+            self.stamps[key] = self.stamp(key)
+        self.dirty.clear()
+        return saved
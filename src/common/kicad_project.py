@@ -1,20 +1,26 @@
 """KiCad project class"""
 
+from __future__ import annotations
+
 import os
 
 import sys
 import logging
 import typing
-import subprocess
 import json
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, List
 
-from kiutils.symbol import SymbolLib
-from kiutils.footprint import Footprint
-from kiutils.libraries import LibTable
+from .build_cache import BuildCache
+from .document_session import DocumentSession
+from .kmake_helper import find_files_by_ext, get_kicad_cli_version
+from .lib_tables import LibraryTables
 
-from .kmake_helper import find_files_by_ext, get_kicad_cli_command
+if TYPE_CHECKING:
+    # Type hints only, importing kiutils here would slow down startup of every command
+    from kiutils.symbol import SymbolLib
+    from kiutils.footprint import Footprint
+    from kiutils.libraries import LibTable
 
 log = logging.getLogger(__name__)
 
@@ -54,11 +60,11 @@ class KicadProject:
         self.all_sch_files: List[str] = []
         self.sch_files: List[str] = []
 
+        # Parsed documents shared by all commands in this run
+        self.session = DocumentSession()
+
         # Get KiCad version
-        kicad_cli_name = get_kicad_cli_command()[0]
-        self.kicad_version_full = subprocess.run(
-            [kicad_cli_name, "--version"], text=True, check=True, capture_output=True
-        ).stdout.strip()
+        self.kicad_version_full = get_kicad_cli_version()
         self.kicad_version = ".".join(self.kicad_version_full.split(".")[0:2])
 
         self.comm_cfg_path = os.path.expanduser(f"~/.config/kicad/{self.kicad_version}/kicad_common.json")
@@ -68,6 +74,9 @@ class KicadProject:
         self.env_var_name_sym_lib = f"KICAD{self.kicad_version[0]}_SYMBOL_DIR"
         self.env_var_name_fp_lib = f"KICAD{self.kicad_version[0]}_FOOTPRINT_DIR"
 
+        # Library tables & KiCad environment, read once and shared by all commands in this run
+        self.lib_tables = LibraryTables(self)
+
         self.get_project_dir()
         self.get_pro_file_name_from_dir(self.dir)
         self.get_pcb_file_name_from_dir(self.dir)
@@ -83,6 +92,13 @@ class KicadProject:
         self.fp_lib_dir = f"{self.dir}/{self.relative_lib_path}/{self.name}-{self.relative_fp_lib_path}"
         self.model_3d_lib_dir = f"{self.dir}/{self.relative_lib_path}/{self.relative_3d_model_path}"
 
+        # Manifest of generated outputs, used to skip outputs with unchanged inputs
+        self.build_cache = BuildCache(
+            self.dir,
+            self.kicad_version_full,
+            [self.pro_file, *self.lib_tables.table_paths()],
+        )
+
     def sort_sch_files(self) -> None:
         """Sort .kicad_sch, root file on top"""
         self.sch_files.sort(
@@ -195,6 +211,8 @@ class KicadProject:
         os.makedirs(self.model_3d_lib_dir, exist_ok=True)
 
     def read_lib_table_file(self, name: str, global_lib: str) -> LibTable:
+        from kiutils.libraries import LibTable
+
         if os.path.exists(name):
             log.debug(f"Using config from {name}")
             return LibTable.from_file(name)
@@ -1,27 +1,52 @@
 """File and working directory helper scripts"""
 
+from __future__ import annotations
+
+import hashlib
+import json
 import logging
 import os
+import shutil
 import subprocess
 import sys
-from kiutils.footprint import Footprint
-from kiutils.symbol import Symbol
-from kiutils.items.schitems import SchematicSymbol
-from kiutils.items.fpitems import FpProperty
-from kiutils.items.common import Property
-from typing import List, Any, Optional, Union
+import tempfile
+import threading
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from functools import lru_cache
+from shutil import which
+from types import TracebackType
+from typing import TYPE_CHECKING, Callable, ContextManager, Dict, List, Any, Optional, Type, Union
+
+from xdg import BaseDirectory
+
+if TYPE_CHECKING:
+    from kiutils.footprint import Footprint
+    from kiutils.symbol import Symbol
+    from kiutils.items.schitems import SchematicSymbol
+    from kiutils.items.fpitems import FpProperty
+    from kiutils.items.common import Property
 
 log = logging.getLogger(__name__)
 
+KICAD_CLI_VERSION_CACHE = "kicad-cli-version.json"
+
+# ioctl cloning a file on copy-on-write filesystems (btrfs, XFS), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
 
 def is_venv() -> bool:
     return hasattr(sys, "real_prefix") or (hasattr(sys, "base_prefix") and sys.base_prefix != sys.prefix)
 
 
-def is_in_path(name: str) -> bool:
-    from shutil import which
+@lru_cache(maxsize=None)
+def which_cached(name: str, path: Optional[str]) -> Optional[str]:
+    """`shutil.which` memoized per executable name and PATH value"""
+    return which(name, path=path)
+
 
-    return which(name) is not None
+def is_in_path(name: str) -> bool:
+    return which_cached(name, os.environ.get("PATH")) is not None
 
 
 def get_kicad_cli_command() -> tuple[str, List[str]]:
@@ -39,7 +64,82 @@ def get_kicad_cli_command() -> tuple[str, List[str]]:
     return kicad_cli_path, kicad_cli_args
 
 
-def run_kicad_cli(args: List[str], verbose: bool) -> None:
+def get_kicad_cli_version() -> str:
+    """Returns full version string reported by `kicad-cli --version`
+
+    Result is cached in `$XDG_CACHE_HOME/kmake`, keyed on resolved kicad-cli path,
+    its modification time and `KMAKE_KICAD_CLI`, so kicad-cli is not started on cache hit."""
+    kicad_cli_path = get_kicad_cli_command()[0]
+    resolved_path = os.path.realpath(str(which_cached(kicad_cli_path, os.environ.get("PATH"))))
+    cache_key = "|".join(
+        [resolved_path, str(os.stat(resolved_path).st_mtime_ns), os.environ.get("KMAKE_KICAD_CLI", "")]
+    )
+
+    cache_path = os.path.join(BaseDirectory.xdg_cache_home, "kmake", KICAD_CLI_VERSION_CACHE)
+    cache: Dict[str, str] = {}
+    try:
+        with open(cache_path, encoding="utf-8") as cache_file:
+            cache = dict(json.load(cache_file))
+        if cache_key in cache:
+            log.debug("Using cached kicad-cli version from %s", cache_path)
+            return cache[cache_key]
+    except (OSError, ValueError, TypeError):
+        log.debug("kicad-cli version cache (%s) not available", cache_path)
+
+    version = subprocess.run([kicad_cli_path, "--version"], text=True, check=True, capture_output=True).stdout.strip()
+
+    cache[cache_key] = version
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write to temporary file & rename, so concurrent kmake runs never see partially written cache
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(cache_path), delete=False) as tmp:
+            json.dump(cache, tmp)
+        os.replace(tmp.name, cache_path)
+    except OSError as e:
+        log.debug("Failed to save kicad-cli version cache: %s", e)
+    return version
+
+
+# Limit set with `set_max_jobs`, e.g. by `kmake run --jobs`
+_max_jobs: Optional[int] = None
+# Slots of kicad-cli processes shared by all job runners while the limit is set
+_kicad_cli_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def default_jobs() -> int:
+    """Number of concurrent jobs: limit set with `set_max_jobs`, `KMAKE_JOBS` environment variable
+    or number of CPUs"""
+    return _max_jobs or int(os.environ.get("KMAKE_JOBS", 0)) or os.cpu_count() or 1
+
+
+def set_max_jobs(max_jobs: Optional[int]) -> None:
+    """Limit number of concurrent jobs and kicad-cli processes of the whole kmake process
+
+    Used when several commands run concurrently, `None` removes the limit."""
+    global _max_jobs, _kicad_cli_slots
+    _max_jobs = max_jobs
+    _kicad_cli_slots = None if max_jobs is None else threading.BoundedSemaphore(max_jobs)
+
+
+def kicad_cli_slot() -> ContextManager:
+    """Context held while kicad-cli process runs
+
+    While limit set with `set_max_jobs` is active, all `KicadCliJobs` and blocking `run_kicad_cli` calls
+    share it, so concurrent commands (e.g. stages of `kmake run`) together never exceed it."""
+    slots = _kicad_cli_slots
+    return nullcontext() if slots is None else slots
+
+
+def run_kicad_cli(args: List[str], verbose: bool, jobs: Optional[KicadCliJobs] = None) -> None:
+    """Run kicad-cli with given arguments
+
+    Parameters:
+        verbose (bool): print kicad-cli output
+        jobs (KicadCliJobs): if set, command is submitted to the job runner instead of blocking
+    """
+    if jobs is not None:
+        jobs.submit(args, verbose)
+        return
     kicad_cli_path, kicad_cli_args = get_kicad_cli_command()
     command = [kicad_cli_path] + kicad_cli_args
     command.extend(args)
@@ -50,7 +150,146 @@ def run_kicad_cli(args: List[str], verbose: bool) -> None:
         stdout_redirect = subprocess.DEVNULL
         stderr_redirect = subprocess.STDOUT
 
-    subprocess.run(command, check=True, stdout=stdout_redirect, stderr=stderr_redirect)
+    with kicad_cli_slot():
+        subprocess.run(command, check=True, stdout=stdout_redirect, stderr=stderr_redirect)
+
+
+class KicadCliJobs:
+    """Runs several kicad-cli invocations concurrently
+
+    Output of each job is captured to a separate log file (printed after the job finishes if `verbose` is set).
+    Leaving the `with` block waits for all jobs. On first failure, timeout or Ctrl-C, all pending jobs
+    are cancelled, running kicad-cli processes are terminated and the error is reraised.
+
+        with KicadCliJobs() as jobs:
+            run_kicad_cli(["pcb", "export", "gerbers", ...], False, jobs)
+            run_kicad_cli(["pcb", "export", "drill", ...], False, jobs)
+    """
+
+    def __init__(
+        self, max_jobs: Optional[int] = None, timeout: Optional[float] = None, log_dir: Optional[str] = None
+    ) -> None:
+        """Parameters:
+        max_jobs: number of concurrent kicad-cli processes (default: `KMAKE_JOBS` or number of CPUs)
+        timeout: default time limit of a single job in seconds
+        log_dir: directory for logs of jobs, temporary directory is used (and removed) if not set
+        """
+        if max_jobs is None:
+            max_jobs = default_jobs()
+        self.timeout = timeout
+        self.temp_log_dir = tempfile.TemporaryDirectory(prefix="kmake-") if log_dir is None else None
+        self.log_dir = log_dir if self.temp_log_dir is None else self.temp_log_dir.name
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="kicad-cli")
+        self.futures: List[Future] = []
+        self.processes: List[subprocess.Popen] = []
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.output_lock = threading.Lock()
+
+    def __enter__(self) -> KicadCliJobs:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        try:
+            if exc is None:
+                self.wait()
+            else:
+                self.cancel()
+        finally:
+            self.executor.shutdown(wait=True)
+            if self.temp_log_dir is not None:
+                self.temp_log_dir.cleanup()
+
+    def submit(
+        self,
+        args: List[str],
+        verbose: bool = False,
+        timeout: Optional[float] = None,
+        then: Optional[Callable[[], None]] = None,
+    ) -> Future:
+        """Schedule kicad-cli run
+
+        Parameters:
+            args: kicad-cli arguments
+            verbose: print output of the job after it finishes
+            timeout: time limit in seconds, overrides the default one
+            then: called (in worker thread) after the job succeeded, e.g. to move generated files
+        """
+        index = len(self.futures)
+        log_file = os.path.join(str(self.log_dir), f"{index:03d}-{'-'.join(args[:3])}.log")
+        future = self.executor.submit(
+            self.run_job, args, verbose, timeout if timeout is not None else self.timeout, log_file, then
+        )
+        self.futures.append(future)
+        return future
+
+    def run_job(
+        self, args: List[str], verbose: bool, timeout: Optional[float], log_file: str, then: Optional[Callable]
+    ) -> None:
+        kicad_cli_path, kicad_cli_args = get_kicad_cli_command()
+        command = [kicad_cli_path] + kicad_cli_args + args
+        with open(log_file, "w+", encoding="utf-8", errors="replace") as output:
+            with kicad_cli_slot():
+                with self.lock:
+                    if self.cancelled:
+                        return
+                    log.info(f"Running command: {' '.join(command)}")
+                    process = subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT)
+                    self.processes.append(process)
+                try:
+                    process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+                    log.error(f"Command timed out after {timeout}s: {' '.join(command)}")
+                    raise
+
+            output.seek(0)
+            if process.returncode != 0 and not self.cancelled:
+                # Temporary logs are removed on exit, point to the log only if it is kept
+                saved = f", output saved to {log_file}" if self.temp_log_dir is None else ""
+                log.error(f"Command failed: {' '.join(command)}{saved}:\n{output.read()}")
+            elif verbose:
+                with self.output_lock:
+                    sys.stdout.write(output.read())
+                    sys.stdout.flush()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+        if then is not None:
+            then()
+
+    def wait(self) -> None:
+        """Wait for all submitted jobs, cancel remaining ones & reraise on first failure"""
+        try:
+            done, _ = wait(self.futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+            for future in self.futures:
+                future.result()
+        except BaseException:
+            self.cancel()
+            raise
+
+    def cancel(self) -> None:
+        """Cancel pending jobs and terminate running kicad-cli processes"""
+        with self.lock:
+            self.cancelled = True
+            for future in self.futures:
+                future.cancel()
+            processes = [process for process in self.processes if process.poll() is None]
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
 
 
 def find_files_by_ext_recursive(wdir: str, ext: str) -> List[str]:
@@ -99,6 +338,77 @@ def tag_gerbers(folder: str, tag: str) -> None:
             file.write(filedata)
 
 
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src: str, dst: str, hardlink: bool = False) -> str:
+    """Create `dst` with content of `src` without copying data if possible
+
+    On the same filesystem reflink (copy-on-write clone) is tried first, then hardlink if `hardlink` is set.
+    Otherwise or if both fail the file is copied. Hardlinked files share content, so editing one in place
+    changes the other - only use `hardlink` for files owned by the same project, never for library sources.
+    Returns used method: "reflink", "hardlink" or "copy"."""
+    src = os.path.realpath(src)
+    if os.stat(src).st_dev == os.stat(os.path.dirname(os.path.abspath(dst))).st_dev:
+        created = False
+        try:
+            import fcntl
+
+            with open(src, "rb") as src_file, open(dst, "xb") as dst_file:
+                created = True
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            shutil.copystat(src, dst)
+            return "reflink"
+        except (ImportError, OSError):
+            if created:
+                os.remove(dst)
+        if hardlink:
+            try:
+                os.link(src, dst)
+                return "hardlink"
+            except OSError:
+                pass
+    shutil.copy(src, dst)
+    return "copy"
+
+
+def str_num_cmp(first: str, second: str) -> int:
+    """Compare strings, sequences of digits are compared numerically (port of KiCad's `StrNumCmp`)
+
+    Returns negative value if `first` goes before `second`, positive if after, 0 if they are equal."""
+    i = j = 0
+    while i < len(first) and j < len(second):
+        c1 = first[i]
+        c2 = second[j]
+        if c1.isdigit() and c2.isdigit():
+            start = i
+            while i < len(first) and first[i].isdigit():
+                i += 1
+            nb1 = int(first[start:i])
+            start = j
+            while j < len(second) and second[j].isdigit():
+                j += 1
+            nb2 = int(second[start:j])
+            if nb1 != nb2:
+                return -1 if nb1 < nb2 else 1
+            c1 = first[i] if i < len(first) else "\0"
+            c2 = second[j] if j < len(second) else "\0"
+        if c1 != c2:
+            return -1 if c1 < c2 else 1
+        i = min(i + 1, len(first))
+        j = min(j + 1, len(second))
+    if i == len(first) and j < len(second):
+        return -1
+    if i < len(first) and j == len(second):
+        return 1
+    return 0
+
+
 def get_property(obj: Union[Footprint, Symbol, SchematicSymbol], prop: str) -> Optional[str]:
     for item in obj.properties:
         if item.key.lower() == prop.lower():
@@ -111,6 +421,8 @@ def remove_property(obj: Union[Footprint, Symbol, SchematicSymbol], name: str) -
 
 
 def set_property(symbol: Any, name: str, value: Any) -> None:
+    from kiutils.items.common import Property
+
     try:
         prop = next(filter(lambda prop: prop.key == name, symbol.properties))
         prop.value = value
@@ -0,0 +1,162 @@
+"""Symbol & footprint library tables of a KiCad project, resolved once per kmake run"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from kiutils.footprint import Footprint
+    from kiutils.libraries import Library
+    from kiutils.symbol import SymbolLib
+
+    from .kicad_project import KicadProject
+
+log = logging.getLogger(__name__)
+
+
+class LibraryHandle:
+    """Library entry of a lib table
+
+    Path of the library is expanded and checked for existence on first use,
+    library files are parsed only when requested."""
+
+    def __init__(self, tables: LibraryTables, nickname: str, uri: str) -> None:
+        self.tables = tables
+        self.nickname = nickname
+        self.uri = uri
+
+    def __repr__(self) -> str:
+        return f"LibraryHandle({self.nickname!r}, {self.uri!r})"
+
+    @property
+    def path(self) -> str:
+        return self.tables.expand(self.uri)
+
+    @property
+    def exists(self) -> bool:
+        return self.tables.exists(self.path)
+
+    def symbol_lib(self) -> SymbolLib:
+        """Symbol library, parsed once per session"""
+        return self.tables.project.session.symbol_lib(self.path)
+
+    def footprint_path(self, name: str) -> str:
+        return f"{self.path}/{name}.{self.tables.project.fp_lib_ext}"
+
+    def footprint(self, name: str) -> Footprint:
+        """Footprint of footprint library (directory), parsed once per session"""
+        return self.tables.project.session.footprint(self.footprint_path(name))
+
+
+class LibraryTables:
+    """Global & project `sym-lib-table`/`fp-lib-table` of the project
+
+    Tables are read once (and again only if they were changed on disk),
+    environment variables from `kicad_common.json` are loaded once,
+    expanded URIs and existence of library files are cached for the whole run.
+    """
+
+    def __init__(self, project: KicadProject) -> None:
+        self.project = project
+        # Parsed tables by path with (mtime, size) of the file at the time it was read
+        self.tables: Dict[str, Tuple[Optional[Tuple[int, int]], List[Library]]] = {}
+        self.handles: Dict[Tuple[str, str], LibraryHandle] = {}
+        self.expanded: Dict[str, str] = {}
+        self.existing: Dict[str, bool] = {}
+        self.environment_loaded = False
+        self.lock = threading.RLock()
+
+    def load_environment(self) -> None:
+        """Load KiCad environment variables used in URIs, only the first call reads `kicad_common.json`"""
+        with self.lock:
+            if not self.environment_loaded:
+                self.project.load_kicad_environ_vars()
+                self.environment_loaded = True
+
+    def expand(self, uri: str) -> str:
+        """Library path with expanded environment variables"""
+        if uri not in self.expanded:
+            self.load_environment()
+            self.expanded[uri] = os.path.expandvars(uri)
+        return self.expanded[uri]
+
+    def exists(self, path: str) -> bool:
+        if path not in self.existing:
+            self.existing[path] = os.path.exists(path)
+        return self.existing[path]
+
+    @staticmethod
+    def stamp(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def read(self, path: str, system_table: Optional[str] = None) -> List[Library]:
+        """Libraries of the table, `system_table` is used when global table at `path` does not exist
+
+        Project tables (without `system_table`) that do not exist are empty."""
+        with self.lock:
+            stamp = self.stamp(path)
+            cached = self.tables.get(path)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            if system_table is not None:
+                libs = self.project.read_lib_table_file(path, system_table).libs
+            elif stamp is not None:
+                from kiutils.libraries import LibTable
+
+                libs = LibTable.from_file(path).libs
+            else:
+                libs = []
+            self.tables[path] = (stamp, libs)
+            return libs
+
+    def handle(self, library: Library) -> LibraryHandle:
+        key = (library.name, library.uri)
+        if key not in self.handles:
+            self.handles[key] = LibraryHandle(self, library.name, library.uri)
+        return self.handles[key]
+
+    def libraries(
+        self, global_table: str, system_table: str, project_table: str, include_project: bool
+    ) -> Dict[str, LibraryHandle]:
+        libs = list(self.read(global_table, system_table))
+        if include_project:
+            libs += self.read(os.path.join(self.project.dir, project_table))
+        # Project libraries take precedence over global ones with the same nickname
+        return {library.name: self.handle(library) for library in libs}
+
+    def table_paths(self) -> List[str]:
+        """Paths of global & project symbol and footprint lib tables"""
+        project = self.project
+        return [
+            project.glob_sym_lib_table_path,
+            project.glob_fp_lib_table_path,
+            os.path.join(project.dir, "sym-lib-table"),
+            os.path.join(project.dir, "fp-lib-table"),
+        ]
+
+    def symbol_libraries(self, include_project: bool = True) -> Dict[str, LibraryHandle]:
+        """Symbol libraries by nickname, from global and (optionally) project table"""
+        project = self.project
+        return self.libraries(
+            project.glob_sym_lib_table_path, project.system_sym_lib_table, "sym-lib-table", include_project
+        )
+
+    def footprint_libraries(self, include_project: bool = True) -> Dict[str, LibraryHandle]:
+        """Footprint libraries by nickname, from global and (optionally) project table"""
+        project = self.project
+        return self.libraries(
+            project.glob_fp_lib_table_path, project.system_fp_lib_table, "fp-lib-table", include_project
+        )
+
+    def symbol_library(self, nickname: str) -> Optional[LibraryHandle]:
+        return self.symbol_libraries().get(nickname)
+
+    def footprint_library(self, nickname: str) -> Optional[LibraryHandle]:
+        return self.footprint_libraries().get(nickname)
@@ -0,0 +1,272 @@
+"""Persistent indexes of global symbol & footprint libraries"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from xdg import BaseDirectory
+
+from .sexpr_reader import SexprReader
+
+if TYPE_CHECKING:
+    from kiutils.footprint import Footprint
+    from kiutils.symbol import Symbol
+
+log = logging.getLogger(__name__)
+
+# Bump when format of the index changes
+INDEX_VERSION = 2
+
+STRING = rb'"((?:[^"\\]|\\.)*)"'
+SYMBOL_NAME_REGEX = re.compile(rb"\(symbol\s+" + STRING)
+# Property keys are matched ignoring case, the same way as `get_property`
+MPN_REGEX = re.compile(rb'\(property\s+"(?i:MPN)"\s+' + STRING)
+MODEL_REGEX = re.compile(rb"\(model\s+(?:" + STRING + rb"|([^\s()]+))")
+
+# Footprint files indexed concurrently when library index is cold
+INDEX_JOBS = 8
+
+
+def unescape(value: bytes) -> str:
+    """Decode quoted string the same way as kiutils parser"""
+    return value.decode("utf-8").replace('\\"', '"')
+
+
+@dataclass(frozen=True)
+class IndexedSymbol:
+    """Symbol of a global library, located in the library file without parsing it
+
+    Attributes:
+        name: symbol name (without library nickname)
+        mpn: value of `MPN` property, None if symbol has no such property
+        library: library nickname
+        path: library file
+        start, end: byte offsets of `(symbol ...)` node in the file
+        digest: sha256 of the node
+    """
+
+    name: str
+    mpn: Optional[str]
+    library: str
+    path: str
+    start: int
+    end: int
+    digest: str
+
+
+@dataclass(frozen=True)
+class IndexedFootprint:
+    """Footprint of a global library, listed without parsing it
+
+    Attributes:
+        name: footprint name (without library nickname)
+        library: library nickname
+        path: `.kicad_mod` file
+        models: paths of 3D models (not expanded)
+    """
+
+    name: str
+    library: str
+    path: str
+    models: List[str]
+
+
+class LibraryIndex:
+    """Index of libraries stored as JSON file in `$XDG_CACHE_HOME/kmake`"""
+
+    # Name of the index file
+    file_name = ""
+
+    def __init__(self, index_path: Optional[str] = None) -> None:
+        self.index_path = index_path or os.path.join(BaseDirectory.xdg_cache_home, "kmake", self.file_name)
+        self.modified = False
+        self._libraries: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @property
+    def libraries(self) -> Dict[str, Dict[str, Any]]:
+        """Index entries by real path of library"""
+        if self._libraries is None:
+            self._libraries = {}
+            try:
+                with open(self.index_path, encoding="utf-8") as index_file:
+                    index = dict(json.load(index_file))
+                if index.get("version") == INDEX_VERSION:
+                    self._libraries = dict(index["libraries"])
+            except (OSError, ValueError, TypeError, KeyError):
+                log.debug("Library index (%s) not available", self.index_path)
+        return self._libraries
+
+    def save(self) -> None:
+        """Write index to disk if any library was (re)indexed"""
+        if not self.modified:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            # Write to temporary file & rename, so concurrent kmake runs never see partially written index
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=os.path.dirname(self.index_path), delete=False
+            ) as tmp:
+                json.dump({"version": INDEX_VERSION, "libraries": self.libraries}, tmp)
+            os.replace(tmp.name, self.index_path)
+            self.modified = False
+        except OSError as e:
+            log.debug("Failed to save library index: %s", e)
+
+
+class SymbolLibraryIndex(LibraryIndex):
+    """Index of symbol names & MPNs of `.kicad_sym` files
+
+    Index is stored in `$XDG_CACHE_HOME/kmake/symbol-index.json`.
+    Entries of each library file are reused while its mtime & size don't change,
+    changed libraries are indexed by scanning top-level nodes (see `SexprReader`).
+    Symbols are parsed only when requested with `symbol`.
+    """
+
+    file_name = "symbol-index.json"
+
+    def __init__(self, index_path: Optional[str] = None) -> None:
+        super().__init__(index_path)
+        self._parsed: Dict[Tuple[str, int], Symbol] = {}
+        self._by_name: Dict[str, Dict[str, IndexedSymbol]] = {}
+
+    def library(self, nickname: str, path: str) -> List[IndexedSymbol]:
+        """Returns symbols of the library in file order, indexes the file if it changed since last run"""
+        key = os.path.realpath(path)
+        stat = os.stat(key)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        entry = self.libraries.get(key)
+        if entry is None or entry["stamp"] != stamp:
+            log.debug("Indexing symbol library: %s", nickname)
+            entry = {"stamp": stamp, "symbols": self.scan(key)}
+            self.libraries[key] = entry
+            self.modified = True
+        return [
+            IndexedSymbol(name, mpn, nickname, key, start, end, digest)
+            for name, mpn, start, end, digest in entry["symbols"]
+        ]
+
+    def by_name(self, nickname: str, path: str) -> Dict[str, IndexedSymbol]:
+        """Returns symbols of the library by name (first one if the name repeats)"""
+        key = os.path.realpath(path)
+        if key not in self._by_name:
+            symbols: Dict[str, IndexedSymbol] = {}
+            for entry in self.library(nickname, path):
+                symbols.setdefault(entry.name, entry)
+            self._by_name[key] = symbols
+        return self._by_name[key]
+
+    @staticmethod
+    def scan(path: str) -> List[List[Any]]:
+        """Returns [name, mpn, start, end, digest] of every symbol of the library"""
+        symbols: List[List[Any]] = []
+        with SexprReader(path) as reader:
+            for node in reader.find("symbol"):
+                data = reader.data[node.start : node.end]
+                name = SYMBOL_NAME_REGEX.match(data)
+                if name is None:
+                    log.warning("Symbol without name at offset %d of %s", node.start, path)
+                    continue
+                mpn = MPN_REGEX.search(data)
+                symbols.append(
+                    [
+                        unescape(name.group(1)),
+                        None if mpn is None else unescape(mpn.group(1)),
+                        node.start,
+                        node.end,
+                        hashlib.sha256(data).hexdigest(),
+                    ]
+                )
+        return symbols
+
+    def symbol(self, entry: IndexedSymbol) -> Symbol:
+        """Parse indexed symbol, each symbol is parsed at most once"""
+        from kiutils.symbol import Symbol
+        from kiutils.utils.sexpr import parse_sexp
+
+        key = (entry.path, entry.start)
+        if key not in self._parsed:
+            with open(entry.path, "rb") as library_file:
+                library_file.seek(entry.start)
+                data = library_file.read(entry.end - entry.start)
+            if hashlib.sha256(data).hexdigest() != entry.digest:
+                raise RuntimeError(f"{entry.path} changed while kmake was running")
+            log.debug("Parsing symbol %s:%s", entry.library, entry.name)
+            self._parsed[key] = Symbol.from_sexpr(parse_sexp(data.decode("utf-8")))
+        return self._parsed[key]
+
+
+class FootprintLibraryIndex(LibraryIndex):
+    """Index of footprint names & 3D models of `.pretty` directories
+
+    Index is stored in `$XDG_CACHE_HOME/kmake/footprint-index.json`.
+    Entries of each `.kicad_mod` file are reused while its mtime & size don't change,
+    new & changed files are scanned for 3D models with a regex (concurrently, as there can be thousands of them).
+    Footprints are parsed only when requested with `footprint`.
+    """
+
+    file_name = "footprint-index.json"
+
+    def __init__(self, index_path: Optional[str] = None) -> None:
+        super().__init__(index_path)
+        self._parsed: Dict[str, Footprint] = {}
+
+    def library(self, nickname: str, path: str) -> List[IndexedFootprint]:
+        """Returns footprints of the library sorted by name, indexes files that changed since last run"""
+        key = os.path.realpath(path)
+        previous = self.libraries.get(key, {}).get("files", {})
+        files: Dict[str, List[Any]] = {}
+        to_scan = []
+        with os.scandir(key) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".kicad_mod") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                stamp = [stat.st_mtime_ns, stat.st_size]
+                cached = previous.get(entry.name)
+                if cached is not None and cached[:2] == stamp:
+                    files[entry.name] = cached
+                else:
+                    files[entry.name] = stamp
+                    to_scan.append(entry.name)
+
+        if to_scan:
+            log.debug("Indexing %d footprints of library: %s", len(to_scan), nickname)
+            paths = [os.path.join(key, name) for name in to_scan]
+            with ThreadPoolExecutor(max_workers=min(INDEX_JOBS, len(paths))) as executor:
+                for name, models in zip(to_scan, executor.map(self.scan, paths)):
+                    files[name] = files[name] + [models]
+        if to_scan or len(files) != len(previous):
+            self.libraries[key] = {"files": files}
+            self.modified = True
+
+        return [
+            IndexedFootprint(name[: -len(".kicad_mod")], nickname, os.path.join(key, name), files[name][2])
+            for name in sorted(files)
+        ]
+
+    @staticmethod
+    def scan(path: str) -> List[str]:
+        """Returns paths of 3D models of the footprint"""
+        with open(path, "rb") as footprint_file:
+            data = footprint_file.read()
+        return [
+            unescape(match.group(1)) if match.group(1) is not None else match.group(2).decode("utf-8")
+            for match in MODEL_REGEX.finditer(data)
+        ]
+
+    def footprint(self, entry: IndexedFootprint) -> Footprint:
+        """Parse indexed footprint, each footprint is parsed at most once"""
+        from kiutils.footprint import Footprint
+
+        if entry.path not in self._parsed:
+            log.debug("Parsing footprint %s:%s", entry.library, entry.name)
+            self._parsed[entry.path] = Footprint.from_file(entry.path)
+        return self._parsed[entry.path]
@@ -0,0 +1,115 @@
+"""Streaming reader of KiCad XML netlists (`kicad-cli sch export netlist --format kicadxml`)"""
+
+from __future__ import annotations
+
+import logging
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class NetlistComponent:
+    """Component (`comp` element) of the netlist
+
+    Fields which are empty in the component are taken from its library part, the same way as in KiCad BOM scripts.
+    """
+
+    ref: str
+    value: str = ""
+    footprint: str = ""
+    datasheet: str = ""
+    description: str = ""
+    lib: str = ""
+    part: str = ""
+    fields: Dict[str, str] = field(default_factory=dict)
+    properties: Dict[str, str] = field(default_factory=dict)
+    libpart_fields: Dict[str, str] = field(default_factory=dict)
+
+    def get_field(self, name: str) -> str:
+        return self.fields.get(name) or self.libpart_fields.get(name, "")
+
+    def get_footprint(self) -> str:
+        return self.footprint or self.libpart_fields.get("Footprint", "")
+
+    def has_property(self, name: str) -> bool:
+        """True for flags like `dnp`, `exclude_from_bom` or `exclude_from_board`"""
+        return name in self.properties
+
+
+@dataclass
+class Netlist:
+    components: List[NetlistComponent] = field(default_factory=list)
+    # Net name to list of (reference, pin number), read only on request
+    nets: Dict[str, List[Tuple[str, str]]] = field(default_factory=dict)
+
+
+def text(element: Optional[ET.Element]) -> str:
+    if element is None or element.text is None:
+        return ""
+    return element.text
+
+
+def read_component(element: ET.Element) -> NetlistComponent:
+    component = NetlistComponent(
+        ref=element.get("ref", ""),
+        value=text(element.find("value")),
+        footprint=text(element.find("footprint")),
+        datasheet=text(element.find("datasheet")),
+    )
+    libsource = element.find("libsource")
+    if libsource is not None:
+        component.lib = libsource.get("lib", "")
+        component.part = libsource.get("part", "")
+        component.description = libsource.get("description", "")
+    for item in element.iterfind("fields/field"):
+        component.fields[item.get("name", "")] = text(item)
+    for item in element.iterfind("property"):
+        component.properties[item.get("name", "")] = item.get("value", "")
+    return component
+
+
+def read_netlist(path: str, nets: bool = False) -> Netlist:
+    """Read components (and nets, if requested) from XML netlist
+
+    The file is parsed incrementally and elements are dropped as soon as they are read,
+    `nets` section is not read at all unless `nets` is set.
+    """
+    netlist = Netlist()
+    # (lib, part) & aliases of library parts to their fields
+    libparts: Dict[Tuple[str, str], Dict[str, str]] = {}
+    parents: List[ET.Element] = []
+
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            if element.tag == "nets" and not nets:
+                break
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag == "comp":
+            netlist.components.append(read_component(element))
+        elif element.tag == "libpart":
+            fields = {item.get("name", ""): text(item) for item in element.iterfind("fields/field")}
+            lib = element.get("lib", "")
+            libparts[(lib, element.get("part", ""))] = fields
+            for alias in element.iterfind("aliases/alias"):
+                libparts.setdefault((lib, text(alias)), fields)
+        elif element.tag == "net":
+            netlist.nets[element.get("name", "")] = [
+                (node.get("ref", ""), node.get("pin", "")) for node in element.iterfind("node")
+            ]
+        else:
+            continue
+        # Element was consumed, remove it from the tree built by the parser
+        parents[-1].remove(element)
+
+    for component in netlist.components:
+        libpart_fields = libparts.get((component.lib, component.part))
+        if libpart_fields is None:
+            log.debug("Missing libpart for ref: %s %s %s", component.ref, component.part, component.lib)
+            continue
+        component.libpart_fields = libpart_fields
+    return netlist
@@ -0,0 +1,267 @@
+"""KiCad S-expression formatter"""
+
+import filecmp
+import os
+import re
+import stat
+import tempfile
+from functools import lru_cache
+from typing import Callable, Iterator, Optional, Pattern, Tuple
+
+# Configuration
+INDENT_CHAR = "\t"
+INDENT_SIZE = 1
+
+# Special case handling for long (xy ...) lists.
+XY_SPECIAL_CASE_COLUMN_LIMIT = 99
+CONSECUTIVE_TOKEN_WRAP_THRESHOLD = 72
+
+# Size of chunks read by `prettify_file`
+CHUNK_SIZE = 1 << 20
+
+
+@lru_cache(maxsize=None)
+def token_regexes(quote_char: str) -> Tuple[Pattern[str], Pattern[str]]:
+    """Returns regex of tokens outside of quoted strings and regex of single atom/quoted string
+
+    Tokens are: brackets, whitespace runs, runs of atoms & strings separated by whitespace
+    and single characters (backslashes, escaped or unterminated quotes).
+    Whitespace around `(` and before `)` never results in a space, so it is matched together with the bracket."""
+    quote = re.escape(quote_char)
+    element = rf"[^\s(){quote}\\]+|{quote}(?:[^{quote}\\]|\\.)*{quote}"
+    token = rf"\s*(\()\s*|(\s*\))|(\s+)|((?:{element})(?:\s+(?:{element}))*)|(.)"
+    return re.compile(token, re.DOTALL), re.compile(element, re.DOTALL)
+
+
+OPEN, CLOSE, SPACE, RUN, CHAR = range(1, 6)
+
+
+def format_tokens(read: Callable[[], str], quote_char: str = '"') -> Iterator[str]:
+    """Yields formatted pieces of S-expression text
+
+    Works on whole atoms & quoted strings instead of single characters,
+    output is the same as of KiCad formatter ported character by character.
+
+    Parameters:
+        read: returns next chunk of the source, empty string at the end
+    """
+    token_regex, element_regex = token_regexes(quote_char)
+    buffer = read()
+    eof = not buffer
+    cursor = 0
+
+    list_depth = 0
+    last_non_whitespace = ""
+    has_inserted_space = False
+    in_multi_line_list = False
+    in_xy = False
+    column = 0
+    backslash_count = 0
+    # Last piece is held back, so trailing space can still be removed
+    last: Optional[str] = None
+
+    while True:
+        match = token_regex.match(buffer, cursor)
+        if match is not None:
+            kind = match.lastindex
+            end = match.end()
+            if eof:
+                incomplete = False
+            elif kind in (SPACE, RUN):
+                # Token may continue in the next chunk, whitespace needs the following character
+                incomplete = end == len(buffer)
+            elif kind == OPEN:
+                # (xy ...) lookahead
+                incomplete = match.end(OPEN) + 3 > len(buffer)
+            else:
+                # Unterminated string may end in the next chunk
+                incomplete = kind == CHAR and match.group() == quote_char and backslash_count % 2 == 0
+        if match is None or incomplete:
+            if eof:
+                break
+            # Read at least as much as is pending, so long tokens are rescanned only logarithmic number of times
+            chunks = [buffer[cursor:]]
+            pending = len(chunks[0])
+            while not eof and pending >= 0:
+                chunk = read()
+                chunks.append(chunk)
+                pending -= len(chunk)
+                eof = not chunk
+            buffer = "".join(chunks)
+            cursor = 0
+            continue
+
+        if kind == SPACE:
+            if end == len(buffer):
+                break  # Reached the end of source
+            next_char = buffer[end]
+            if (
+                not has_inserted_space
+                and list_depth > 0
+                and last_non_whitespace != "("
+                and next_char != ")"
+                and next_char != "("
+            ):
+                if in_xy or column < CONSECUTIVE_TOKEN_WRAP_THRESHOLD:
+                    piece = " "
+                    column += 1
+                else:
+                    # Ensure no trailing spaces before new lines
+                    if last == " ":
+                        last = None
+                    piece = "\n" + (INDENT_CHAR * list_depth)
+                    column = list_depth * INDENT_SIZE
+                    in_multi_line_list = True
+                if last is not None:
+                    yield last
+                last = piece
+                has_inserted_space = True
+            cursor = end
+            continue
+
+        has_inserted_space = False
+        if kind == OPEN:
+            current_is_xy = buffer.startswith("xy ", match.end(OPEN))
+
+            if list_depth == 0:
+                piece = "("
+                column += 1
+            elif in_xy and current_is_xy and column < XY_SPECIAL_CASE_COLUMN_LIMIT:
+                piece = " ("
+                column += 2
+            else:
+                # Ensure no trailing spaces before new lines
+                if last == " ":
+                    last = None
+                piece = "\n" + (INDENT_CHAR * list_depth) + "("
+                column = list_depth * INDENT_SIZE + 1
+
+            in_xy = current_is_xy
+            list_depth += 1
+        elif kind == CLOSE:
+            if list_depth > 0:
+                list_depth -= 1
+
+            # Remove space before closing parenthesis
+            if last == " ":
+                last = None
+
+            if last_non_whitespace == ")" or in_multi_line_list:
+                piece = "\n" + (INDENT_CHAR * list_depth) + ")"
+                column = list_depth * INDENT_SIZE + 1
+                in_multi_line_list = False
+            else:
+                piece = ")"
+                column += 1
+        elif kind == RUN and not (backslash_count % 2 == 1 and buffer.startswith(quote_char, cursor)):
+            piece = match.group()
+            if list_depth == 0:
+                # No spaces are inserted outside of lists
+                piece = "".join(element_regex.findall(piece))
+                column += len(piece)
+            else:
+                elements = element_regex.findall(piece)
+                piece = " ".join(elements)
+                # Column before the last space decides if the run fits in a single line
+                if in_xy or column + len(piece) - len(elements[-1]) - 1 < CONSECUTIVE_TOKEN_WRAP_THRESHOLD:
+                    column += len(piece)
+                else:
+                    pieces = [elements[0]]
+                    column += len(elements[0])
+                    for element in elements[1:]:
+                        if column < CONSECUTIVE_TOKEN_WRAP_THRESHOLD:
+                            pieces.append(" ")
+                            column += 1
+                        else:
+                            pieces.append("\n" + (INDENT_CHAR * list_depth))
+                            column = list_depth * INDENT_SIZE
+                            in_multi_line_list = True
+                        pieces.append(element)
+                        column += len(element)
+                    piece = "".join(pieces)
+            backslash_count = 0
+        else:
+            piece = match.group() if kind == CHAR else quote_char
+            end = cursor + 1
+            if piece == quote_char and backslash_count % 2 == 0:
+                # Unterminated string, rest of the source is quoted
+                piece = buffer[cursor:]
+                end = len(buffer)
+                if piece.endswith(" "):
+                    if last is not None:
+                        yield last
+                    last = piece[:-1]
+                    piece = " "
+
+            backslash_count = backslash_count + 1 if piece == "\\" else 0
+            column += len(piece)
+
+        if last is not None:
+            yield last
+        last = piece
+        last_non_whitespace = piece[-1]
+        cursor = end
+
+    # Ensure no trailing spaces before appending the final newline
+    if last is not None and last != " ":
+        yield last
+
+    # newline required at end of file for POSIX compliance
+    yield "\n"
+
+
+def prettify(source: str, quote_char: str = '"') -> str:
+    chunks = iter([source])
+    return "".join(format_tokens(lambda: next(chunks, ""), quote_char))
+
+
+def prettify_file(input_path: str, output_path: Optional[str] = None, quote_char: str = '"') -> bool:
+    """Format file without loading it to memory at once
+
+    Output is written to temporary file and renamed, so `output_path` can be the same as `input_path` (default).
+    Existing output file is not touched (its mtime is kept) if formatted content is the same.
+
+    Returns True if output file was written."""
+    output_path = output_path or input_path
+    with open(input_path, encoding="utf-8") as source, tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=os.path.dirname(os.path.abspath(output_path)), delete=False
+    ) as tmp:
+        tmp.writelines(format_tokens(lambda: source.read(CHUNK_SIZE), quote_char))
+    return replace_if_changed(tmp.name, output_path)
+
+
+def write_if_changed(output_path: str, content: str) -> bool:
+    """Write `content` to `output_path`, existing file is not touched (its mtime is kept) if content is the same
+
+    Returns True if output file was written."""
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=os.path.dirname(os.path.abspath(output_path)), delete=False
+    ) as tmp:
+        tmp.write(content)
+    return replace_if_changed(tmp.name, output_path)
+
+
+def replace_if_changed(tmp_path: str, output_path: str) -> bool:
+    """Move temporary file to `output_path` unless output file has the same content
+
+    Returns True if output file was replaced."""
+    try:
+        if os.path.exists(output_path) and filecmp.cmp(tmp_path, output_path, shallow=False):
+            os.unlink(tmp_path)
+            return False
+        os.chmod(tmp_path, file_mode(output_path))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def file_mode(path: str) -> int:
+    """Permissions of existing file or default permissions of a new file"""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
@@ -0,0 +1,141 @@
+"""Lazy reader of top-level nodes of KiCad S-expression files"""
+
+from __future__ import annotations
+
+import mmap
+import re
+from dataclasses import dataclass
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, List, Optional, Type
+
+if TYPE_CHECKING:
+    from kiutils.board import Board
+
+# Structural tokens: brackets and quoted strings (which may contain brackets)
+TOKEN_REGEX = re.compile(rb'[()]|"(?:[^"\\]|\\.)*"', re.DOTALL)
+NAME_REGEX = re.compile(rb"\(\s*([^\s()]+)")
+
+
+@dataclass(frozen=True)
+class Node:
+    """Top-level node, `start` and `end` are byte offsets of its brackets (`end` exclusive)"""
+
+    name: str
+    start: int
+    end: int
+
+
+class SexprReader:
+    """Reads top-level nodes of a KiCad file (e.g. `(setup ...)` of `.kicad_pcb`) without parsing the whole file
+
+    The file is mapped to memory and nodes are located on raw bytes,
+    so skipped subtrees (e.g. zone fills) are never decoded, tokenized or parsed.
+    Files written by KiCad (and prettified by kmake) have every top-level node on a new line
+    indented with a single tab, such nodes are found with plain byte search.
+    Files with other formatting fall back to scanning brackets.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        match = NAME_REGEX.match(self.data)
+        if match is None:
+            raise ValueError(f"{path} is not an S-expression file")
+        self.root = match.group(1).decode()
+        self.root_end = match.end()
+        self._nodes: Optional[List[Node]] = None
+
+    def __enter__(self) -> SexprReader:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.data.close()
+
+    def nodes(self) -> Iterator[Node]:
+        """Yields top-level nodes in file order"""
+        if self._nodes is not None:
+            yield from self._nodes
+            return
+        nodes = []
+        scan = self._scan_indented if self.data[self.root_end : self.root_end + 3] == b"\n\t(" else self._scan_brackets
+        for node in scan():
+            nodes.append(node)
+            yield node
+        self._nodes = nodes
+
+    def find(self, *names: str) -> Iterator[Node]:
+        """Yields top-level nodes with given names"""
+        return (node for node in self.nodes() if node.name in names)
+
+    def text(self, node: Node) -> str:
+        return self.data[node.start : node.end].decode("utf-8")
+
+    def parse(self, node: Node) -> List[Any]:
+        """Parse node with kiutils S-expression parser"""
+        from kiutils.utils.sexpr import parse_sexp
+
+        return parse_sexp(self.text(node))
+
+    def _node(self, start: int, end: int) -> Node:
+        match = NAME_REGEX.match(self.data, start)
+        assert match is not None, f"Invalid node at offset {start} of {self.path}"
+        return Node(match.group(1).decode(), start, end)
+
+    def _scan_indented(self) -> Iterator[Node]:
+        """Find nodes starting with `\\n\\t(`, nested nodes are indented deeper
+        and KiCad escapes new lines in strings, so no other sequence matches"""
+        file_end = self.data.rfind(b")")
+        start = self.data.find(b"\n\t(", self.root_end)
+        while start != -1:
+            next_start = self.data.find(b"\n\t(", start + 1, file_end)
+            end = self.data.rfind(b")", start, next_start if next_start != -1 else file_end) + 1
+            yield self._node(start + 2, end)
+            start = next_start
+
+    def _scan_brackets(self) -> Iterator[Node]:
+        depth = 0
+        start = 0
+        for token in TOKEN_REGEX.finditer(self.data, self.root_end):
+            if token.group() == b"(":
+                if depth == 0:
+                    start = token.start()
+                depth += 1
+            elif token.group() == b")":
+                if depth == 0:
+                    return
+                depth -= 1
+                if depth == 0:
+                    yield self._node(start, token.end())
+
+
+def load_board(path: str, include: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()) -> Board:
+    """Load kiutils Board from selected top-level nodes of `.kicad_pcb` file
+
+    Parameters:
+        include: names of nodes to load (e.g. `setup`, `layers`, `net`), all if not set
+        exclude: names of nodes to skip (e.g. `footprint`, `zone`)
+    """
+    from kiutils.board import Board
+    from kiutils.utils.sexpr import parse_sexp
+
+    include = None if include is None else set(include)
+    exclude = set(exclude)
+    with SexprReader(path) as reader:
+        texts = [
+            reader.text(node)
+            for node in reader.nodes()
+            if (include is None or node.name in include) and node.name not in exclude
+        ]
+        root = reader.root
+    board = Board.from_sexpr(parse_sexp(f"({root}\n" + "\n".join(texts) + "\n)"))
+    board.filePath = path
+    return board
@@ -1,10 +1,11 @@
 """KiCad automation scripts"""
 
 import argparse
+import importlib
 import logging
 import os
 import sys
-from typing import Callable, List
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
 import coloredlogs
 
@@ -19,14 +20,54 @@ if os.path.isdir(os.path.join(os.path.dirname(__file__), "ext_modules")):
 
 
 ######## ARGUMENT PARSING ########
+class LazySubParsersAction(argparse._SubParsersAction):
+    """Subparsers action that imports command module only when its subcommand is dispatched
+
+    Placeholder parser (name & help only) is registered for every lazy command.
+    On dispatch the placeholder is replaced with the parser created by command's `add_subparser`."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._lazy_modules: Dict[str, str] = {}
+
+    def add_lazy_parser(self, name: str, module: str, command_help: str) -> None:
+        """Register placeholder parser for command implemented in `commands.<module>`"""
+        self.add_parser(name, help=command_help)
+        self._lazy_modules[name] = module
+
+    def load_command(self, name: str) -> None:
+        """Import command module and replace placeholder parser with the real one"""
+        module = self._lazy_modules.pop(name, None)
+        if module is None:
+            return
+        del self._name_parser_map[name]
+        self._choices_actions = [action for action in self._choices_actions if action.dest != name]
+        importlib.import_module(f"commands.{module}").add_subparser(self)
+
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: Any,
+        option_string: Optional[str] = None,
+    ) -> None:
+        if isinstance(values, Sequence) and len(values) > 0:
+            self.load_command(values[0])
+        super().__call__(parser, namespace, values, option_string)
+
+
 def get_help_formatter() -> Callable:
     """Returns help formatter"""
     return lambda prog: argparse.HelpFormatter(prog, max_help_position=35)
 
 
-def get_parser() -> argparse.ArgumentParser:
+def get_parser(lazy: bool = False) -> argparse.ArgumentParser:
     """Create parser, import subparsers from commands/ext_modules and parse them
-    Returns parsed arguments"""
+    Returns parsed arguments
+
+    Parameters:
+        lazy (bool): import command modules only when their subcommand is dispatched
+    """
     formatter = get_help_formatter()
     parser = argparse.ArgumentParser(
         prog="kmake",
@@ -44,26 +85,31 @@ Program must be run in project workdir.",
         dest="debug",
         help="increase verbosity, keep temp files",
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="regenerate outputs even if their inputs didn't change",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="print why outputs are regenerated",
+    )
 
+    parser.register("action", "parsers", LazySubParsersAction)
     subparsers = parser.add_subparsers(
         title="Subcommands",
         dest="subcommand",
         help='To display help for specific subcommand use "kmake SUBCOMMAND -h"',
         required=True,
     )
+    assert isinstance(subparsers, LazySubParsersAction)
 
-    commands_names = list(
-        filter(
-            lambda f: ".py" in f,
-            os.listdir(os.path.join(os.path.dirname(__file__), "commands")),
-        )
-    )
-
-    for module_dir in dir(commands):
-        if "__" in module_dir:
-            continue
-        if module_dir + ".py" in commands_names:
-            getattr(commands, module_dir).add_subparser(subparsers)
+    for name, (module, command_help) in commands.COMMANDS.items():
+        if lazy:
+            subparsers.add_lazy_parser(name, module, command_help)
+        else:
+            importlib.import_module(f"commands.{module}").add_subparser(subparsers)
 
     if external_modules_loaded is False:
         return parser
@@ -85,7 +131,7 @@ Program must be run in project workdir.",
 
 
 def parse_arguments(args: List[str]) -> argparse.Namespace:
-    parser = get_parser()
+    parser = get_parser(lazy=True)
     return parser.parse_args(args)
 
 
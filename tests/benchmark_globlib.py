@@ -0,0 +1,102 @@
+"""Benchmark of global symbol lookup used by `kmake globlib` on synthetic libraries
+
+Run from the repository root:
+
+    python tests/benchmark_globlib.py [--libraries N] [--symbols N] [--lookups N]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, TypeVar
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from kiutils.symbol import Symbol  # noqa: E402
+
+from commands.globlib import get_global_symbol_list, get_mpn_index, search_by_mpn  # noqa: E402
+from common.kmake_helper import set_property  # noqa: E402
+from common.library_index import IndexedSymbol, SymbolLibraryIndex  # noqa: E402
+
+T = TypeVar("T")
+
+SYMBOL_TEMPLATE = """	(symbol "{name}"
+		(exclude_from_sim no)
+		(in_bom yes)
+		(on_board yes)
+		(property "Reference" "U"
+			(at 0 0 0)
+		)
+		(property "Value" "{name}"
+			(at 0 0 0)
+		)
+		(property "MPN" "{mpn}"
+			(at 0 0 0)
+		)
+		(symbol "{name}_0_1"
+			(rectangle
+				(start -5.08 5.08)
+				(end 5.08 -5.08)
+			)
+		)
+	)
+"""
+
+
+def write_libraries(directory: Path, libraries: int, symbols: int) -> Dict[str, str]:
+    """Write libraries with unique symbol names & MPNs, returns nickname to path mapping"""
+    lib_mapping = {}
+    for lib in range(libraries):
+        path = directory / f"lib{lib}.kicad_sym"
+        body = "".join(SYMBOL_TEMPLATE.format(name=f"S{lib}_{i}", mpn=f"MPN-{lib}-{i}") for i in range(symbols))
+        path.write_text(f'(kicad_symbol_lib\n\t(version 20231120)\n\t(generator "kmake")\n{body})\n')
+        lib_mapping[f"lib{lib}"] = str(path)
+    return lib_mapping
+
+
+def linear_search(local_symbol: Symbol, global_symbols: Dict[str, IndexedSymbol]) -> List[IndexedSymbol]:
+    """Previous lookup: scan of all global symbols for every local symbol"""
+    mpn = local_symbol.properties[0].value
+    return [symbol for symbol in global_symbols.values() if symbol.mpn is not None and symbol.mpn == mpn]
+
+
+def measure(name: str, function: Callable[[], T]) -> T:
+    start = time.perf_counter()
+    result = function()
+    print(f"{name:<40} {time.perf_counter() - start:8.3f} s")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--libraries", type=int, default=200, help="Number of libraries.")
+    parser.add_argument("--symbols", type=int, default=300, help="Number of symbols in each library.")
+    parser.add_argument("--lookups", type=int, default=1500, help="Number of local symbols matched by MPN.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        lib_mapping = write_libraries(Path(tempdir), args.libraries, args.symbols)
+        index_path = str(Path(tempdir) / "symbol-index.json")
+        print(f"{args.libraries * args.symbols} symbols in {args.libraries} libraries")
+
+        measure("index (cold)", lambda: get_global_symbol_list(lib_mapping, SymbolLibraryIndex(index_path)))
+        global_symbols = measure(
+            "index (warm)", lambda: get_global_symbol_list(lib_mapping, SymbolLibraryIndex(index_path))
+        )
+
+        local_symbols = []
+        for i in range(args.lookups):
+            symbol = Symbol()
+            symbol.libId = f"local:L{i}"
+            set_property(symbol, "MPN", f"MPN-{i % args.libraries}-{i % args.symbols}")
+            local_symbols.append(symbol)
+
+        measure("MPN lookups (linear scan)", lambda: [linear_search(s, global_symbols) for s in local_symbols])
+        mpn_index = measure("MPN index", lambda: get_mpn_index(global_symbols))
+        measure("MPN lookups (index)", lambda: [search_by_mpn(s, mpn_index) for s in local_symbols])
+
+
+if __name__ == "__main__":
+    main()
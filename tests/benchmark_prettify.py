@@ -0,0 +1,64 @@
+"""Benchmark of the KiCad formatter on a large board
+
+Board is built by replicating top-level nodes (footprints, tracks, zones, ...) of the test project.
+Run from the repository root:
+
+    python tests/benchmark_prettify.py [--copies N]
+"""
+
+import argparse
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from common.prettify import prettify, prettify_file  # noqa: E402
+from common.sexpr_reader import SexprReader  # noqa: E402
+
+TEST_PCB = Path(__file__).parent.resolve() / "test_project" / "test_project.kicad_pcb"
+REPLICATED_NODES = ["footprint", "gr_line", "gr_arc", "gr_text", "segment", "via", "arc", "zone"]
+
+
+def flatten(source: str) -> str:
+    """Put whole file in a single line, keeping whitespace in strings"""
+    return re.sub(r'("(?:[^"\\]|\\.)*")|\s+', lambda match: match.group(1) or " ", source)
+
+
+def large_board(copies: int) -> str:
+    with SexprReader(str(TEST_PCB)) as reader:
+        texts = [reader.text(node) for node in reader.nodes()]
+        replicated = [reader.text(node) for node in reader.find(*REPLICATED_NODES)]
+    return "(kicad_pcb\n\t" + "\n\t".join(texts + replicated * (copies - 1)) + "\n)\n"
+
+
+def measure(name: str, size: int, function: Callable[[], object]) -> None:
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<40} {elapsed:8.3f} s {size / elapsed / 1e6:8.2f} MB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20, help="Number of copies of the test board content.")
+    args = parser.parse_args()
+
+    formatted = large_board(args.copies)
+    flattened = flatten(formatted)
+    print(f"Board size: {len(formatted) / 1e6:.1f} MB")
+
+    measure("prettify (formatted)", len(formatted), lambda: prettify(formatted))
+    measure("prettify (single line)", len(flattened), lambda: prettify(flattened))
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = Path(tempdir) / "board.kicad_pcb"
+        path.write_text(flattened)
+        measure("prettify_file (single line)", len(flattened), lambda: prettify_file(str(path)))
+        assert path.read_text() == formatted
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ import tempfile
 
 class KmakeTestCase:
     target_dir: Path
+    original_dir: str
     test_cmd: str
     kpro: KicadProject
     TEST_DIR = Path(__file__).parent.resolve()
@@ -38,6 +39,7 @@ class KmakeTestCase:
 
         # change current directory to the test design repository
         # as kmake expects to be run from the root of the test repository
+        self.original_dir = os.getcwd()
         os.chdir(self.target_dir)
 
         self.project_repo = git.Repo.init(None)
@@ -49,6 +51,8 @@ class KmakeTestCase:
     def tearDown(self) -> None:
         """Check if Kicad files are not corrupted & remove tmp directory after test"""
         self.check_if_pcb_sch_opens()
+        # Don't leave following tests in removed directory
+        os.chdir(self.original_dir)
         if os.path.exists(self.target_dir):
             shutil.rmtree(self.target_dir)
 
@@ -1,9 +1,21 @@
+import io
 import unittest
 import logging
 from pathlib import Path
 from typing import List
 from kmake_test_common import KmakeTestCase
 
+from commands.bom import (
+    Component,
+    ComponentGroup,
+    compile_columns,
+    create_netlist,
+    group_components,
+    parse_netlist,
+    read_components,
+    save_csv,
+)
+
 
 class BomTest(KmakeTestCase, unittest.TestCase):
 
@@ -99,6 +111,53 @@ class BomTest(KmakeTestCase, unittest.TestCase):
             False,
         )
 
+    def test_variants(self) -> None:
+        """
+        Test if all BoM variants are written in a single run
+        """
+        self.run_test_command(
+            [
+                "--variants",
+                "populated",
+                "DNP",
+                "ALL:Reference,Quantity,Value,Footprint,Manufacturer,MPN,DNP",
+                "ALL-ReferenceNotGrouped:Reference Designators,Manufacturer,Manufacturer Part Number,DNP,Description",
+            ]
+        )
+        for kind in ["populated", "DNP", "ALL", "ALL-ReferenceNotGrouped"]:
+            self.assertListEqual(
+                sorted(open(self.ref_dir / f"BOM-{kind}.csv")),
+                sorted(open(self.target_dir / "doc" / f"test_project-BOM-{kind}.csv")),
+            )
+
+    def test_kicad_cli(self) -> None:
+        self.template_test(
+            [
+                "--all",
+                "--kicad-cli",
+                "--fields",
+                "Reference",
+                "Quantity",
+                "Value",
+                "Footprint",
+                "Manufacturer",
+                "MPN",
+                "DNP",
+            ],
+            self.ref_dir / "BOM-ALL.csv",
+            self.target_dir / "doc" / "test_project-BOM-ALL.csv",
+            False,
+        )
+
+    def test_schematic_matches_netlist(self) -> None:
+        """
+        Components read from schematic files are the same as in netlist exported by kicad-cli
+        """
+        netlist_groups, netlist_ok = parse_netlist(create_netlist(self.kpro, "kicadxml"))
+        groups, ok = group_components(read_components(self.kpro))
+        self.assertListEqual(groups, netlist_groups)
+        self.assertEqual(ok, netlist_ok)
+
     def test_invalid_field(self) -> None:
         self.template_test(
             ["--fields", "wrongField"],
@@ -108,5 +167,72 @@ class BomTest(KmakeTestCase, unittest.TestCase):
         )
 
 
+class SaveCsvTest(unittest.TestCase):
+
+    groups = [
+        ComponentGroup(["R1", "R2"], "10k", "", "", "Resistor", "R_0402_1005Metric", False),
+        ComponentGroup(["C1"], "100n", "GRM155", "Murata", "Capacitor", "C_0402_1005Metric", True),
+    ]
+
+    def save(self, headers: List[str], group_references: bool) -> str:
+        output = io.StringIO()
+        save_csv(output, self.groups, headers, group_references)
+        return output.getvalue()
+
+    def test_grouped(self) -> None:
+        self.assertEqual(
+            self.save(["Reference", "Quantity", "Value", "MPN", "Manufacturer", "DNP", "Description"], True),
+            '"Reference","Quantity","Value","MPN","Manufacturer","DNP","Description"\n'
+            '"R1 R2","2","10k","","","","Resistor"\n'
+            '"C1","1","100n","GRM155","Murata","DNP","Capacitor"\n',
+        )
+
+    def test_not_grouped(self) -> None:
+        self.assertEqual(
+            self.save(["Reference Designators", "Quantity", "Footprint"], False),
+            '"Reference Designators","Quantity","Footprint"\n'
+            '"R1","1","R_0402_1005Metric"\n'
+            '"R2","1","R_0402_1005Metric"\n'
+            '"C1","1","C_0402_1005Metric"\n',
+        )
+
+    def test_invalid_header(self) -> None:
+        with self.assertRaises(ValueError):
+            compile_columns(["Reference", "wrongField"])
+
+
+class GroupComponentsTest(unittest.TestCase):
+
+    def component(self, ref: str, value: str, dnp: bool = False) -> Component:
+        return Component(ref, value, "Lib:FP", "", "", "", False, dnp)
+
+    def test_order(self) -> None:
+        components = [
+            self.component("U1", "MCU"),
+            self.component("R10", "10k"),
+            self.component("C2", "100n"),
+            self.component("R2", "10k"),
+            self.component("R3", "10k", dnp=True),
+            self.component("R1", "1k"),
+            self.component("C10", "10u"),
+            self.component("C1", "100n"),
+        ]
+        groups, ok = group_components(components)
+        self.assertTrue(ok)
+        self.assertListEqual(
+            [(group.refs, group.value, group.dnp) for group in groups],
+            [
+                (["C10"], "10u", False),
+                (["C1", "C2"], "100n", False),
+                (["R1"], "1k", False),
+                (["R2", "R10"], "10k", False),
+                (["R3"], "10k", True),
+                (["U1"], "MCU", False),
+            ],
+        )
+        # Order doesn't depend on order of components
+        self.assertListEqual(group_components(components[::-1])[0], groups)
+
+
 if __name__ == "__main__":
     unittest.main()
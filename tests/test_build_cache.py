@@ -0,0 +1,80 @@
+import argparse
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from xdg import BaseDirectory
+
+from common.build_cache import BuildCache
+
+
+class BuildCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        cache_patch = patch.object(BaseDirectory, "xdg_cache_home", str(self.dir / "cache"))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+        self.project_dir = self.dir / "project"
+        self.project_dir.mkdir()
+        self.pcb = self.project_dir / "test.kicad_pcb"
+        self.pcb.write_text("(kicad_pcb)")
+        self.output = self.project_dir / "out.step"
+        self.args = argparse.Namespace(subcommand="step", debug=False, force=False, explain=False)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def build(self, args: argparse.Namespace, version: str = "9.0.1") -> bool:
+        """Returns True if target was rebuilt"""
+        cache = BuildCache(str(self.project_dir), version, [str(self.project_dir / "sym-lib-table")])
+        target = cache.target("step", args, [str(self.pcb)], [str(self.output)])
+        if target.up_to_date():
+            return False
+        self.output.write_text("step")
+        target.record()
+        return True
+
+    def test_skip_unchanged(self) -> None:
+        self.assertTrue(self.build(self.args))
+        self.assertFalse(self.build(self.args))
+
+    def test_rebuild_on_input_change(self) -> None:
+        self.build(self.args)
+        self.pcb.write_text("(kicad_pcb (version 1))")
+        self.assertTrue(self.build(self.args))
+        (self.project_dir / "sym-lib-table").write_text("(sym_lib_table)")
+        self.assertTrue(self.build(self.args))
+        self.assertTrue(self.build(self.args, version="9.0.2"))
+        self.assertTrue(self.build(argparse.Namespace(**vars(self.args), theme="dark")))
+        self.assertFalse(self.build(argparse.Namespace(**vars(self.args), theme="dark")))
+
+    def test_content_hash(self) -> None:
+        """Touching input without changing its content doesn't rebuild outputs"""
+        self.build(self.args)
+        stat = self.pcb.stat()
+        os.utime(self.pcb, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertFalse(self.build(self.args))
+
+    def test_rebuild_on_output_change(self) -> None:
+        self.build(self.args)
+        self.output.unlink()
+        self.assertTrue(self.build(self.args))
+        self.output.write_text("modified")
+        self.assertTrue(self.build(self.args))
+
+    def test_force_and_explain(self) -> None:
+        self.build(self.args)
+        self.assertTrue(self.build(argparse.Namespace(**dict(vars(self.args), force=True))))
+        self.pcb.write_text("(kicad_pcb (version 1))")
+        with self.assertLogs("common.build_cache") as logs:
+            self.assertTrue(self.build(argparse.Namespace(**dict(vars(self.args), explain=True))))
+        self.assertIn("test.kicad_pcb changed", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
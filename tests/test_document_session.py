@@ -0,0 +1,67 @@
+import os
+import unittest
+
+from kiutils.board import Board
+from kiutils.schematic import Schematic
+from kmake_test_common import KmakeTestCase
+
+from common.prettify import prettify
+
+
+class DocumentSessionTest(KmakeTestCase, unittest.TestCase):
+
+    def __init__(self, method_name: str = "runTest") -> None:
+        KmakeTestCase.__init__(self, "session")
+        unittest.TestCase.__init__(self, method_name)
+
+    def test_parsed_once(self) -> None:
+        session = self.kpro.session
+        board = session.board(self.kpro.pcb_file)
+        self.assertIs(session.board(os.path.abspath(self.kpro.pcb_file)), board)
+        schematic = session.schematic(self.kpro.sch_root)
+        self.assertIs(session.schematic(self.kpro.sch_root), schematic)
+
+    def test_flush_only_dirty(self) -> None:
+        session = self.kpro.session
+        mtimes = {path: os.stat(path).st_mtime_ns for path in self.kpro.all_sch_files}
+        board = session.board(self.kpro.pcb_file)
+        for path in self.kpro.all_sch_files:
+            session.schematic(path)
+        board.setup.auxAxisOrigin.X = 10
+        session.mark_dirty(board)
+
+        self.assertEqual(session.flush(), [board.filePath])
+        self.assertEqual(mtimes, {path: os.stat(path).st_mtime_ns for path in self.kpro.all_sch_files})
+        with open(self.kpro.pcb_file) as file:
+            self.assertEqual(file.read(), prettify(board.to_sexpr()))
+        self.assertEqual(Board.from_file(self.kpro.pcb_file).setup.auxAxisOrigin.X, 10)
+        self.assertEqual(session.flush(), [])
+
+    def test_flush_unchanged(self) -> None:
+        """Documents marked dirty without changes are not written again"""
+        session = self.kpro.session
+        board = session.board(self.kpro.pcb_file)
+        session.mark_dirty(board)
+        session.flush()
+        mtime = os.stat(self.kpro.pcb_file).st_mtime_ns
+
+        session.mark_dirty(board)
+        self.assertEqual(session.flush(), [])
+        self.assertEqual(os.stat(self.kpro.pcb_file).st_mtime_ns, mtime)
+        self.assertIs(session.board(self.kpro.pcb_file), board)
+
+    def test_reload_modified_file(self) -> None:
+        session = self.kpro.session
+        schematic = session.schematic(self.kpro.sch_root)
+        modified = Schematic.from_file(self.kpro.sch_root)
+        modified.titleBlock.title = "Modified outside of session"
+        modified.to_file()
+        os.utime(self.kpro.sch_root, ns=(0, os.stat(self.kpro.sch_root).st_mtime_ns + 1))
+
+        reloaded = session.schematic(self.kpro.sch_root)
+        self.assertIsNot(reloaded, schematic)
+        self.assertEqual(reloaded.titleBlock.title, "Modified outside of session")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,12 @@ from kiutils.board import Board
 import kmake
 from kmake_test_common import KmakeTestCase
 from common.kmake_helper import get_property, set_property
+from common.library_index import IndexedSymbol
+from commands.globlib import GlobalSymbols, get_mpn_index, search_by_mpn
+from common.library_index import SymbolLibraryIndex
+from kiutils.symbol import Symbol
 from pathlib import Path
+from unittest.mock import Mock, patch
 
 
 class GloblibTest(KmakeTestCase, unittest.TestCase):
@@ -224,5 +229,64 @@ class GloblibTest(KmakeTestCase, unittest.TestCase):
         self.compare_footprints_libraries()
 
 
+class MpnIndexTest(unittest.TestCase):
+
+    def local_symbol(self, mpn: str) -> Symbol:
+        symbol = Symbol()
+        symbol.libId = "local:U"
+        set_property(symbol, "MPN", mpn)
+        return symbol
+
+    def test_search_by_mpn(self) -> None:
+        global_symbols = {
+            name: IndexedSymbol(name, mpn, "global", "global.kicad_sym", 0, 0, "")
+            for name, mpn in [("A", "MPN-A"), ("B1", "MPN-B"), ("B2", "MPN-B"), ("C", None)]
+        }
+        # Ambiguous MPNs are reported when the index is built
+        with self.assertLogs("commands.globlib", "WARNING") as logs:
+            mpn_index = get_mpn_index(global_symbols)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("global:B1, global:B2", logs.output[0])
+        self.assertEqual(sorted(mpn_index), ["MPN-A", "MPN-B"])
+
+        self.assertEqual(search_by_mpn(self.local_symbol("MPN-A"), mpn_index), global_symbols["A"])
+        # Ambiguous, unknown & empty MPNs are not matched
+        self.assertIsNone(search_by_mpn(self.local_symbol("MPN-B"), mpn_index))
+        self.assertIsNone(search_by_mpn(self.local_symbol("MPN-X"), mpn_index))
+        self.assertIsNone(search_by_mpn(self.local_symbol(""), mpn_index))
+
+
+class GlobalSymbolsTest(unittest.TestCase):
+
+    def local_symbol(self, lib_id: str, mpn: str) -> Symbol:
+        symbol = Symbol()
+        symbol.libId = lib_id
+        set_property(symbol, "MPN", mpn)
+        return symbol
+
+    def test_lazy_lookup(self) -> None:
+        linked = IndexedSymbol("R", "MPN-R", "Device", __file__, 0, 0, "")
+        other = {
+            "R": IndexedSymbol("R", "MPN-R", "Other", __file__, 0, 0, ""),
+            "C1": IndexedSymbol("C1", "MPN-C", "Other", __file__, 0, 0, ""),
+            "L": IndexedSymbol("L", "MPN-L", "Other", __file__, 0, 0, ""),
+        }
+        index = Mock(spec=SymbolLibraryIndex)
+        index.by_name.return_value = {"R": linked}
+        local_symbols = [self.local_symbol("Device:R", "MPN-R"), self.local_symbol("local:C", "MPN-C")]
+        global_symbols = GlobalSymbols({"Device": __file__, "Other": __file__}, index, local_symbols)
+
+        with patch("commands.globlib.get_global_symbol_list", return_value=other) as get_global_symbol_list:
+            # Symbol is found in library it links to, other libraries are not read
+            self.assertEqual(global_symbols.find(local_symbols[0]), linked)
+            get_global_symbol_list.assert_not_called()
+
+            # Index of all libraries is read once, for symbols not found in their library
+            self.assertEqual(global_symbols.find(local_symbols[1]), other["C1"])
+            self.assertEqual(global_symbols.find(local_symbols[1]), other["C1"])
+            get_global_symbol_list.assert_called_once()
+        self.assertEqual(sorted(global_symbols.mpn_index), ["MPN-C", "MPN-R"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from xdg import BaseDirectory
+
+from common.kmake_helper import get_kicad_cli_version
+
+
+class KicadCliCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        self.calls = self.dir / "calls"
+        # Fake kicad-cli counting its invocations
+        self.kicad_cli = self.dir / "kicad-cli"
+        self.kicad_cli.write_text(f'#!/bin/sh\necho x >> "{self.calls}"\necho 9.0.1\n')
+        self.kicad_cli.chmod(0o755)
+
+        env_patch = patch.dict(os.environ, {"KMAKE_KICAD_CLI": str(self.kicad_cli)})
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+        cache_patch = patch.object(BaseDirectory, "xdg_cache_home", str(self.dir / "cache"))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def call_count(self) -> int:
+        if not self.calls.exists():
+            return 0
+        return len(self.calls.read_text().splitlines())
+
+    def test_cache_hit(self) -> None:
+        self.assertEqual(get_kicad_cli_version(), "9.0.1")
+        self.assertEqual(get_kicad_cli_version(), "9.0.1")
+        self.assertEqual(self.call_count(), 1)
+
+    def test_invalidated_by_mtime(self) -> None:
+        get_kicad_cli_version()
+        stat = self.kicad_cli.stat()
+        os.utime(self.kicad_cli, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        get_kicad_cli_version()
+        self.assertEqual(self.call_count(), 2)
+
+    def test_invalidated_by_env(self) -> None:
+        get_kicad_cli_version()
+        with patch.dict(os.environ, {"KMAKE_KICAD_CLI": f"{self.kicad_cli} --some-arg"}):
+            get_kicad_cli_version()
+        self.assertEqual(self.call_count(), 2)
+
+    def test_corrupted_cache(self) -> None:
+        cache_dir = self.dir / "cache" / "kmake"
+        cache_dir.mkdir(parents=True)
+        (cache_dir / "kicad-cli-version.json").write_text("{not json")
+        self.assertEqual(get_kicad_cli_version(), "9.0.1")
+        self.assertEqual(get_kicad_cli_version(), "9.0.1")
+        self.assertEqual(self.call_count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
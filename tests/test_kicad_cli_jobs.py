@@ -0,0 +1,90 @@
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+from common.kmake_helper import KicadCliJobs, default_jobs, set_max_jobs
+
+
+class KicadCliJobsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        # Jobs inherit working directory, previous tests may leave it in a removed directory
+        os.chdir(self.dir)
+        # Fake kicad-cli: `sleep N`, `fail` or echo arguments
+        kicad_cli = self.dir / "kicad-cli"
+        kicad_cli.write_text(
+            "#!/bin/sh\n"
+            'case "$1" in\n'
+            '  sleep) sleep "$2" ;;\n'
+            '  fail) echo "something went wrong"; exit 3 ;;\n'
+            '  *) echo "$@" ;;\n'
+            "esac\n"
+        )
+        kicad_cli.chmod(0o755)
+        env_patch = patch.dict(os.environ, {"KMAKE_KICAD_CLI": str(kicad_cli)})
+        env_patch.start()
+        self.addCleanup(env_patch.stop)
+
+    def tearDown(self) -> None:
+        os.chdir(Path(__file__).parent)
+        self.temp_dir.cleanup()
+
+    def test_concurrent(self) -> None:
+        start = time.monotonic()
+        with KicadCliJobs(max_jobs=4) as jobs:
+            for _ in range(4):
+                jobs.submit(["sleep", "0.5"])
+        self.assertLess(time.monotonic() - start, 1.5)
+
+    def test_shared_process_limit(self) -> None:
+        """Runners used concurrently (e.g. by stages of `kmake run`) share the limit of kicad-cli processes"""
+        set_max_jobs(1)
+        self.addCleanup(set_max_jobs, None)
+        self.assertEqual(default_jobs(), 1)
+
+        def run_jobs() -> None:
+            with KicadCliJobs(max_jobs=2) as jobs:
+                jobs.submit(["sleep", "0.3"])
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for future in [executor.submit(run_jobs) for _ in range(2)]:
+                future.result()
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+
+    def test_logs_and_then(self) -> None:
+        log_dir = self.dir / "logs"
+        log_dir.mkdir()
+        finished = []
+        with KicadCliJobs(log_dir=str(log_dir)) as jobs:
+            jobs.submit(["pcb", "export", "pos"], then=lambda: finished.append(True))
+        self.assertEqual(finished, [True])
+        self.assertEqual([f.read_text() for f in log_dir.iterdir()], ["pcb export pos\n"])
+
+    def test_failure_cancels_other_jobs(self) -> None:
+        start = time.monotonic()
+        with self.assertRaises(subprocess.CalledProcessError), self.assertLogs("common.kmake_helper", "ERROR") as logs:
+            with KicadCliJobs(max_jobs=2) as jobs:
+                jobs.submit(["sleep", "10"])
+                jobs.submit(["fail"])
+                jobs.submit(["sleep", "10"])
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIn("something went wrong", "\n".join(logs.output))
+        # Temporary log directory is removed on exit, so it is not mentioned
+        self.assertNotIn("output saved to", "\n".join(logs.output))
+
+    def test_timeout(self) -> None:
+        with self.assertRaises(subprocess.TimeoutExpired):
+            with KicadCliJobs(timeout=0.2) as jobs:
+                jobs.submit(["sleep", "10"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from common.kicad_project import KicadProject
+
+SYM_LIB_TABLE = """(sym_lib_table
+  (version 7)
+{libs})
+"""
+
+
+def lib_table(**libs: str) -> str:
+    return SYM_LIB_TABLE.format(
+        libs="".join(
+            f'  (lib (name "{name}")(type "KiCad")(uri "{uri}")(options "")(descr ""))\n' for name, uri in libs.items()
+        )
+    )
+
+
+class LibraryTablesTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        # Previous tests may leave working directory in a removed directory
+        os.chdir(Path(__file__).parent)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.dir)
+        environ = patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        (self.dir / "global.kicad_sym").touch()
+        (self.dir / "kicad_common.json").write_text(
+            json.dumps({"environment": {"vars": {"GLOBAL_LIBS": str(self.dir)}}})
+        )
+        (self.dir / "global-sym-lib-table").write_text(
+            lib_table(Global="${GLOBAL_LIBS}/global.kicad_sym", Missing="${GLOBAL_LIBS}/missing.kicad_sym")
+        )
+        (self.dir / "sym-lib-table").write_text(lib_table(Local="${KIPRJMOD}/lib/local.kicad_sym"))
+
+        with patch("common.kicad_project.get_kicad_cli_version", return_value="8.0.0"):
+            self.project = KicadProject(disable_logging=True)
+        self.project.comm_cfg_path = str(self.dir / "kicad_common.json")
+        self.project.glob_sym_lib_table_path = str(self.dir / "global-sym-lib-table")
+
+    def test_libraries(self) -> None:
+        libraries = self.project.lib_tables.symbol_libraries()
+        self.assertEqual(list(libraries), ["Global", "Missing", "Local"])
+        self.assertEqual(libraries["Global"].path, str(self.dir / "global.kicad_sym"))
+        self.assertEqual(libraries["Local"].path, f"{os.path.realpath(self.dir)}/lib/local.kicad_sym")
+        self.assertTrue(libraries["Global"].exists)
+        self.assertFalse(libraries["Missing"].exists)
+        self.assertEqual(list(self.project.lib_tables.symbol_libraries(include_project=False)), ["Global", "Missing"])
+
+    def test_resolved_once(self) -> None:
+        tables = self.project.lib_tables
+        with patch.object(KicadProject, "load_kicad_environ_vars", wraps=self.project.load_kicad_environ_vars) as env:
+            library = tables.symbol_library("Global")
+            assert library is not None
+            self.assertTrue(library.exists)
+            # Tables, environment and library paths are not checked again
+            with patch("os.path.exists", wraps=os.path.exists) as exists:
+                for _ in range(3):
+                    self.assertTrue(tables.symbol_libraries()["Global"].exists)
+                exists.assert_not_called()
+            env.assert_called_once()
+        self.assertIs(tables.symbol_library("Global"), library)
+
+        # Modified table is read again
+        (self.dir / "sym-lib-table").write_text(lib_table(Local2="${KIPRJMOD}/lib/local2.kicad_sym"))
+        self.assertEqual(list(tables.symbol_libraries()), ["Global", "Missing", "Local2"])
+
+    def test_build_inputs(self) -> None:
+        """Global tables & environment from kicad_common.json are inputs of incremental builds"""
+        from commands.step import get_model_paths
+
+        self.assertIn(self.project.glob_sym_lib_table_path, self.project.lib_tables.table_paths())
+        with patch("common.kicad_project.get_kicad_cli_version", return_value="8.0.0"):
+            project = KicadProject(disable_logging=True)
+        for path in project.lib_tables.table_paths():
+            self.assertIn(path, project.build_cache.common_inputs)
+
+        self.project.pcb_file = str(self.dir / "board.kicad_pcb")
+        Path(self.project.pcb_file).write_text('(kicad_pcb (footprint "R" (model "${GLOBAL_LIBS}/R.step")))')
+        self.assertEqual(get_model_paths(self.project), [str(self.dir / "R.step")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+from kiutils.footprint import Footprint
+from kiutils.schematic import Schematic
+from kiutils.symbol import SymbolLib
+
+from common.kmake_helper import get_property, set_property
+from common.library_index import FootprintLibraryIndex, SymbolLibraryIndex
+from common.prettify import prettify
+
+TEST_SCH = Path(__file__).parent.resolve() / "test_project" / "power.kicad_sch"
+
+
+class SymbolLibraryIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.dir = Path(self.temp_dir.name)
+        self.index_path = str(self.dir / "cache" / "symbol-index.json")
+
+        # Global library made of symbols embedded in the test schematic
+        self.library = SymbolLib()
+        for symbol in Schematic.from_file(str(TEST_SCH)).libSymbols:
+            symbol.libId = symbol.entryName
+            self.library.symbols.append(symbol)
+        set_property(self.library.symbols[0], "MPN", 'Part "1"')
+        set_property(self.library.symbols[1], "mpn", "Part 2")
+        self.library_path = self.dir / "global.kicad_sym"
+        self.library_path.write_text(prettify(self.library.to_sexpr()))
+
+    def test_index(self) -> None:
+        index = SymbolLibraryIndex(self.index_path)
+        entries = index.library("global", str(self.library_path))
+
+        self.assertEqual([entry.name for entry in entries], [symbol.entryName for symbol in self.library.symbols])
+        self.assertEqual([entry.mpn for entry in entries], [get_property(s, "MPN") for s in self.library.symbols])
+        self.assertEqual({entry.library for entry in entries}, {"global"})
+        # Symbols are parsed the same way as whole library
+        for entry, expected in zip(entries, SymbolLib.from_file(str(self.library_path)).symbols):
+            self.assertEqual(index.symbol(entry).to_sexpr(), expected.to_sexpr())
+
+    def test_persistent_index(self) -> None:
+        index = SymbolLibraryIndex(self.index_path)
+        entries = index.library("global", str(self.library_path))
+        index.save()
+
+        # Index is reused by the next run
+        with patch.object(SymbolLibraryIndex, "scan") as scan:
+            self.assertEqual(SymbolLibraryIndex(self.index_path).library("global", str(self.library_path)), entries)
+            scan.assert_not_called()
+
+        # Changed library is indexed again
+        self.library.symbols = self.library.symbols[1:]
+        self.library_path.write_text(prettify(self.library.to_sexpr()))
+        os.utime(self.library_path, ns=(0, 0))
+        entries = SymbolLibraryIndex(self.index_path).library("global", str(self.library_path))
+        self.assertEqual([entry.name for entry in entries], [symbol.entryName for symbol in self.library.symbols])
+
+
+FOOTPRINT_TEMPLATE = """(footprint "{name}"
+	(layer "F.Cu")
+	(attr smd)
+{models})
+"""
+
+
+class FootprintLibraryIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.dir = Path(self.temp_dir.name)
+        self.index_path = str(self.dir / "cache" / "footprint-index.json")
+        self.library_path = self.dir / "global.pretty"
+        self.library_path.mkdir()
+        self.write_footprint("R_0402", ['"${KICAD8_3DMODEL_DIR}/Resistor_SMD.3dshapes/R_0402.wrl"', "R_0402.step"])
+        self.write_footprint("TestPoint", [])
+
+    def write_footprint(self, name: str, models: List[str]) -> None:
+        text = "".join(
+            f"\t(model {model}\n\t\t(offset\n\t\t\t(xyz 0 0 0)\n\t\t)\n\t\t(scale\n\t\t\t(xyz 1 1 1)\n\t\t)\n"
+            f"\t\t(rotate\n\t\t\t(xyz 0 0 0)\n\t\t)\n\t)\n"
+            for model in models
+        )
+        (self.library_path / f"{name}.kicad_mod").write_text(FOOTPRINT_TEMPLATE.format(name=name, models=text))
+
+    def test_index(self) -> None:
+        index = FootprintLibraryIndex(self.index_path)
+        entries = index.library("global", str(self.library_path))
+
+        self.assertEqual([entry.name for entry in entries], ["R_0402", "TestPoint"])
+        self.assertEqual(entries[0].models, ["${KICAD8_3DMODEL_DIR}/Resistor_SMD.3dshapes/R_0402.wrl", "R_0402.step"])
+        self.assertEqual(entries[1].models, [])
+        for entry in entries:
+            footprint = Footprint.from_file(entry.path)
+            self.assertEqual(index.footprint(entry).to_sexpr(), footprint.to_sexpr())
+            self.assertEqual([model.path for model in footprint.models], entry.models)
+
+    def test_persistent_index(self) -> None:
+        index = FootprintLibraryIndex(self.index_path)
+        index.library("global", str(self.library_path))
+        index.save()
+
+        # Only new & changed files are scanned in the next run
+        self.write_footprint("C_0402", ["C_0402.step"])
+        with patch.object(FootprintLibraryIndex, "scan", return_value=["C_0402.step"]) as scan:
+            index = FootprintLibraryIndex(self.index_path)
+            entries = index.library("global", str(self.library_path))
+            scan.assert_called_once_with(str(self.library_path / "C_0402.kicad_mod"))
+        self.assertEqual([entry.name for entry in entries], ["C_0402", "R_0402", "TestPoint"])
+        self.assertTrue(index.modified)
+
+        # Removed files are dropped from the index
+        (self.library_path / "TestPoint.kicad_mod").unlink()
+        entries = index.library("global", str(self.library_path))
+        self.assertEqual([entry.name for entry in entries], ["C_0402", "R_0402"])
+
+
+if __name__ == "__main__":
+    unittest.main()
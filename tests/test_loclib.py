@@ -4,6 +4,18 @@ from kiutils.board import Board
 from kiutils.symbol import SymbolLib
 from kmake_test_common import KmakeTestCase
 from pathlib import Path
+import copy
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from commands.loclib import LocalSymbolLib, find_duplicate_files, get_symbol_from_library, group_symbols_by_library_name
+from common.kicad_project import KicadProject
+from common.kmake_helper import link_or_copy, set_property
+from common.library_index import SymbolLibraryIndex
+from common.prettify import prettify
 
 
 class LoclibTest(KmakeTestCase, unittest.TestCase):
@@ -77,5 +89,97 @@ class LoclibTest(KmakeTestCase, unittest.TestCase):
         self.assertNotIn("VCC", target_symbols)
 
 
+class LocalSymbolLibTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.symbols = []
+        for symbol in Schematic.from_file(str(Path(__file__).parent / "test_project" / "power.kicad_sch")).libSymbols:
+            symbol.libId = symbol.entryName
+            self.symbols.append(symbol)
+
+    def test_append_without_duplicates(self) -> None:
+        library = SymbolLib()
+        local_symbols = LocalSymbolLib(library)
+        for symbol in self.symbols:
+            local_symbols.append(symbol)
+        # Equal copies are skipped, modified symbols with the same name are added
+        for symbol in self.symbols:
+            local_symbols.append(copy.deepcopy(symbol))
+        modified = copy.deepcopy(self.symbols[0])
+        set_property(modified, "MPN", "123")
+        local_symbols.append_template(modified)
+
+        self.assertEqual(library.symbols, [modified] + self.symbols)
+
+    def test_get_symbol_from_library(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            library_path = str(Path(tempdir) / "remote.kicad_sym")
+            Path(library_path).write_text(prettify(SymbolLib(symbols=self.symbols).to_sexpr()))
+            index = SymbolLibraryIndex(str(Path(tempdir) / "symbol-index.json"))
+
+            remote_symbols = SymbolLib.from_file(library_path).symbols
+            for symbol in remote_symbols:
+                self.assertEqual(get_symbol_from_library(symbol.entryName, library_path, index), symbol)
+            self.assertIsNone(get_symbol_from_library("missing", library_path, index))
+
+
+class CacheLibTest(unittest.TestCase):
+
+    def test_properties_not_shared(self) -> None:
+        """Symbols of missing libraries taken from cache don't share properties with the schematic"""
+        with tempfile.TemporaryDirectory() as tempdir:
+            shutil.copy(Path(__file__).parent / "test_project" / "power.kicad_sch", Path(tempdir) / "power.kicad_sch")
+            (Path(tempdir) / "sym-lib-table").write_text("(sym_lib_table\n  (version 7)\n)\n")
+            # Previous tests may leave working directory in a removed directory
+            os.chdir(Path(__file__).parent)
+            self.addCleanup(os.chdir, os.getcwd())
+            os.chdir(tempdir)
+            with patch("common.kicad_project.get_kicad_cli_version", return_value="8.0.0"):
+                kpro = KicadProject(disable_logging=True)
+            kpro.glob_sym_lib_table_path = str(Path(tempdir) / "sym-lib-table")
+            kpro.comm_cfg_path = str(Path(tempdir) / "kicad_common.json")
+
+            with self.assertLogs("commands.loclib", "WARNING"):
+                cache_lib = group_symbols_by_library_name(kpro).libs[0]
+            schematic = kpro.session.schematic(kpro.all_sch_files[0])
+            self.assertNotEqual(cache_lib.symbol_list, [])
+            schematic_properties = [prop for symbol in schematic.schematicSymbols for prop in symbol.properties]
+            for local_symbol in cache_lib.symbol_list:
+                for prop in local_symbol.symbol.properties:
+                    self.assertFalse(any(prop is schematic_prop for schematic_prop in schematic_properties))
+
+
+class ModelCopyTest(unittest.TestCase):
+
+    def test_find_duplicate_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            sources = {}
+            for name, content in [("a.step", "model"), ("b.step", "other"), ("c.step", "model"), ("d.wrl", "model 2")]:
+                sources[name] = Path(tempdir) / name
+                sources[name].write_text(content)
+            files = {f"local/{name}": str(path) for name, path in sources.items()}
+
+            with ThreadPoolExecutor() as executor:
+                self.assertEqual(find_duplicate_files(files, executor), {"local/c.step": "local/a.step"})
+
+    def test_link_or_copy(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            source = Path(tempdir) / "model.step"
+            source.write_text("model")
+            destination = Path(tempdir) / "lib" / "model.step"
+            destination.parent.mkdir()
+
+            self.assertIn(link_or_copy(str(source), str(destination)), ["reflink", "copy"])
+            self.assertEqual(destination.read_text(), "model")
+            # Editing local copy in place doesn't change the source
+            with open(destination, "r+") as local_model:
+                local_model.write("local")
+            self.assertEqual(source.read_text(), "model")
+
+            duplicate = destination.parent / "duplicate.step"
+            self.assertIn(link_or_copy(str(destination), str(duplicate), hardlink=True), ["reflink", "hardlink"])
+            self.assertEqual(duplicate.read_text(), "local")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,4 +1,6 @@
+import tempfile
 import unittest
+from pathlib import Path
 from typing import List
 from kmake_test_common import KmakeTestCase
 
@@ -66,10 +68,11 @@ class LogosTest(KmakeTestCase, unittest.TestCase):
             self.inner(["oshw"], oshw_logo)
 
     def test_logos_custom_path(self) -> None:
-        self.test_logo_path = self.TEST_DIR / "test_logo"
-        with open(self.test_logo_path, "w") as f:
-            f.write(TEST_LOGO)
-        self.inner(["test_logo", "-p", str(self.TEST_DIR)], TEST_LOGO)
+        # Logo is written outside of the project (it would be reported as untracked file) and the repository
+        with tempfile.TemporaryDirectory() as logo_dir:
+            with open(Path(logo_dir) / "test_logo", "w") as f:
+                f.write(TEST_LOGO)
+            self.inner(["test_logo", "-p", logo_dir], TEST_LOGO)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from common.netlist_reader import read_netlist
+
+NETLIST = """<?xml version="1.0" encoding="UTF-8"?>
+<export version="E">
+  <design>
+    <source>/test_project/test_project.kicad_sch</source>
+  </design>
+  <components>
+    <comp ref="R1">
+      <value>10k</value>
+      <footprint>Resistor_SMD:R_0402_1005Metric</footprint>
+      <fields>
+        <field name="Footprint">Resistor_SMD:R_0402_1005Metric</field>
+        <field name="MPN"/>
+      </fields>
+      <libsource lib="Device" part="R" description="Resistor"/>
+      <property name="dnp"/>
+      <property name="Sheetname" value="Root"/>
+    </comp>
+    <comp ref="C1">
+      <value>100n</value>
+      <fields>
+        <field name="MPN">GRM155</field>
+      </fields>
+      <libsource lib="Device" part="C_Small" description="Unpolarized capacitor"/>
+    </comp>
+  </components>
+  <libparts>
+    <libpart lib="Device" part="R">
+      <fields>
+        <field name="MPN">RC0402</field>
+      </fields>
+    </libpart>
+    <libpart lib="Device" part="C">
+      <aliases>
+        <alias>C_Small</alias>
+      </aliases>
+      <fields>
+        <field name="Footprint">Capacitor_SMD:C_0402_1005Metric</field>
+      </fields>
+    </libpart>
+  </libparts>
+  <nets>
+    <net code="1" name="GND">
+      <node ref="R1" pin="2"/>
+      <node ref="C1" pin="2"/>
+    </net>
+  </nets>
+</export>
+"""
+
+
+class NetlistReaderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = str(Path(temp_dir.name) / "netlist.xml")
+        Path(self.path).write_text(NETLIST)
+
+    def test_components(self) -> None:
+        r1, c1 = read_netlist(self.path).components
+        self.assertEqual((r1.ref, r1.value, r1.lib, r1.part, r1.description), ("R1", "10k", "Device", "R", "Resistor"))
+        self.assertTrue(r1.has_property("dnp"))
+        self.assertFalse(c1.has_property("dnp"))
+        self.assertEqual(r1.properties["Sheetname"], "Root")
+        # Empty fields are taken from library part (also matched by alias)
+        self.assertEqual(r1.get_field("MPN"), "RC0402")
+        self.assertEqual(c1.get_field("MPN"), "GRM155")
+        self.assertEqual(r1.get_footprint(), "Resistor_SMD:R_0402_1005Metric")
+        self.assertEqual(c1.get_footprint(), "Capacitor_SMD:C_0402_1005Metric")
+        self.assertEqual(c1.get_field("Manufacturer"), "")
+
+    def test_nets(self) -> None:
+        self.assertEqual(read_netlist(self.path).nets, {})
+        self.assertEqual(read_netlist(self.path, nets=True).nets, {"GND": [("R1", "2"), ("C1", "2")]})
+
+
+if __name__ == "__main__":
+    unittest.main()
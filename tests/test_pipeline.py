@@ -0,0 +1,61 @@
+import argparse
+import os
+import unittest
+
+from kmake_test_common import KmakeTestCase
+
+from commands.pipeline import Stage, build_dag, split_stages
+
+
+class PipelineTest(KmakeTestCase, unittest.TestCase):
+
+    def __init__(self, method_name: str = "runTest") -> None:
+        KmakeTestCase.__init__(self, "run")
+        unittest.TestCase.__init__(self, method_name)
+
+    def test_read_only_stages(self) -> None:
+        self.run_test_command(["-j", "2", "stackup-export", "--legacy-csv", "+", "step", "+", "sch"])
+        self.assertTrue(os.path.exists(os.path.join(self.kpro.fab_dir, "stackup.csv")))
+        self.assertTrue(os.path.exists(f"{self.kpro.step_model3d_dir}/{self.kpro.name}.step"))
+        self.assertTrue(os.path.exists(f"{self.kpro.doc_dir}/{self.kpro.name}-schematic.pdf"))
+
+    def test_modifying_stage(self) -> None:
+        self.run_test_command(["aux-origin", "-s", "bl", "+", "stackup-export"])
+        self.assertTrue(os.path.exists(os.path.join(self.kpro.fab_dir, "stackup.json")))
+        self.assertEqual(self.project_repo.git.diff("--name-only").split(), [os.path.basename(self.kpro.pcb_file)])
+
+
+class PipelineDagTest(unittest.TestCase):
+
+    def make_stages(self, names: list) -> list:
+        stages = [Stage(index, name, argparse.Namespace()) for index, name in enumerate(names)]
+        build_dag(stages)
+        return [stage.depends_on for stage in stages]
+
+    def test_split_stages(self) -> None:
+        self.assertEqual(
+            split_stages(["bom", "--all", "+", "gerber", "-x", "+", "sch", "--theme", "dark"]),
+            [["bom", "--all"], ["gerber", "-x"], ["sch", "--theme", "dark"]],
+        )
+        # Arguments named like subcommands do not start a new stage
+        self.assertEqual(split_stages(["sch", "--theme", "bom", "step"]), [["sch", "--theme", "bom", "step"]])
+        self.assertEqual(split_stages([]), [])
+        for argv in [["--all"], ["bom", "+"], ["bom", "+", "+", "sch"]]:
+            with self.assertRaises(SystemExit):
+                split_stages(argv)
+
+    def test_read_only_stages_independent(self) -> None:
+        self.assertEqual(self.make_stages(["gerber", "pnp", "sch"]), [set(), set(), set()])
+
+    def test_same_command_serialized(self) -> None:
+        self.assertEqual(self.make_stages(["bom", "sch", "bom"]), [set(), set(), {0}])
+
+    def test_modifying_stage_is_barrier(self) -> None:
+        self.assertEqual(
+            self.make_stages(["gerber", "sch", "dnp", "pnp", "bom"]),
+            [set(), set(), {0, 1}, {2}, {2}],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,13 @@
 import unittest
 import os
+import tempfile
+from typing import List
 
 from kiutils.board import Board
 from kmake_test_common import KmakeTestCase
 
+from commands.pnp import export_pnp
+
 
 class PnpTest(KmakeTestCase, unittest.TestCase):
 
@@ -66,6 +70,49 @@ class PnpTest(KmakeTestCase, unittest.TestCase):
                 with open(f"{self.kpro.fab_dir}/{self.kpro.name}-top.pos") as file:
                     self.assertIn(footprint.entryName, file.read())
 
+    def reference_board(self, tempdir: str, arguments: List[str]) -> str:
+        """Board to be exported with kicad-cli, with `--virtual`, `--other` & `--excluded` applied to footprints"""
+        if not {"--virtual", "--other", "--excluded"} & set(arguments):
+            return self.kpro.pcb_file
+        board = Board.from_file(self.kpro.pcb_file)
+        for footprint in board.footprints:
+            fp_type = footprint.attributes.type
+            if ("--virtual" in arguments and fp_type == "virtual") or ("--other" in arguments and fp_type is None):
+                footprint.attributes.type = "smd"
+            if "--excluded" in arguments:
+                footprint.attributes.excludeFromPosFiles = False
+        board_path = os.path.join(tempdir, "reference.kicad_pcb")
+        board.to_file(board_path)
+        return board_path
+
+    def test_pnp_matches_kicad_cli(self) -> None:
+        """Position files generated in-process are the same as from kicad-cli (except header with date & build)"""
+        combinations = [
+            ("front", "ascii", "-top.pos"),
+            ("back", "ascii", "-bottom.pos"),
+            ("front", "csv", "-top-pos.csv"),
+            ("back", "csv", "-bottom-pos.csv"),
+        ]
+        for arguments in [[], ["--tht"], ["--virtual"], ["--other"], ["--excluded"], ["--virtual", "--other"]]:
+            self.run_test_command(arguments)
+            for side, output_format, suffix in combinations:
+                with self.subTest(arguments=arguments, suffix=suffix), tempfile.TemporaryDirectory() as tempdir:
+                    reference_file = os.path.join(tempdir, "reference" + suffix)
+                    export_pnp(
+                        self.reference_board(tempdir, arguments),
+                        output_file_name=reference_file,
+                        side=side,
+                        output_format=output_format,
+                        drill_origin=True,
+                        smd_only="--tht" not in arguments,
+                        bottom_negate_x=True,
+                    )
+                    with open(reference_file) as file:
+                        reference = [line for line in file if not line.startswith("### ")]
+                    with open(f"{self.kpro.fab_dir}/{self.kpro.name}{suffix}") as file:
+                        generated = [line for line in file if not line.startswith("### ")]
+                    self.assertEqual(generated, reference)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,79 @@
+import os
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+from commands.prettify import prettify_files
+from common.prettify import format_tokens, prettify, prettify_file
+
+TEST_PROJECT = Path(__file__).parent.resolve() / "test_project"
+
+
+def flatten(source: str) -> str:
+    """Put whole file in a single line, keeping whitespace in strings"""
+    return re.sub(r'("(?:[^"\\]|\\.)*")|\s+', lambda match: match.group(1) or " ", source)
+
+
+def prettify_chunked(source: str, chunk_size: int) -> str:
+    chunks = iter([source[i : i + chunk_size] for i in range(0, len(source), chunk_size)])
+    return "".join(format_tokens(lambda: next(chunks, "")))
+
+
+class PrettifyTest(unittest.TestCase):
+
+    def test_formatted_files(self) -> None:
+        """Files saved by KiCad are not changed, flattened files are formatted back"""
+        for path in [TEST_PROJECT / "test_project.kicad_pcb", *TEST_PROJECT.glob("*.kicad_sch")]:
+            with self.subTest(path=path.name):
+                source = path.read_text()
+                self.assertEqual(prettify(source), source)
+                self.assertEqual(prettify(flatten(source)), source)
+
+    def test_formatting(self) -> None:
+        cases = {
+            '(a (b "x \\"y\\" (z)") c)': '(a\n\t(b "x \\"y\\" (z)") c)\n',
+            "(pts (xy 1 2) (xy 3 4) (xy 5 6))": "(pts\n\t(xy 1 2) (xy 3 4) (xy 5 6)\n)\n",
+            "(p " + " ".join(f"tok{i}" for i in range(30)) + ")": "(p tok0 tok1 tok2 tok3 tok4 tok5 tok6 tok7 tok8 "
+            "tok9 tok10 tok11 tok12 tok13\n\ttok14 tok15 tok16 tok17 tok18 tok19 tok20 tok21 tok22 tok23 tok24 tok25\n"
+            "\ttok26 tok27 tok28 tok29\n)\n",
+            "(a\n\n  (b)  )  ": "(a\n\t(b)\n)\n",
+            '(kicad_sch (version 1) (lib "a b" x))': '(kicad_sch\n\t(version 1)\n\t(lib "a b" x)\n)\n',
+        }
+        for source, expected in cases.items():
+            with self.subTest(source=source):
+                self.assertEqual(prettify(source), expected)
+                # Tokens split between chunks
+                self.assertEqual(prettify_chunked(source, 3), expected)
+
+    def test_prettify_file(self) -> None:
+        source = flatten((TEST_PROJECT / "test_project.kicad_pcb").read_text())
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "board.kicad_pcb"
+            path.write_text(source)
+            prettify_file(str(path))
+            self.assertEqual(path.read_text(), prettify(source))
+            self.assertEqual(list(Path(tempdir).iterdir()), [path])
+
+    def test_formatted_file_not_written(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "board.kicad_pcb"
+            path.write_text("(kicad_pcb\n\t(version 1)\n)\n")
+            os.utime(path, ns=(0, 0))
+            self.assertFalse(prettify_file(str(path)))
+            self.assertEqual(path.stat().st_mtime_ns, 0)
+            self.assertEqual(list(Path(tempdir).iterdir()), [path])
+
+    def test_prettify_files(self) -> None:
+        """Only files that weren't formatted are written"""
+        with tempfile.TemporaryDirectory() as tempdir:
+            paths = [str(Path(tempdir) / f"sheet{i}.kicad_sch") for i in range(4)]
+            for i, path in enumerate(paths):
+                Path(path).write_text(f"(kicad_sch (version {i}))" if i % 2 else f"(kicad_sch\n\t(version {i})\n)\n")
+            self.assertEqual(prettify_files(paths, max_jobs=2), paths[1::2])
+            for i, path in enumerate(paths):
+                self.assertEqual(Path(path).read_text(), f"(kicad_sch\n\t(version {i})\n)\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
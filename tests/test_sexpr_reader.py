@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from kiutils.board import Board
+
+from common.sexpr_reader import SexprReader, load_board
+
+TEST_PCB = Path(__file__).parent.resolve() / "test_project" / "test_project.kicad_pcb"
+
+
+class SexprReaderTest(unittest.TestCase):
+    board: Board
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.board = Board.from_file(str(TEST_PCB))
+
+    def test_top_level_nodes(self) -> None:
+        with SexprReader(str(TEST_PCB)) as reader:
+            self.assertEqual(reader.root, "kicad_pcb")
+            nodes = list(reader.nodes())
+            self.assertEqual(nodes[0].name, "version")
+            self.assertEqual(len([node for node in nodes if node.name == "footprint"]), len(self.board.footprints))
+            setup = next(reader.find("setup"))
+            self.assertEqual(reader.parse(setup)[0], "setup")
+
+    def test_unformatted_file(self) -> None:
+        """Files not formatted by KiCad are scanned bracket by bracket"""
+        with SexprReader(str(TEST_PCB)) as reader:
+            formatted = [(node.name, reader.text(node)) for node in reader.nodes()]
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "board.kicad_pcb"
+            path.write_text("(kicad_pcb " + " ".join(text for _, text in formatted) + ")")
+            with SexprReader(str(path)) as reader:
+                self.assertEqual([(node.name, reader.text(node)) for node in reader.nodes()], formatted)
+
+    def test_load_board(self) -> None:
+        board = load_board(str(TEST_PCB), include=["layers", "setup"])
+        self.assertEqual(board.setup.to_sexpr(), self.board.setup.to_sexpr())
+        self.assertEqual(len(board.layers), len(self.board.layers))
+        self.assertEqual(board.footprints, [])
+
+        board = load_board(str(TEST_PCB), exclude=["footprint", "zone"])
+        self.assertEqual(len(board.nets), len(self.board.nets))
+        self.assertEqual(len(board.traceItems), len(self.board.traceItems))
+        self.assertEqual(board.zones, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import importlib
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+import kmake
+import commands
+
+SRC_DIR = Path(__file__).parent.parent.resolve() / "src"
+
+# Modules that should be imported only by commands that need them
+HEAVY_MODULES = ["kiutils", "PIL", "git", "pip", "kicad_netlist_reader"]
+
+
+class StartupTest(unittest.TestCase):
+
+    def run_python(self, code: str, *flags: str) -> subprocess.CompletedProcess:
+        env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+        return subprocess.run([sys.executable, *flags, "-c", code], env=env, text=True, capture_output=True, check=True)
+
+    def test_no_heavy_imports(self) -> None:
+        """Parsing arguments of a command must not import modules of other commands"""
+        result = self.run_python("import sys, kmake; kmake.parse_arguments(['clean']); print(*sorted(sys.modules))")
+        loaded_modules = result.stdout.split()
+        loaded_packages = {module.split(".")[0] for module in loaded_modules}
+        self.assertEqual(loaded_packages & set(HEAVY_MODULES), set())
+        self.assertIn("commands.clean", loaded_modules)
+        self.assertNotIn("commands.bom", loaded_modules)
+
+    def test_command_modules(self) -> None:
+        """Registry is sorted by name and points to modules defining the subcommands"""
+        # pip (imported by `version`) fails if previous tests left working directory in a removed directory
+        os.chdir(SRC_DIR)
+        self.addCleanup(os.chdir, Path(__file__).parent)
+        self.assertEqual(list(commands.COMMANDS), sorted(commands.COMMANDS))
+        for name, command in commands.COMMANDS.items():
+            self.assertEqual(importlib.import_module(f"commands.{command.module}").NAME, name)
+
+    def test_lazy_subcommand_arguments(self) -> None:
+        args = kmake.parse_arguments(["sch", "--theme", "dark"])
+        self.assertEqual(args.subcommand, "sch")
+        self.assertEqual(args.theme, "dark")
+        self.assertEqual(args.func.__module__, "commands.sch")
+
+
+if __name__ == "__main__":
+    unittest.main()